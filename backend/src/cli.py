@@ -0,0 +1,514 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import inspect, text
+from flask import current_app
+from flask.cli import AppGroup
+from . import db
+from .models.category import Category
+from .models.expense import Expense
+from .models.event import Event
+from .models.user import User
+from .services.admin_analytics_service import AdminAnalyticsService
+from .services.anomaly_service import AnomalyService
+from .services.archive_service import ArchiveService
+from .services.budget_service import BudgetService
+from .services.expense_service import ExpenseService
+from .services.job_service import JobService
+from .utils.partitioning import (
+    PARTITIONED_TABLES,
+    convert_to_partitioned,
+    ensure_future_partitions,
+    run_pruning_benchmark,
+)
+from .utils.category_migration import (
+    migrate_category_columns,
+    recreate_derived_tables,
+)
+from .utils.idempotency import purge_expired_keys
+from .utils.job_worker import JobWorker
+from .utils.reminder_scheduler import ReminderScheduler
+from .utils.sharding import shard_router
+from .utils.money import (
+    copy_user_currency,
+    migrate_amount_columns,
+    migrate_user_currency,
+)
+from .utils.text_search import create_fts_table
+
+# Command groups registered on the Flask CLI, e.g. "flask analytics platform-stats"
+analytics_cli = AppGroup("analytics", help="Platform-wide analytics commands.")
+
+
+@analytics_cli.command("platform-stats")
+@click.option(
+    "--chunk-size",
+    default=AdminAnalyticsService.DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Number of user ids aggregated per chunk.",
+)
+@click.option(
+    "--workers",
+    default=AdminAnalyticsService.DEFAULT_MAX_WORKERS,
+    show_default=True,
+    help="Number of chunks aggregated concurrently.",
+)
+@click.option(
+    "--chunks-per-second",
+    type=float,
+    default=None,
+    help="Throttle the rate of chunk scans, e.g. during business hours.",
+)
+@click.option(
+    "--statement-timeout",
+    default=AdminAnalyticsService.DEFAULT_STATEMENT_TIMEOUT,
+    show_default=True,
+    help="Per-query timeout in milliseconds (PostgreSQL only).",
+)
+@click.option(
+    "--database-url",
+    envvar="ANALYTICS_DATABASE_URL",
+    default=None,
+    help="Read replica to scan instead of the primary database.",
+)
+def platform_stats(
+    chunk_size, workers, chunks_per_second, statement_timeout, database_url
+):
+    """
+    Print spend per category, active users per month and events per day
+    """
+    statistics = AdminAnalyticsService.collect_platform_statistics(
+        chunk_size=chunk_size,
+        max_workers=workers,
+        chunks_per_second=chunks_per_second,
+        statement_timeout=statement_timeout,
+        database_url=database_url,
+    )
+    click.echo(json.dumps(statistics, indent=2))
+
+
+anomalies_cli = AppGroup("anomalies", help="Expense anomaly detection commands.")
+
+
+@anomalies_cli.command("score")
+@click.option(
+    "--chunk-size",
+    default=500,
+    show_default=True,
+    help="Number of users scored per chunk.",
+)
+@click.option(
+    "--days", default=30, show_default=True, help="Number of recent days to score."
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=AnomalyService.DEFAULT_THRESHOLD,
+    show_default=True,
+    help="Modified z-score above which amounts are flagged.",
+)
+def score_anomalies(chunk_size, days, threshold):
+    """
+    Refresh baselines and print the anomalous recent expenses of every user
+    """
+    users = 0
+    for user_id, flagged in AnomalyService.score_all_users(
+        chunk_size=chunk_size, days=days, threshold=threshold
+    ):
+        users += 1
+        for item in flagged:
+            click.echo(
+                f"User {user_id}: expense {item['expense']['id']} "
+                f"({', '.join(item['reasons'])})"
+            )
+    click.echo(f"Found anomalies for {users} users")
+
+
+partitions_cli = AppGroup("partitions", help="Monthly table partitioning commands.")
+
+
+@partitions_cli.command("convert")
+@click.argument("tables", nargs=-1)
+@click.option(
+    "--months-ahead",
+    default=3,
+    show_default=True,
+    help="Number of future months to create partitions for.",
+)
+def convert_partitions(tables, months_ahead):
+    """
+    Rebuild tables as partitioned by month on every database (PostgreSQL only)
+    """
+    for engine in shard_router.databases():
+        with engine.begin() as connection:
+            for table in tables or PARTITIONED_TABLES:
+                legacy = convert_to_partitioned(connection, table, months_ahead)
+                click.echo(f"Partitioned {table}; previous table kept as {legacy}")
+
+
+@partitions_cli.command("maintain")
+@click.option(
+    "--months-ahead",
+    default=3,
+    show_default=True,
+    help="Number of future months to create partitions for.",
+)
+def maintain_partitions(months_ahead):
+    """
+    Create upcoming monthly partitions; meant to run daily from cron
+    """
+    for engine in shard_router.databases():
+        with engine.begin() as connection:
+            created = ensure_future_partitions(connection, months_ahead)
+
+        for table, names in created.items():
+            click.echo(f"{table}: {', '.join(names) or 'not partitioned'}")
+
+
+@partitions_cli.command("benchmark")
+@click.option("--rows", default=100000, show_default=True, help="Rows to seed.")
+@click.option("--months", default=24, show_default=True, help="Months of data.")
+def benchmark_partitions(rows, months):
+    """
+    Compare a one-month query on flat and partitioned scratch tables
+    """
+    with db.engine.begin() as connection:
+        results = run_pruning_benchmark(connection, rows=rows, months=months)
+
+    click.echo(json.dumps(results, indent=2))
+
+
+archive_cli = AppGroup("archive", help="Cold storage of old expenses.")
+
+
+@archive_cli.command("expenses")
+@click.option(
+    "--older-than-days",
+    default=730,
+    show_default=True,
+    help="Archive expenses dated before this many days ago.",
+)
+@click.option(
+    "--user-id", "user_ids", type=int, multiple=True, help="Limit to these users."
+)
+def archive_expenses(older_than_days, user_ids):
+    """
+    Move old expenses to compressed per-user archive files
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = ArchiveService.archive_expenses(cutoff, user_ids=list(user_ids) or None)
+
+    click.echo(
+        f"Archived {sum(archived.values())} expenses of {len(archived)} users "
+        f"dated before {cutoff:%Y-%m-%d} to {ArchiveService.get_archive_dir()}"
+    )
+
+
+budgets_cli = AppGroup("budgets", help="Category budget commands.")
+
+
+@budgets_cli.command("rebuild-totals")
+@click.option(
+    "--user-id", "user_ids", type=int, multiple=True, help="Limit to these users."
+)
+def rebuild_budget_totals(user_ids):
+    """
+    Recompute monthly category totals from expenses, e.g. after bulk SQL changes
+    """
+    if not user_ids:
+        user_ids = [
+            user_id for (user_id,) in db.session.query(User.id).order_by(User.id)
+        ]
+
+    for user_id in user_ids:
+        with shard_router.bind(user_id):
+            BudgetService.rebuild_totals(user_id)
+    click.echo(f"Rebuilt the monthly totals of {len(user_ids)} users")
+
+
+sketches_cli = AppGroup("sketches", help="Spending quantile sketch commands.")
+
+
+@sketches_cli.command("rebuild")
+@click.option(
+    "--user-id", "user_ids", type=int, multiple=True, help="Limit to these users."
+)
+@click.option("--stale", is_flag=True, help="Only recompute sketches flagged as stale.")
+def rebuild_sketches(user_ids, stale):
+    """
+    Recompute category quantile sketches from expenses, e.g. to backfill them
+    """
+    if not user_ids:
+        user_ids = [
+            user_id for (user_id,) in db.session.query(User.id).order_by(User.id)
+        ]
+
+    if stale:
+        refreshed = 0
+        for user_id in user_ids:
+            with shard_router.bind(user_id):
+                refreshed += ExpenseService.refresh_stale_sketches(user_id)
+        click.echo(f"Refreshed {refreshed} stale quantile sketches")
+        return
+
+    for user_id in user_ids:
+        with shard_router.bind(user_id):
+            ExpenseService.rebuild_category_sketches(user_id)
+    click.echo(f"Rebuilt the quantile sketches of {len(user_ids)} users")
+
+
+categories_cli = AppGroup("categories", help="Category dictionary commands.")
+
+
+@categories_cli.command("migrate")
+def migrate_categories():
+    """
+    Replace free-text category columns with references to the categories table
+    """
+    migrated = Counter()
+    recreated = set()
+    for engine in shard_router.databases():
+        with engine.begin() as connection:
+            Category.__table__.create(connection, checkfirst=True)
+            migrated.update(migrate_category_columns(connection))
+            recreated.update(recreate_derived_tables(connection))
+
+    for table, count in migrated.items():
+        click.echo(f"{table}: linked {count} rows to categories")
+    if recreated:
+        # The summaries were dropped with their name keys, refill them by id
+        user_ids = [
+            user_id for (user_id,) in db.session.query(User.id).order_by(User.id)
+        ]
+        for user_id in user_ids:
+            with shard_router.bind(user_id):
+                BudgetService.rebuild_totals(user_id)
+                ExpenseService.rebuild_category_sketches(user_id)
+        click.echo(
+            f"Recreated {', '.join(sorted(recreated))} "
+            f"and rebuilt the summaries of {len(user_ids)} users"
+        )
+    if not migrated and not recreated:
+        click.echo("Nothing to migrate")
+
+
+money_cli = AppGroup("money", help="Money storage commands.")
+
+
+@money_cli.command("migrate")
+def migrate_money():
+    """
+    Convert float amount columns to integer cents and add user currencies
+    """
+    migrated = Counter()
+    with db.engine.begin() as main:
+        migrated.update(migrate_amount_columns(main))
+        currencies = migrate_user_currency(main)
+        for engine in shard_router.engines:
+            with engine.begin() as connection:
+                migrated.update(migrate_amount_columns(connection))
+                if migrate_user_currency(connection) is not None:
+                    # The expenses of sharded users only live on their shard
+                    currencies = (currencies or 0) + copy_user_currency(
+                        connection, main
+                    )
+
+    for table, count in migrated.items():
+        click.echo(f"{table}: converted {count} rows to cents")
+    if currencies is not None:
+        click.echo(f"users: took the currency of {currencies} users from expenses")
+    if not migrated and currencies is None:
+        click.echo("Nothing to migrate")
+
+
+search_cli = AppGroup("search", help="Full-text search index commands.")
+
+
+@search_cli.command("rebuild")
+def rebuild_search_indexes():
+    """
+    Create missing search indexes and re-index existing rows
+    """
+    for engine in shard_router.databases():
+        with engine.begin() as connection:
+            for model in (Expense, Event):
+                if connection.dialect.name == "sqlite":
+                    create_fts_table(
+                        connection,
+                        model.__tablename__,
+                        model.__search_columns__,
+                        rebuild=True,
+                    )
+                else:
+                    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    for index in model.__table__.indexes:
+                        if index.name.startswith(f"ix_{model.__tablename__}_search"):
+                            index.create(connection, checkfirst=True)
+                click.echo(f"Indexed {model.__tablename__}")
+
+
+indexes_cli = AppGroup("indexes", help="Secondary index commands.")
+
+
+@indexes_cli.command("create")
+def create_indexes():
+    """
+    Create indexes declared on existing tables, e.g. after an upgrade
+    """
+    for engine in shard_router.databases():
+        with engine.begin() as connection:
+            tables = set(inspect(connection).get_table_names())
+            for table in db.metadata.sorted_tables:
+                if table.name not in tables:
+                    continue
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+                click.echo(f"Indexed {table.name}")
+
+
+jobs_cli = AppGroup("jobs", help="Background job commands.")
+
+
+@jobs_cli.command("work")
+@click.option(
+    "--pool",
+    type=click.Choice(JobWorker.POOLS),
+    default=None,
+    help="Run jobs on threads or processes; JOB_WORKER_POOL by default.",
+)
+@click.option(
+    "--size",
+    type=int,
+    default=None,
+    help="Number of jobs run concurrently; JOB_WORKER_SIZE by default.",
+)
+@click.option("--once", is_flag=True, help="Run the queued jobs, then exit.")
+def work_jobs(pool, size, once):
+    """
+    Run queued background jobs
+    """
+    if once:
+        click.echo(f"Ran {JobService.run_pending()} jobs")
+        return
+
+    worker = JobWorker(
+        current_app._get_current_object(),
+        pool=pool or current_app.config.get("JOB_WORKER_POOL", "thread"),
+        size=size or current_app.config.get("JOB_WORKER_SIZE", 4),
+    )
+    click.echo(f"Running jobs on a {worker.pool} pool of {worker.size}")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@jobs_cli.command("purge")
+def purge_jobs():
+    """
+    Delete finished jobs whose results expired
+    """
+    click.echo(f"Requeued {JobService.requeue_stale()} stale jobs")
+    click.echo(f"Purged {JobService.purge_expired()} expired jobs")
+
+
+shards_cli = AppGroup("shards", help="Horizontal sharding commands.")
+
+
+@shards_cli.command("init")
+def init_shards():
+    """
+    Create the tables of every shard and reserve their id ranges
+    """
+    for shard in range(len(shard_router.engines)):
+        shard_router.create_schema(shard)
+        click.echo(f"Initialized shard {shard}")
+
+
+@shards_cli.command("locate")
+@click.argument("user_id", type=int)
+def locate_user(user_id):
+    """
+    Print the shard holding a user's data
+    """
+    click.echo(shard_router.shard_of(user_id))
+
+
+@shards_cli.command("migrate")
+@click.option("--dry-run", is_flag=True, help="List the moves without moving.")
+def migrate_shards(dry_run):
+    """
+    Move users with data on the main database to their shards
+    """
+    moves = shard_router.migrate(dry_run=dry_run)
+    for user_id, _, target in moves:
+        click.echo(f"User {user_id}: main database -> shard {target}")
+    click.echo(f"{'Would move' if dry_run else 'Moved'} {len(moves)} users")
+
+
+@shards_cli.command("rebalance")
+@click.option("--dry-run", is_flag=True, help="List the moves without moving.")
+def rebalance_shards(dry_run):
+    """
+    Move users to the shard the hash ring assigns them, e.g. after adding one
+    """
+    moves = shard_router.rebalance(dry_run=dry_run)
+    for user_id, source, target in moves:
+        click.echo(f"User {user_id}: shard {source} -> {target}")
+    click.echo(f"{'Would move' if dry_run else 'Moved'} {len(moves)} users")
+
+
+reminders_cli = AppGroup("reminders", help="Event reminder commands.")
+
+
+@reminders_cli.command("run")
+@click.option(
+    "--lead-minutes",
+    type=float,
+    default=None,
+    help="Minutes before the start of events; REMINDER_LEAD_MINUTES by default.",
+)
+def run_reminders(lead_minutes):
+    """
+    Send event reminders until interrupted
+    """
+    lead = lead_minutes or current_app.config.get("REMINDER_LEAD_MINUTES", 15)
+    scheduler = ReminderScheduler(
+        current_app._get_current_object(), lead=timedelta(minutes=lead)
+    )
+    click.echo(f"Sending reminders {lead:g} minutes before events")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+idempotency_cli = AppGroup("idempotency", help="Idempotency key commands.")
+
+
+@idempotency_cli.command("purge")
+def purge_idempotency_keys():
+    """
+    Delete expired idempotency keys
+    """
+    click.echo(f"Purged {purge_expired_keys()} expired idempotency keys")
+
+
+# All command groups, registered on the application in src/__init__.py
+cli_groups = [
+    analytics_cli,
+    anomalies_cli,
+    partitions_cli,
+    archive_cli,
+    budgets_cli,
+    sketches_cli,
+    categories_cli,
+    money_cli,
+    search_cli,
+    indexes_cli,
+    jobs_cli,
+    shards_cli,
+    reminders_cli,
+    idempotency_cli,
+]
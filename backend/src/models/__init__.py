@@ -2,8 +2,32 @@
 # It can be used to import and expose models at the package level
 
 from .user import User
+from .category import Category
 from .expense import Expense
 from .event import Event
+from .sync_change import SyncChange
+from .budget import Budget, CategoryMonthTotal
+from .category_sketch import CategorySketch
+from .category_baseline import BaselineRefresh, CategoryBaseline
+from .job import Job
+from .user_shard import UserShard
+from .event_reminder import EventReminder
+from .idempotency_key import IdempotencyKey
 
 # You can add any package-level configurations or imports here
-__all__ = ["User", "Expense", "Event"]
+__all__ = [
+    "User",
+    "Category",
+    "Expense",
+    "Event",
+    "SyncChange",
+    "Budget",
+    "CategoryMonthTotal",
+    "CategorySketch",
+    "CategoryBaseline",
+    "BaselineRefresh",
+    "Job",
+    "UserShard",
+    "EventReminder",
+    "IdempotencyKey",
+]
@@ -0,0 +1,300 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    BigInteger,
+    String,
+    Float,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+    event,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import object_session, attributes
+from sqlalchemy.sql import func
+from .. import db
+from .expense import Expense
+from .user import User
+from .category import CategorizedMixin, category_cache
+from ..utils.money import DEFAULT_CURRENCY, from_cents, to_cents
+from ..utils.session_buffers import savepoint_list
+
+# Session.info key holding budget thresholds crossed in the current transaction
+PENDING_ALERTS_KEY = "pending_budget_alerts"
+
+
+def month_key(value):
+    """
+    Format a datetime as the "YYYY-MM" key used by monthly totals
+    """
+    return value.strftime("%Y-%m")
+
+
+class Budget(CategorizedMixin, db.Model):
+    """
+    Budget model holding a monthly spending limit for one category
+    """
+
+    __tablename__ = "budgets"
+    __table_args__ = (
+        UniqueConstraint("user_id", "category_id", name="uq_budgets_user_category_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    monthly_limit_cents = Column(BigInteger, nullable=False)
+    alert_threshold = Column(Float, nullable=False, default=1.0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    @property
+    def monthly_limit(self):
+        return from_cents(self.monthly_limit_cents, User.currency_of(self.user_id))
+
+    def to_dict(self, currency=None):
+        """
+        Serialize budget object to dictionary
+
+        Args:
+            currency (str, optional): The user's account currency, looked
+                up when not given
+        """
+        currency = currency or User.currency_of(self.user_id)
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "category": self.category,
+            "monthly_limit": from_cents(self.monthly_limit_cents, currency),
+            "alert_threshold": self.alert_threshold,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    @classmethod
+    def validate_budget(
+        cls, monthly_limit, category, alert_threshold=1.0, currency=DEFAULT_CURRENCY
+    ):
+        """
+        Validate budget data before creation
+        """
+        if (
+            not isinstance(monthly_limit, (int, float))
+            or to_cents(monthly_limit, currency) <= 0
+        ):
+            raise ValueError("Monthly limit must be a positive number")
+
+        if not category or len(category.strip()) == 0:
+            raise ValueError("Category cannot be empty")
+
+        if not isinstance(alert_threshold, (int, float)) or not (
+            0 < alert_threshold <= 1
+        ):
+            raise ValueError("Alert threshold must be between 0 and 1")
+
+    def __repr__(self):
+        """
+        String representation of the Budget model
+        """
+        return f"<Budget {self.id}: {self.category} - ${self.monthly_limit}>"
+
+
+class CategoryMonthTotal(CategorizedMixin, db.Model):
+    """
+    Running total of a user's spending per category and month
+
+    Maintained incrementally on every expense insert, update and delete so
+    budget checks and status reads never aggregate raw expenses.
+    """
+
+    __tablename__ = "category_month_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    month = Column(String(7), primary_key=True)
+    total_cents = Column(BigInteger, nullable=False, default=0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+
+    @property
+    def total_amount(self):
+        return from_cents(self.total_cents, User.currency_of(self.user_id))
+
+    def to_dict(self):
+        """
+        Serialize monthly total to dictionary
+        """
+        return {
+            "category": self.category,
+            "month": self.month,
+            "total_amount": self.total_amount,
+            "transaction_count": self.transaction_count,
+        }
+
+    def __repr__(self):
+        """
+        String representation of the CategoryMonthTotal model
+        """
+        return (
+            f"<CategoryMonthTotal {self.category} {self.month}: ${self.total_amount}>"
+        )
+
+
+def _apply_delta(
+    connection,
+    session,
+    user_id,
+    category_id,
+    date,
+    cents,
+    count,
+    currency=DEFAULT_CURRENCY,
+):
+    """
+    Add an amount in cents to a monthly total and check the category budget
+
+    Both statements are primary key or unique index lookups, so the cost of
+    a write does not depend on how many expenses the user has.
+    """
+    month = month_key(date)
+    table = CategoryMonthTotal.__table__
+    values = {
+        "user_id": user_id,
+        "category_id": category_id,
+        "month": month,
+        "total_cents": cents,
+        "transaction_count": count,
+    }
+
+    dialects = {"postgresql": postgresql, "sqlite": sqlite}
+    dialect = dialects.get(connection.dialect.name)
+    if dialect is not None:
+        insert = dialect.insert(table).values(**values)
+        connection.execute(
+            insert.on_conflict_do_update(
+                index_elements=["user_id", "category_id", "month"],
+                set_={
+                    "total_cents": table.c.total_cents + cents,
+                    "transaction_count": table.c.transaction_count + count,
+                },
+            )
+        )
+    else:
+        key = (
+            (table.c.user_id == user_id)
+            & (table.c.category_id == category_id)
+            & (table.c.month == month)
+        )
+        result = connection.execute(
+            table.update()
+            .where(key)
+            .values(
+                total_cents=table.c.total_cents + cents,
+                transaction_count=table.c.transaction_count + count,
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**values))
+
+    if cents <= 0 or session is None:
+        return
+
+    budget = connection.execute(
+        select(Budget.monthly_limit_cents, Budget.alert_threshold).where(
+            Budget.user_id == user_id, Budget.category_id == category_id
+        )
+    ).first()
+    if budget is None:
+        return
+
+    total = connection.execute(
+        select(table.c.total_cents).where(
+            table.c.user_id == user_id,
+            table.c.category_id == category_id,
+            table.c.month == month,
+        )
+    ).scalar()
+
+    threshold = budget.monthly_limit_cents * budget.alert_threshold
+    if total - cents < threshold <= total:
+        savepoint_list(session, PENDING_ALERTS_KEY).append(
+            {
+                "user_id": user_id,
+                "category": category_cache.name_of(category_id, connection),
+                "month": month,
+                "total_amount": from_cents(total, currency),
+                "monthly_limit": from_cents(budget.monthly_limit_cents, currency),
+                "alert_threshold": budget.alert_threshold,
+            }
+        )
+
+
+def previous_value(target, name):
+    """
+    Get the value an attribute had before the pending flush
+    """
+    history = attributes.get_history(target, name)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, name)
+
+
+@event.listens_for(Expense, "after_insert")
+def _expense_inserted(mapper, connection, target):
+    _apply_delta(
+        connection,
+        object_session(target),
+        target.user_id,
+        target.category_id,
+        target.date,
+        target.amount_cents,
+        1,
+        target.currency,
+    )
+
+
+@event.listens_for(Expense, "after_update")
+def _expense_updated(mapper, connection, target):
+    old = {
+        name: previous_value(target, name)
+        for name in ("amount_cents", "category_id", "date")
+    }
+    if (
+        old["amount_cents"] == target.amount_cents
+        and old["category_id"] == target.category_id
+        and month_key(old["date"]) == month_key(target.date)
+    ):
+        return
+
+    session = object_session(target)
+    _apply_delta(
+        connection,
+        None,
+        target.user_id,
+        old["category_id"],
+        old["date"],
+        -old["amount_cents"],
+        -1,
+    )
+    _apply_delta(
+        connection,
+        session,
+        target.user_id,
+        target.category_id,
+        target.date,
+        target.amount_cents,
+        1,
+        target.currency,
+    )
+
+
+@event.listens_for(Expense, "after_delete")
+def _expense_deleted(mapper, connection, target):
+    _apply_delta(
+        connection,
+        None,
+        target.user_id,
+        previous_value(target, "category_id"),
+        previous_value(target, "date"),
+        -previous_value(target, "amount_cents"),
+        -1,
+    )
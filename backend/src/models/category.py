@@ -0,0 +1,339 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+    event,
+    false,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.sql import func
+from .. import db
+from .user import User
+from ..utils.session_buffers import register_buffer, savepoint_list
+
+# Session.info key holding the (engine, id, user id, name) of categories
+# created in the current transaction
+PENDING_CATEGORIES_KEY = "pending_categories"
+
+
+class Category(db.Model):
+    """
+    Per-user dictionary of category names shared by expenses, events,
+    budgets and the per-category summaries
+
+    Rows reference categories by integer id, so names are stored once per
+    user and grouping compares integers instead of strings.
+    """
+
+    __tablename__ = "categories"
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_categories_user_name"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String(50), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def to_dict(self):
+        """
+        Serialize category object to dictionary
+        """
+        return {"id": self.id, "name": self.name}
+
+    def __repr__(self):
+        """
+        String representation of the Category model
+        """
+        return f"<Category {self.id}: {self.name}>"
+
+
+class CategoryCache:
+    """
+    Process-wide map between category ids and (user id, name) pairs
+
+    Entries are kept per database engine, since every shard numbers its
+    own categories, and are cleared whenever the categories table is
+    created or dropped, since a recreated database reuses ids. Category
+    names never change once created, so entries never go stale otherwise.
+    Only committed categories are cached; ids created by a transaction are
+    added when it commits, so a rollback cannot leave dangling ids behind.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._names = OrderedDict()
+        self._ids = {}
+
+    def clear(self):
+        """
+        Forget every category, e.g. after the database was recreated
+        """
+        with self._lock:
+            self._names.clear()
+            self._ids.clear()
+
+    def add(self, engine, category_id, user_id, name):
+        """
+        Remember a committed category, evicting the least recently added
+        """
+        with self._lock:
+            self._names[(engine, category_id)] = (user_id, name)
+            self._ids[(engine, user_id, name)] = category_id
+            while len(self._names) > self.max_size:
+                (evicted, _), key = self._names.popitem(last=False)
+                self._ids.pop((evicted, *key), None)
+
+    def discard(self, engine, category_ids):
+        """
+        Forget categories, e.g. ones created by a rolled back transaction
+        """
+        with self._lock:
+            for category_id in category_ids:
+                entry = self._names.pop((engine, category_id), None)
+                if entry is not None and self._ids.get((engine, *entry)) == category_id:
+                    del self._ids[(engine, *entry)]
+
+    def name_of(self, category_id, connection=None):
+        """
+        Resolve a category id to its name
+
+        Args:
+            category_id (int): Category's unique identifier, may be None
+            connection: SQLAlchemy connection used on a cache miss
+
+        Returns:
+            str: Category name, or None
+        """
+        if category_id is None:
+            return None
+
+        engine = _engine(connection)
+        entry = self._names.get((engine, category_id))
+        if entry is None:
+            self.load([category_id], connection)
+            entry = self._names.get((engine, category_id))
+        return entry[1] if entry else None
+
+    def names(self, category_ids, connection=None):
+        """
+        Resolve several category ids with at most one query
+
+        Returns:
+            dict: Names keyed by category id
+        """
+        engine = _engine(connection)
+        missing = [
+            category_id
+            for category_id in set(category_ids)
+            if category_id is not None and (engine, category_id) not in self._names
+        ]
+        if missing:
+            self.load(missing, connection)
+
+        return {
+            category_id: self._names[(engine, category_id)][1]
+            for category_id in category_ids
+            if (engine, category_id) in self._names
+        }
+
+    def id_of(self, user_id, name, connection=None):
+        """
+        Look up the id of an existing category without creating it
+
+        Returns:
+            int: Category id, or None if the user has no such category
+        """
+        if name is None:
+            return None
+
+        engine = _engine(connection)
+        category_id = self._ids.get((engine, user_id, name))
+        if category_id is None:
+            row = _execute(
+                connection,
+                select(Category.id).where(
+                    Category.user_id == user_id, Category.name == name
+                ),
+            ).first()
+            if row is None:
+                return None
+            category_id = row[0]
+            if not _is_pending(engine, category_id):
+                self.add(engine, category_id, user_id, name)
+
+        return category_id
+
+    def load(self, category_ids, connection=None):
+        """
+        Fetch categories missing from the cache
+        """
+        engine = _engine(connection)
+        rows = _execute(
+            connection,
+            select(Category.id, Category.user_id, Category.name).where(
+                Category.id.in_(category_ids)
+            ),
+        )
+        for category_id, user_id, name in rows:
+            if not _is_pending(engine, category_id):
+                self.add(engine, category_id, user_id, name)
+            else:
+                # Uncommitted categories are only visible to their session
+                self._names.setdefault((engine, category_id), (user_id, name))
+
+
+category_cache = CategoryCache()
+
+
+@event.listens_for(Category.__table__, "after_create")
+@event.listens_for(Category.__table__, "after_drop")
+def _clear_category_cache(target, connection, **kw):
+    category_cache.clear()
+
+
+def _engine(connection):
+    # The database the categories are read from, e.g. the bound shard
+    if connection is not None:
+        return connection.engine
+    return db.session.get_bind(mapper=Category.__mapper__)
+
+
+def _execute(connection, statement):
+    if connection is not None:
+        return connection.execute(statement)
+    return db.session.execute(statement)
+
+
+def _is_pending(engine, category_id):
+    pending = db.session.info.get(PENDING_CATEGORIES_KEY) or ()
+    return any(entry[:2] == (engine, category_id) for entry in pending)
+
+
+def get_or_create_category_id(session, user_id, name):
+    """
+    Resolve a category name to its id, creating the category if needed
+
+    Args:
+        session: SQLAlchemy session of the current transaction
+        user_id (int): User's unique identifier
+        name (str): Category name
+
+    Returns:
+        int: Category id
+    """
+    # The mapper selects the database holding the table, e.g. a shard
+    connection = session.connection(bind_arguments={"mapper": Category.__mapper__})
+    category_id = category_cache.id_of(user_id, name, connection)
+    if category_id is not None:
+        return category_id
+
+    table = Category.__table__
+    dialects = {"postgresql": postgresql, "sqlite": sqlite}
+    dialect = dialects.get(connection.dialect.name)
+    if dialect is not None:
+        # Concurrent writers may create the same category
+        connection.execute(
+            dialect.insert(table)
+            .values(user_id=user_id, name=name)
+            .on_conflict_do_nothing(index_elements=["user_id", "name"])
+        )
+    else:
+        connection.execute(table.insert().values(user_id=user_id, name=name))
+
+    category_id = connection.execute(
+        select(table.c.id).where(table.c.user_id == user_id, table.c.name == name)
+    ).scalar()
+    savepoint_list(session, PENDING_CATEGORIES_KEY).append(
+        (connection.engine, category_id, user_id, name)
+    )
+    return category_id
+
+
+class CategorizedMixin:
+    """
+    Exposes the ``category_id`` foreign key as a ``category`` name
+
+    Assigning a name resolves it through the cache when possible; unknown
+    names are resolved, and created if needed, right before the flush. In
+    queries ``Model.category`` compiles to a name lookup, while hot paths
+    filter and group on ``category_id`` directly.
+    """
+
+    @hybrid_property
+    def category(self):
+        if getattr(self, "_category_pending", False):
+            return self._category_name
+        return category_cache.name_of(self.category_id)
+
+    @category.setter
+    def category(self, name):
+        category_id = (
+            category_cache.id_of(self.user_id, name)
+            if name is not None and self.user_id is not None
+            else None
+        )
+        if name is None or category_id is not None:
+            self.category_id = category_id
+            self._category_pending = False
+            return
+
+        self._category_name = name
+        self._category_pending = True
+        if attributes.instance_state(self).persistent:
+            attributes.flag_dirty(self)
+
+    @category.expression
+    def category(cls):
+        return (
+            select(Category.name)
+            .where(Category.id == cls.category_id)
+            .correlate_except(Category)
+            .scalar_subquery()
+        )
+
+    @classmethod
+    def category_is(cls, user_id, name):
+        """
+        Build an index-friendly filter on a user's category name
+        """
+        category_id = category_cache.id_of(user_id, name)
+        if category_id is None:
+            return false()
+        return cls.category_id == category_id
+
+
+@event.listens_for(Session, "before_flush")
+def _resolve_pending_categories(session, flush_context, instances):
+    for target in list(session.new) + list(session.dirty):
+        if getattr(target, "_category_pending", False):
+            target.category_id = get_or_create_category_id(
+                session, target.user_id, target._category_name
+            )
+            target._category_pending = False
+
+
+def _cache_committed_categories(created):
+    for engine, category_id, user_id, name in created:
+        category_cache.add(engine, category_id, user_id, name)
+
+
+def _discard_pending_categories(created):
+    for engine, category_id, _, _ in created:
+        category_cache.discard(engine, [category_id])
+
+
+register_buffer(
+    PENDING_CATEGORIES_KEY,
+    committed=_cache_committed_categories,
+    discarded=_discard_pending_categories,
+)
@@ -0,0 +1,59 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from .. import db
+from .category import CategorizedMixin
+
+
+class CategoryBaseline(CategorizedMixin, db.Model):
+    """
+    Robust spending statistics of a user's category used to flag anomalies
+    """
+
+    __tablename__ = "category_baselines"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    median_amount = Column(Float, nullable=False)
+    mad_amount = Column(Float, nullable=False)
+    daily_rate = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def to_dict(self):
+        """
+        Serialize baseline object to dictionary
+        """
+        return {
+            "category": self.category,
+            "median_amount": self.median_amount,
+            "mad_amount": self.mad_amount,
+            "daily_rate": self.daily_rate,
+            "sample_count": self.sample_count,
+            "computed_at": self.computed_at.isoformat() if self.computed_at else None,
+        }
+
+    def __repr__(self):
+        """
+        String representation of the CategoryBaseline model
+        """
+        return f"<CategoryBaseline {self.user_id} {self.category}>"
+
+
+class BaselineRefresh(db.Model):
+    """
+    When the baselines of a user were last computed
+
+    Kept apart from the baselines so users without any recent expenses,
+    and therefore without baselines, are not recomputed on every read.
+    """
+
+    __tablename__ = "baseline_refreshes"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        """
+        String representation of the BaselineRefresh model
+        """
+        return f"<BaselineRefresh {self.user_id} {self.computed_at}>"
@@ -0,0 +1,135 @@
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from .. import db
+from ..utils.quantile_sketch import TDigest
+from .expense import Expense
+from .budget import month_key, previous_value
+from .category import CategorizedMixin
+
+
+class CategorySketch(CategorizedMixin, db.Model):
+    """
+    Quantile sketch of a user's expense amounts per month and category
+
+    Inserts are folded into the digest as they happen. Digests cannot forget
+    values, so updates and deletes only flag the sketch as stale. Reads
+    recompute stale sketches from that single month of expenses until
+    ``sketches rebuild --stale`` stores them again.
+    """
+
+    __tablename__ = "category_sketches"
+
+    # Key order lets a user's month range be read as one index range
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(String(7), primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    digest = Column(Text, nullable=False)
+    stale = Column(Boolean, nullable=False, default=False)
+
+    def to_digest(self):
+        """
+        Deserialize the stored digest
+        """
+        return TDigest.from_json(self.digest)
+
+    def __repr__(self):
+        """
+        String representation of the CategorySketch model
+        """
+        return f"<CategorySketch {self.user_id} {self.month} {self.category}>"
+
+
+def _sketch_key(table, user_id, category_id, date):
+    return (
+        (table.c.user_id == user_id)
+        & (table.c.month == month_key(date))
+        & (table.c.category_id == category_id)
+    )
+
+
+def _add_value(connection, user_id, category_id, date, amount):
+    """
+    Fold a new expense amount into its sketch
+
+    A missing sketch is inserted empty before its row is locked, so
+    concurrent first writers of a month and category wait on the same row
+    instead of both inserting it.
+    """
+    table = CategorySketch.__table__
+    key = _sketch_key(table, user_id, category_id, date)
+    values = {
+        "user_id": user_id,
+        "month": month_key(date),
+        "category_id": category_id,
+        "digest": TDigest().to_json(),
+        "stale": False,
+    }
+
+    dialects = {"postgresql": postgresql, "sqlite": sqlite}
+    dialect = dialects.get(connection.dialect.name)
+    if dialect is not None:
+        connection.execute(
+            dialect.insert(table)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["user_id", "month", "category_id"])
+        )
+
+    row = connection.execute(
+        select(table.c.digest, table.c.stale).where(key).with_for_update()
+    ).first()
+    if row is None:
+        connection.execute(table.insert().values(**values))
+        row = connection.execute(select(table.c.digest, table.c.stale).where(key)).one()
+
+    if not row.stale:
+        digest = TDigest.from_json(row.digest)
+        digest.add(amount)
+        connection.execute(table.update().where(key).values(digest=digest.to_json()))
+
+
+def _mark_stale(connection, user_id, category_id, date):
+    """
+    Flag a sketch for rebuilding after a value was changed or removed
+    """
+    table = CategorySketch.__table__
+    connection.execute(
+        table.update()
+        .where(_sketch_key(table, user_id, category_id, date))
+        .values(stale=True)
+    )
+
+
+@event.listens_for(Expense, "after_insert")
+def _expense_inserted(mapper, connection, target):
+    _add_value(
+        connection, target.user_id, target.category_id, target.date, target.amount
+    )
+
+
+@event.listens_for(Expense, "after_update")
+def _expense_updated(mapper, connection, target):
+    old = {
+        name: previous_value(target, name)
+        for name in ("amount_cents", "category_id", "date")
+    }
+    if (
+        old["amount_cents"] == target.amount_cents
+        and old["category_id"] == target.category_id
+    ):
+        if month_key(old["date"]) == month_key(target.date):
+            return
+
+    _mark_stale(connection, target.user_id, old["category_id"], old["date"])
+    _add_value(
+        connection, target.user_id, target.category_id, target.date, target.amount
+    )
+
+
+@event.listens_for(Expense, "after_delete")
+def _expense_deleted(mapper, connection, target):
+    _mark_stale(
+        connection,
+        target.user_id,
+        previous_value(target, "category_id"),
+        previous_value(target, "date"),
+    )
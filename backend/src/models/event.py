@@ -1,16 +1,28 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .. import db
 from .user import User
+from .category import CategorizedMixin
+from ..utils.text_search import register_search_index
 
 
-class Event(db.Model):
+class Event(CategorizedMixin, db.Model):
     """
     Event model for tracking user calendar events
     """
 
     __tablename__ = "events"
+    __search_columns__ = ("title", "location", "description")
+    __table_args__ = (
+        # Time-bounded per-user queries; also the partition key on PostgreSQL
+        Index("ix_events_user_id_start_time", "user_id", "start_time"),
+        Index("ix_events_user_id_category_id", "user_id", "category_id"),
+        # Title prefixes of list filters
+        Index("ix_events_user_id_title", "user_id", "title"),
+        # Events of all users starting soon, loaded by the reminder scheduler
+        Index("ix_events_start_time", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -18,9 +30,12 @@ class Event(db.Model):
     description = Column(String(255))
     start_time = Column(DateTime(timezone=True), nullable=False)
     end_time = Column(DateTime(timezone=True), nullable=False)
-    category = Column(String(50))
+    category_id = Column(Integer, ForeignKey("categories.id"))
     location = Column(String(255))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
 
     # Relationship
     user = relationship("User", back_populates="events")
@@ -39,6 +54,7 @@ class Event(db.Model):
             "category": self.category,
             "location": self.location,
             "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
     @classmethod
@@ -54,3 +70,6 @@ class Event(db.Model):
         String representation of the Event model
         """
         return f"<Event {self.id}: {self.title} - {self.start_time}>"
+
+
+register_search_index(Event)
@@ -0,0 +1,47 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import func
+from .. import db
+from .user import User
+
+
+class EventReminder(db.Model):
+    """
+    Delivery record of an event reminder
+
+    A scheduler inserts the row before handing a reminder to its sink; the
+    unique constraint lets only one scheduler claim a reminder, so several
+    schedulers, or one restarting, never send it twice. A claim never marked
+    sent expires, so a scheduler stopping before it sent the reminder does
+    not lose it. Rescheduling an event changes ``remind_at`` and therefore
+    gets a reminder of its own.
+    """
+
+    __tablename__ = "event_reminders"
+    __table_args__ = (
+        UniqueConstraint("event_id", "remind_at", name="uq_event_reminders_event"),
+    )
+
+    STATUS_CLAIMED = "claimed"
+    STATUS_SENT = "sent"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Not a foreign key: the record outlives deleted events
+    event_id = Column(Integer, nullable=False)
+    remind_at = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String(10), nullable=False, default=STATUS_CLAIMED)
+    claimed_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        """
+        String representation of the EventReminder model
+        """
+        return f"<EventReminder {self.event_id} at {self.remind_at}: {self.status}>"
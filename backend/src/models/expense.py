@@ -1,27 +1,97 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from datetime import datetime
+from sqlalchemy import (
+    Column,
+    Integer,
+    BigInteger,
+    String,
+    DateTime,
+    ForeignKey,
+    Index,
+    case,
+)
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .. import db
 from .user import User
+from .category import CategorizedMixin
+from ..utils.text_search import register_search_index
+from ..utils.money import (
+    CURRENCY_EXPONENTS,
+    DEFAULT_CURRENCY,
+    from_cents,
+    minor_units,
+    to_cents,
+)
 
 
-class Expense(db.Model):
+class Expense(CategorizedMixin, db.Model):
     """
     Expense model for tracking user expenses
     """
 
     __tablename__ = "expenses"
+    __search_columns__ = ("description",)
+    __table_args__ = (
+        # Date-bounded per-user queries; also the partition key on PostgreSQL
+        Index("ix_expenses_user_id_date", "user_id", "date"),
+        Index("ix_expenses_user_id_category_id", "user_id", "category_id"),
+        # Amount ranges and sorts, and description prefixes of list filters
+        Index("ix_expenses_user_id_amount_cents", "user_id", "amount_cents"),
+        Index("ix_expenses_user_id_description", "user_id", "description"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    amount = Column(Float, nullable=False)
-    category = Column(String(50), nullable=False)
+    # Integer minor units keep sums exact; see the amount property for units
+    amount_cents = Column(BigInteger, nullable=False)
+    currency = Column(
+        String(3),
+        nullable=False,
+        default=DEFAULT_CURRENCY,
+        server_default=DEFAULT_CURRENCY,
+    )
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     description = Column(String(255))
-    date = Column(DateTime(timezone=True), server_default=func.now())
+    date = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=datetime.utcnow,
+        server_default=func.now(),
+    )
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
 
     # Relationship
     user = relationship("User", back_populates="expenses")
 
+    def __init__(self, **kwargs):
+        # The amount is scaled by the currency, so that is assigned first
+        if "currency" in kwargs:
+            self.currency = kwargs.pop("currency")
+        super().__init__(**kwargs)
+
+    @hybrid_property
+    def amount(self):
+        """
+        Amount in currency units, as exposed by the API
+        """
+        return from_cents(self.amount_cents, self.currency)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = to_cents(value, self.currency)
+
+    @amount.expression
+    def amount(cls):
+        scale = case(
+            {code: 10.0**exponent for code, exponent in CURRENCY_EXPONENTS.items()},
+            value=cls.currency,
+            else_=float(minor_units(DEFAULT_CURRENCY)),
+        )
+        return cls.amount_cents / scale
+
     def to_dict(self):
         """
         Serialize expense object to dictionary
@@ -30,19 +100,26 @@ class Expense(db.Model):
             "id": self.id,
             "user_id": self.user_id,
             "amount": self.amount,
+            "currency": self.currency,
             "category": self.category,
             "description": self.description,
             "date": self.date.isoformat() if self.date else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
     @classmethod
-    def validate_expense(cls, amount, category):
+    def validate_expense(cls, amount, category, currency=DEFAULT_CURRENCY):
         """
         Validate expense data before creation
         """
         if amount <= 0:
             raise ValueError("Expense amount must be positive")
 
+        if to_cents(amount, currency) <= 0:
+            raise ValueError(
+                "Expense amount must be at least one minor unit of the currency"
+            )
+
         if not category or len(category.strip()) == 0:
             raise ValueError("Category cannot be empty")
 
@@ -51,3 +128,6 @@ class Expense(db.Model):
         String representation of the Expense model
         """
         return f"<Expense {self.id}: ${self.amount} - {self.category}>"
+
+
+register_search_index(Expense)
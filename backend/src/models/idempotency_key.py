@@ -0,0 +1,47 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    SmallInteger,
+    String,
+    Text,
+    DateTime,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+)
+from .. import db
+from .user import User
+
+
+class IdempotencyKey(db.Model):
+    """
+    Response of a create request, stored under its client's Idempotency-Key
+
+    Keys are unique per user, so retries of a request are answered from
+    here instead of creating the record again. A row is committed in the
+    same transaction as the record it created, response included. Rows are
+    purged once they expire.
+    """
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+        # Purges delete the expired rows
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(64), nullable=False)
+    # Digest of the method, path and body the key was first used with
+    request_hash = Column(String(32), nullable=False)
+    status_code = Column(SmallInteger)
+    response = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        """
+        String representation of the IdempotencyKey model
+        """
+        return f"<IdempotencyKey {self.user_id}:{self.key} {self.status_code}>"
@@ -0,0 +1,92 @@
+import json
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from .. import db
+from .user import User
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class Job(db.Model):
+    """
+    Background job queued by a request and run by a job worker
+
+    Workers claim queued jobs whose ``run_after`` has passed by switching
+    them to running with a conditional update, so several worker processes
+    can share the table. Workers refresh ``heartbeat_at`` of the jobs they
+    run, so a running job whose heartbeat stopped was lost with its worker.
+    Failed attempts are retried with a backoff until ``max_attempts`` is
+    reached, and finished jobs are purged once their result expires.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers look for the oldest runnable job
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_user_id_created_at", "user_id", "created_at"),
+    )
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default=STATUS_QUEUED)
+    payload = Column(Text, nullable=False, default="{}")
+    result = Column(Text)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    expires_at = Column(DateTime(timezone=True))
+
+    @staticmethod
+    def dump(value):
+        """
+        Encode a payload or result, dates included, as JSON text
+        """
+        return json.dumps(value, default=_json_default)
+
+    def get_payload(self):
+        return json.loads(self.payload or "{}")
+
+    def get_result(self):
+        return json.loads(self.result) if self.result is not None else None
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def to_dict(self):
+        """
+        Serialize job object to dictionary, without its result
+        """
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    def __repr__(self):
+        """
+        String representation of the Job model
+        """
+        return f"<Job {self.id}: {self.kind} - {self.status}>"
@@ -0,0 +1,185 @@
+import logging
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey,
+    Index,
+    event,
+    text,
+)
+from sqlalchemy.orm import object_session
+from sqlalchemy.sql import func
+from .. import db
+from ..utils.session_buffers import register_buffer, savepoint_list
+from .expense import Expense
+from .event import Event
+
+logger = logging.getLogger(__name__)
+
+
+class SyncChange(db.Model):
+    """
+    Append-only change log backing the incremental sync feed
+
+    Every insert, update and delete of an expense or event appends a row here.
+    The autoincrement ``id`` is the monotonic sync cursor and delete rows act
+    as tombstones, so clients can replay changes after any cursor they hold.
+
+    Ids are handed out at insert time, not commit time, so readers only
+    consume changes below ``commit_watermark``; a cursor never moves past
+    a change that may still be committed.
+    """
+
+    __tablename__ = "sync_changes"
+    __table_args__ = (
+        # Serves "WHERE user_id = ? AND id > ? ORDER BY id" as a range scan
+        Index("ix_sync_changes_user_id_id", "user_id", "id"),
+    )
+
+    OPERATION_CREATED = "created"
+    OPERATION_UPDATED = "updated"
+    OPERATION_DELETED = "deleted"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    entity_type = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    operation = Column(String(10), nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def to_dict(self):
+        """
+        Serialize change log entry to dictionary
+        """
+        return {
+            "cursor": self.id,
+            "entity_type": self.entity_type,
+            "entity_id": self.entity_id,
+            "operation": self.operation,
+            "changed_at": self.changed_at.isoformat() if self.changed_at else None,
+        }
+
+    def __repr__(self):
+        """
+        String representation of the SyncChange model
+        """
+        return f"<SyncChange {self.id}: {self.operation} {self.entity_type} {self.entity_id}>"
+
+
+# Entity types exposed through the sync feed, keyed by model
+SYNC_ENTITY_TYPES = {Expense: "expense", Event: "event"}
+
+# Seconds kept between the watermark and the oldest open write, so changes
+# logged within the same instant as it started are held back too
+WATERMARK_MARGIN_SECONDS = 0.1
+
+# Start of the oldest transaction of another session that has written and
+# is still open; its changes were logged after it started, so changes
+# logged before are the only ones sure to precede all of its ids
+_WATERMARK_SQL = text(
+    "SELECT LEAST(clock_timestamp(), ("
+    "SELECT min(xact_start) FROM pg_stat_activity "
+    "WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid() "
+    "AND datname = current_database()"
+    ")) - make_interval(secs => :margin)"
+)
+
+
+def commit_watermark(connection):
+    """
+    Get the time before which every logged change is committed or rolled back
+
+    PostgreSQL sequences hand out ids as rows are inserted, so a commit
+    can make a change visible after changes with higher ids. Changes are
+    logged with clock_timestamp(), and every open transaction that wrote
+    started after the watermark, so all its ids are higher than those of
+    changes logged before it. SQLite serializes writers, so its ids follow
+    commit order and no watermark is needed. The database role must see
+    the other sessions of the application in pg_stat_activity.
+
+    Args:
+        connection: Connection of the database holding the change log
+
+    Returns:
+        datetime: Watermark, or None when every visible change qualifies
+    """
+    if connection.dialect.name != "postgresql":
+        return None
+    # pg_stat_activity is otherwise read once per transaction
+    connection.execute(text("SELECT pg_stat_clear_snapshot()"))
+    return connection.execute(
+        _WATERMARK_SQL, {"margin": WATERMARK_MARGIN_SECONDS}
+    ).scalar()
+
+
+# Session.info key holding changes recorded in the current transaction
+PENDING_CHANGES_KEY = "pending_sync_changes"
+
+# Callbacks invoked with the list of changes of every committed transaction
+_commit_listeners = []
+
+
+def on_changes_committed(callback):
+    """
+    Register a callback receiving the changes of each committed transaction
+
+    Args:
+        callback (callable): Function accepting a list of change dictionaries
+
+    Returns:
+        callable: The callback, so this can be used as a decorator
+    """
+    _commit_listeners.append(callback)
+    return callback
+
+
+def _record_change(operation):
+    """
+    Build a mapper event listener that appends a change log row
+    """
+
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if operation == SyncChange.OPERATION_UPDATED:
+            if session is not None and not session.is_modified(target):
+                return
+
+        change = {
+            "user_id": target.user_id,
+            "entity_type": SYNC_ENTITY_TYPES[type(target)],
+            "entity_id": target.id,
+            "operation": operation,
+        }
+        values = dict(change)
+        if connection.dialect.name == "postgresql":
+            # The time of logging rather than of the transaction start, as
+            # commit_watermark relies on
+            values["changed_at"] = func.clock_timestamp()
+        result = connection.execute(SyncChange.__table__.insert().values(**values))
+
+        # Remember the change so listeners can act on it once the commit succeeds
+        if session is not None:
+            change["cursor"] = result.inserted_primary_key[0]
+            savepoint_list(session, PENDING_CHANGES_KEY).append(change)
+
+    return listener
+
+
+for _model in SYNC_ENTITY_TYPES:
+    event.listen(_model, "after_insert", _record_change(SyncChange.OPERATION_CREATED))
+    event.listen(_model, "after_update", _record_change(SyncChange.OPERATION_UPDATED))
+    event.listen(_model, "after_delete", _record_change(SyncChange.OPERATION_DELETED))
+
+
+def _dispatch_committed_changes(changes):
+    for callback in _commit_listeners:
+        try:
+            callback(changes)
+        except Exception:
+            # The transaction is already committed; never fail the caller
+            logger.exception("Sync change listener %r failed", callback)
+
+
+register_buffer(PENDING_CHANGES_KEY, committed=_dispatch_committed_changes)
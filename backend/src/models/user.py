@@ -3,6 +3,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from werkzeug.security import generate_password_hash, check_password_hash
 from .. import db
+from ..utils.money import DEFAULT_CURRENCY
 
 
 class User(db.Model):
@@ -16,6 +17,13 @@ class User(db.Model):
     username = Column(String(50), unique=True, nullable=False)
     email = Column(String(120), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
+    # Every expense of the user is in this currency, so totals can be summed
+    currency = Column(
+        String(3),
+        nullable=False,
+        default=DEFAULT_CURRENCY,
+        server_default=DEFAULT_CURRENCY,
+    )
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -45,9 +53,18 @@ class User(db.Model):
             "id": self.id,
             "username": self.username,
             "email": self.email,
+            "currency": self.currency,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
 
+    @staticmethod
+    def currency_of(user_id):
+        """
+        Get a user's account currency
+        """
+        currency = db.session.query(User.currency).filter_by(id=user_id).scalar()
+        return currency or DEFAULT_CURRENCY
+
     def __repr__(self):
         """
         String representation of the User model
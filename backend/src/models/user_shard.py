@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, Boolean, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from .. import db
+from .user import User
+
+
+class UserShard(db.Model):
+    """
+    Directory entry placing a user's data on one shard
+
+    Users are placed on the shard chosen by the consistent hash ring the
+    first time they are seen; the entry then stays authoritative, so the
+    ring can change without data moving until a rebalance moves it.
+    ``moving`` is set while a rebalance copies the user's rows.
+    """
+
+    __tablename__ = "user_shards"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard = Column(Integer, nullable=False)
+    moving = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def to_dict(self):
+        """
+        Serialize directory entry to dictionary
+        """
+        return {"user_id": self.user_id, "shard": self.shard, "moving": self.moving}
+
+    def __repr__(self):
+        """
+        String representation of the UserShard model
+        """
+        return f"<UserShard {self.user_id}: {self.shard}>"
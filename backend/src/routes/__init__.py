@@ -34,6 +34,24 @@ def server_error(error):
 from .auth_routes import auth_bp
 from .expense_routes import expense_bp
 from .event_routes import event_bp
+from .sync_routes import sync_bp
+from .stream_routes import stream_bp
+from .budget_routes import budget_bp
+from .admin_routes import admin_bp
+from .job_routes import job_bp
+from .dashboard_routes import dashboard_bp
+from .batch_routes import batch_bp
 
 # List of all blueprints for easy registration
-route_blueprints = [auth_bp, expense_bp, event_bp]
+route_blueprints = [
+    auth_bp,
+    expense_bp,
+    event_bp,
+    sync_bp,
+    stream_bp,
+    budget_bp,
+    admin_bp,
+    job_bp,
+    dashboard_bp,
+    batch_bp,
+]
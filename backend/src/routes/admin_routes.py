@@ -0,0 +1,165 @@
+from functools import wraps
+from flask import Blueprint, Response, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..utils.memory_diagnostics import memory_diagnostics
+from ..utils.profiling import request_profiler
+from ..utils.slow_queries import slow_query_recorder
+
+# Create admin blueprint
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+def admin_required(view):
+    """
+    Restrict a view to the users listed in the ADMIN_USER_IDS setting
+    """
+
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if get_jwt_identity() not in current_app.config.get("ADMIN_USER_IDS", ()):
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+@admin_bp.route("/slow-queries", methods=["GET"])
+@admin_required
+def get_slow_queries():
+    """
+    List the most recent SQL statements slower than the threshold
+    """
+    limit = request.args.get("limit", 50, type=int)
+
+    return jsonify(
+        {
+            "threshold_ms": slow_query_recorder.threshold_ms,
+            "slow_queries": slow_query_recorder.entries(limit),
+        }
+    ), 200
+
+
+@admin_bp.route("/slow-queries", methods=["DELETE"])
+@admin_required
+def clear_slow_queries():
+    """
+    Forget recorded slow statements, e.g. after a fix is deployed
+    """
+    slow_query_recorder.clear()
+
+    return jsonify({"message": "Slow queries cleared"}), 200
+
+
+@admin_bp.route("/profiling", methods=["GET"])
+@admin_required
+def get_profiling_status():
+    """
+    Get the profiler settings and the collected profiles
+    """
+    return jsonify(request_profiler.status()), 200
+
+
+@admin_bp.route("/profiling", methods=["POST"])
+@admin_required
+def start_profiling():
+    """
+    Start profiling endpoints or service methods
+    """
+    data = request.get_json() or {}
+
+    try:
+        status = request_profiler.start(
+            data.get("mode", "sampling"),
+            targets=data.get("targets"),
+            sample_rate=float(data.get("sample_rate", 1.0)),
+            interval_ms=float(
+                data.get("interval_ms", request_profiler.DEFAULT_INTERVAL_MS)
+            ),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(status), 200
+
+
+@admin_bp.route("/profiling", methods=["DELETE"])
+@admin_required
+def stop_profiling():
+    """
+    Stop profiling; collected profiles stay available
+    """
+    request_profiler.stop()
+
+    return jsonify(request_profiler.status()), 200
+
+
+@admin_bp.route("/profiles/<target>", methods=["GET"])
+@admin_required
+def get_profile(target):
+    """
+    Download the aggregated profile of an endpoint or service method
+    """
+    output_format = request.args.get("format", "text")
+    limit = request.args.get("limit", 50, type=int)
+
+    try:
+        body, mimetype = request_profiler.render(target, output_format, limit)
+    except KeyError:
+        return jsonify({"error": "No profile collected for this target"}), 404
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    return Response(body, mimetype=mimetype)
+
+
+@admin_bp.route("/profiles", methods=["DELETE"])
+@admin_required
+def clear_profiles():
+    """
+    Discard collected profiles
+    """
+    request_profiler.clear()
+
+    return jsonify({"message": "Profiles cleared"}), 200
+
+
+@admin_bp.route("/memory", methods=["GET"])
+@admin_required
+def get_memory_diagnostics():
+    """
+    Get the source lines that allocated the most memory per endpoint
+    """
+    top = request.args.get("top", 20, type=int)
+
+    return jsonify(memory_diagnostics.status(top=top)), 200
+
+
+@admin_bp.route("/memory", methods=["POST"])
+@admin_required
+def start_memory_diagnostics():
+    """
+    Start tracing allocations made during requests
+    """
+    data = request.get_json() or {}
+
+    try:
+        status = memory_diagnostics.start(
+            endpoints=data.get("endpoints"),
+            frames=int(data.get("frames", memory_diagnostics.DEFAULT_FRAMES)),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(status), 200
+
+
+@admin_bp.route("/memory", methods=["DELETE"])
+@admin_required
+def stop_memory_diagnostics():
+    """
+    Stop tracing allocations; results stay available
+    """
+    memory_diagnostics.stop()
+
+    return jsonify(memory_diagnostics.status()), 200
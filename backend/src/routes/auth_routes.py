@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from .. import db
 from ..models.user import User
+from ..utils.money import DEFAULT_CURRENCY, validate_currency
 
 # Create authentication blueprint
 auth_bp = Blueprint("auth", __name__)
@@ -31,8 +32,13 @@ def register():
     if existing_user:
         return jsonify({"error": "Username or email already exists"}), 409
 
+    try:
+        currency = validate_currency(data.get("currency", DEFAULT_CURRENCY))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
     # Create new user
-    new_user = User(username=data["username"], email=data["email"])
+    new_user = User(username=data["username"], email=data["email"], currency=currency)
     new_user.set_password(data["password"])
 
     try:
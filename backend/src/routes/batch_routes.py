@@ -0,0 +1,30 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..services.batch_service import BatchService
+
+# Create batch blueprint
+batch_bp = Blueprint("batch", __name__, url_prefix="/batch")
+
+
+@batch_bp.route("", methods=["POST"])
+@jwt_required()
+def run_batch():
+    """
+    Apply an ordered list of expense and event operations in one request
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True)
+
+    try:
+        operations = BatchService.parse_operations(data)
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    try:
+        result = BatchService.run(
+            current_user_id, operations, atomic=bool(data.get("atomic"))
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify(result), 200
@@ -0,0 +1,117 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from .. import db
+from ..models.budget import Budget
+from ..services.budget_service import BudgetService
+
+# Create budget blueprint
+budget_bp = Blueprint("budgets", __name__, url_prefix="/budgets")
+
+
+@budget_bp.route("", methods=["POST"])
+@jwt_required()
+def create_budget():
+    """
+    Create a new category budget
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+
+    # Validate input
+    if not data:
+        return jsonify({"error": "No input data provided"}), 400
+
+    try:
+        new_budget = BudgetService.create_budget(current_user_id, data)
+
+        return jsonify(
+            {"message": "Budget created successfully", "budget": new_budget.to_dict()}
+        ), 201
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@budget_bp.route("", methods=["GET"])
+@jwt_required()
+def get_budgets():
+    """
+    Retrieve budgets for the current user
+    """
+    current_user_id = get_jwt_identity()
+
+    return jsonify({"budgets": BudgetService.get_budgets(current_user_id)}), 200
+
+
+@budget_bp.route("/status", methods=["GET"])
+@jwt_required()
+def get_budget_status():
+    """
+    Get spending against each budget for a month
+    """
+    current_user_id = get_jwt_identity()
+    month = request.args.get("month")
+
+    try:
+        status = BudgetService.get_budget_status(current_user_id, month)
+    except ValueError:
+        return jsonify({"error": "Month must use the YYYY-MM format"}), 400
+
+    return jsonify(status), 200
+
+
+@budget_bp.route("/<int:budget_id>", methods=["PUT"])
+@jwt_required()
+def update_budget(budget_id):
+    """
+    Update an existing budget
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+
+    # Find the budget
+    budget = Budget.query.filter_by(id=budget_id, user_id=current_user_id).first()
+
+    if not budget:
+        return jsonify({"error": "Budget not found"}), 404
+
+    try:
+        budget = BudgetService.update_budget(budget, data or {})
+
+        return jsonify(
+            {"message": "Budget updated successfully", "budget": budget.to_dict()}
+        ), 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@budget_bp.route("/<int:budget_id>", methods=["DELETE"])
+@jwt_required()
+def delete_budget(budget_id):
+    """
+    Delete an existing budget
+    """
+    current_user_id = get_jwt_identity()
+
+    # Find the budget
+    budget = Budget.query.filter_by(id=budget_id, user_id=current_user_id).first()
+
+    if not budget:
+        return jsonify({"error": "Budget not found"}), 404
+
+    try:
+        db.session.delete(budget)
+        db.session.commit()
+
+        return jsonify({"message": "Budget deleted successfully"}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
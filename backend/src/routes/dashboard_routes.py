@@ -0,0 +1,24 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..services.dashboard_service import DashboardService
+from ..utils.database_guard import database_guard
+
+# Create dashboard blueprint
+dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
+
+
+@dashboard_bp.route("", methods=["GET"])
+@jwt_required()
+@database_guard.read(budget_ms=3000)
+def get_dashboard():
+    """
+    Get the expense and event widgets of the dashboard in one response
+    """
+    current_user_id = get_jwt_identity()
+
+    try:
+        widgets = DashboardService.parse_widgets(request.args.get("widgets"))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    return jsonify(DashboardService.get_dashboard(current_user_id, widgets)), 200
@@ -4,13 +4,45 @@ from sqlalchemy import func
 from datetime import datetime
 from .. import db
 from ..models.event import Event
+from ..utils.database_guard import database_guard
+from ..utils.idempotency import idempotent
+from ..utils.list_query import CategoryFilter, ListQuery, PrefixFilter, RangeFilter
+from ..utils.text_search import apply_search
+from ..utils.validators import parse_datetime_param
 
 # Create event blueprint
 event_bp = Blueprint("events", __name__)
 
+# Filters and sort orders accepted by the event list; end_date bounds when
+# events end, start_date when they start
+event_list_query = ListQuery(
+    Event,
+    filters=[
+        RangeFilter(
+            "start_time",
+            "start_date",
+            "end_date",
+            parse_datetime_param,
+            end_column="end_time",
+        ),
+        CategoryFilter(),
+        PrefixFilter("title", "title_prefix"),
+    ],
+    sorts={"start_time": "start_time"},
+    default_sort="start_time",
+)
+
+
+def event_created(event):
+    """
+    Body of the response to a created event
+    """
+    return {"message": "Event created successfully", "event": event.to_dict()}
+
 
 @event_bp.route("", methods=["POST"])
 @jwt_required()
+@idempotent(Event, event_created)
 def create_event():
     """
     Create a new event
@@ -44,9 +76,7 @@ def create_event():
         db.session.add(new_event)
         db.session.commit()
 
-        return jsonify(
-            {"message": "Event created successfully", "event": new_event.to_dict()}
-        ), 201
+        return jsonify(event_created(new_event)), 201
 
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
@@ -60,33 +90,26 @@ def create_event():
 def get_events():
     """
     Retrieve events for the current user
-    Support filtering and pagination
+    Support filtering, sorting and pagination
     """
     current_user_id = get_jwt_identity()
+    search = request.args.get("q")
 
-    # Get query parameters
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 10, type=int)
-    category = request.args.get("category")
-    start_date = request.args.get("start_date")
-    end_date = request.args.get("end_date")
-
-    # Base query
-    query = Event.query.filter_by(user_id=current_user_id)
-
-    # Apply filters
-    if category:
-        query = query.filter(Event.category == category)
-
-    if start_date:
-        query = query.filter(Event.start_time >= start_date)
+    try:
+        parsed = event_list_query.parse(request.args, ranked=bool(search))
+        query, ordering = event_list_query.apply(
+            Event.query.filter_by(user_id=current_user_id), parsed, current_user_id
+        )
 
-    if end_date:
-        query = query.filter(Event.end_time <= end_date)
+        # Full-text search, ranked by relevance
+        if search:
+            query, ordering = apply_search(query, Event, search, db.engine.dialect.name)
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
 
     # Paginate results
-    paginated_events = query.order_by(Event.start_time.asc()).paginate(
-        page=page, per_page=per_page
+    paginated_events = query.order_by(*ordering).paginate(
+        page=parsed["page"], per_page=parsed["per_page"]
     )
 
     return jsonify(
@@ -94,13 +117,14 @@ def get_events():
             "events": [event.to_dict() for event in paginated_events.items],
             "total": paginated_events.total,
             "pages": paginated_events.pages,
-            "current_page": page,
+            "current_page": parsed["page"],
         }
     ), 200
 
 
 @event_bp.route("/upcoming", methods=["GET"])
 @jwt_required()
+@database_guard.read(budget_ms=1000)
 def get_upcoming_events():
     """
     Get upcoming events for the current user
@@ -1,16 +1,52 @@
-from flask import Blueprint, request, jsonify
+import csv
+import io
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import func
 from .. import db
 from ..models.expense import Expense
 from ..models.user import User
+from ..services.expense_service import ExpenseService
+from ..services.anomaly_service import AnomalyService
+from ..utils.money import validate_currency
+from ..utils.database_guard import database_guard
+from ..utils.idempotency import idempotent
+from ..utils.list_query import (
+    AmountFilter,
+    CategoryFilter,
+    ListQuery,
+    PrefixFilter,
+    RangeFilter,
+)
+from ..utils.text_search import apply_search
+from ..utils.validators import parse_datetime_param
 
 # Create expense blueprint
 expense_bp = Blueprint("expenses", __name__)
 
+# Filters and sort orders accepted by the expense list
+expense_list_query = ListQuery(
+    Expense,
+    filters=[
+        RangeFilter("date", "start_date", "end_date", parse_datetime_param),
+        AmountFilter("min_amount", "max_amount"),
+        CategoryFilter(),
+        PrefixFilter("description", "description_prefix"),
+    ],
+    sorts={"date": "date", "amount": "amount_cents"},
+    default_sort="-date",
+)
+
+
+def expense_created(expense):
+    """
+    Body of the response to a created expense
+    """
+    return {"message": "Expense created successfully", "expense": expense.to_dict()}
+
 
 @expense_bp.route("", methods=["POST"])
 @jwt_required()
+@idempotent(Expense, expense_created)
 def create_expense():
     """
     Create a new expense
@@ -23,13 +59,20 @@ def create_expense():
         return jsonify({"error": "No input data provided"}), 400
 
     try:
+        # Expenses are in the account currency
+        account_currency = User.currency_of(current_user_id)
+        currency = validate_currency(
+            data.get("currency", account_currency), account_currency
+        )
+
         # Validate expense data
-        Expense.validate_expense(data.get("amount"), data.get("category"))
+        Expense.validate_expense(data.get("amount"), data.get("category"), currency)
 
         # Create new expense
         new_expense = Expense(
             user_id=current_user_id,
             amount=data.get("amount"),
+            currency=currency,
             category=data.get("category"),
             description=data.get("description"),
         )
@@ -37,12 +80,7 @@ def create_expense():
         db.session.add(new_expense)
         db.session.commit()
 
-        return jsonify(
-            {
-                "message": "Expense created successfully",
-                "expense": new_expense.to_dict(),
-            }
-        ), 201
+        return jsonify(expense_created(new_expense)), 201
 
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
@@ -56,33 +94,28 @@ def create_expense():
 def get_expenses():
     """
     Retrieve expenses for the current user
-    Support filtering and pagination
+    Support filtering, sorting and pagination
     """
     current_user_id = get_jwt_identity()
+    search = request.args.get("q")
 
-    # Get query parameters
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 10, type=int)
-    category = request.args.get("category")
-    start_date = request.args.get("start_date")
-    end_date = request.args.get("end_date")
-
-    # Base query
-    query = Expense.query.filter_by(user_id=current_user_id)
-
-    # Apply filters
-    if category:
-        query = query.filter(Expense.category == category)
-
-    if start_date:
-        query = query.filter(Expense.date >= start_date)
+    try:
+        parsed = expense_list_query.parse(request.args, ranked=bool(search))
+        query, ordering = expense_list_query.apply(
+            Expense.query.filter_by(user_id=current_user_id), parsed, current_user_id
+        )
 
-    if end_date:
-        query = query.filter(Expense.date <= end_date)
+        # Full-text search, ranked by relevance
+        if search:
+            query, ordering = apply_search(
+                query, Expense, search, db.engine.dialect.name
+            )
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
 
     # Paginate results
-    paginated_expenses = query.order_by(Expense.date.desc()).paginate(
-        page=page, per_page=per_page
+    paginated_expenses = query.order_by(*ordering).paginate(
+        page=parsed["page"], per_page=parsed["per_page"]
     )
 
     return jsonify(
@@ -90,53 +123,106 @@ def get_expenses():
             "expenses": [expense.to_dict() for expense in paginated_expenses.items],
             "total": paginated_expenses.total,
             "pages": paginated_expenses.pages,
-            "current_page": page,
+            "current_page": parsed["page"],
         }
     ), 200
 
 
 @expense_bp.route("/summary", methods=["GET"])
 @jwt_required()
+@database_guard.read(budget_ms=2000)
 def get_expense_summary():
     """
     Get expense summary statistics
     """
     current_user_id = get_jwt_identity()
 
-    # Total expenses by category
-    category_summary = (
-        db.session.query(
-            Expense.category, func.sum(Expense.amount).label("total_amount")
+    return jsonify(ExpenseService.get_expense_summary(current_user_id)), 200
+
+
+@expense_bp.route("/export", methods=["GET"])
+@jwt_required()
+def export_expenses():
+    """
+    Download all expenses of the current user as CSV, archived ones included
+    """
+    current_user_id = get_jwt_identity()
+
+    try:
+        start_date = parse_datetime_param(request.args.get("start_date"), "start_date")
+        end_date = parse_datetime_param(request.args.get("end_date"), "end_date")
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(
+            buffer, fieldnames=ExpenseService.EXPORT_COLUMNS, extrasaction="ignore"
         )
-        .filter(Expense.user_id == current_user_id)
-        .group_by(Expense.category)
-        .all()
+        writer.writeheader()
+        for expense in ExpenseService.export_expenses(
+            current_user_id, start_date, end_date
+        ):
+            writer.writerow(expense)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=expenses.csv"},
     )
 
-    # Monthly total expenses
-    monthly_summary = (
-        db.session.query(
-            func.date_trunc("month", Expense.date).label("month"),
-            func.sum(Expense.amount).label("total_amount"),
+
+@expense_bp.route("/stats", methods=["GET"])
+@jwt_required()
+@database_guard.read(budget_ms=2000)
+def get_expense_statistics():
+    """
+    Get median and percentile spending per category over a month range
+    """
+    current_user_id = get_jwt_identity()
+
+    # Get query parameters
+    start_month = request.args.get("start_month")
+    end_month = request.args.get("end_month")
+    quantiles = request.args.get("quantiles", "0.5,0.9")
+
+    try:
+        statistics = ExpenseService.get_category_statistics(
+            current_user_id,
+            start_month=start_month,
+            end_month=end_month,
+            quantiles=[float(q) for q in quantiles.split(",")],
         )
-        .filter(Expense.user_id == current_user_id)
-        .group_by("month")
-        .order_by("month")
-        .all()
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    return jsonify(statistics), 200
+
+
+@expense_bp.route("/anomalies", methods=["GET"])
+@jwt_required()
+def get_expense_anomalies():
+    """
+    Get recent expenses that stand out from the user's spending history
+    """
+    current_user_id = get_jwt_identity()
+
+    # Get query parameters
+    days = request.args.get("days", 30, type=int)
+    threshold = request.args.get(
+        "threshold", AnomalyService.DEFAULT_THRESHOLD, type=float
     )
 
-    return jsonify(
-        {
-            "category_summary": [
-                {"category": cat, "total_amount": float(amount)}
-                for cat, amount in category_summary
-            ],
-            "monthly_summary": [
-                {"month": str(month), "total_amount": float(amount)}
-                for month, amount in monthly_summary
-            ],
-        }
-    ), 200
+    anomalies = AnomalyService.get_anomalies(
+        current_user_id, days=days, threshold=threshold
+    )
+
+    return jsonify({"anomalies": anomalies}), 200
 
 
 @expense_bp.route("/<int:expense_id>", methods=["PUT"])
@@ -156,8 +242,13 @@ def update_expense(expense_id):
 
     try:
         # Update expense fields
+        if "currency" in data:
+            expense.currency = validate_currency(
+                data["currency"], User.currency_of(current_user_id)
+            )
+
         if "amount" in data:
-            Expense.validate_expense(data["amount"], expense.category)
+            Expense.validate_expense(data["amount"], expense.category, expense.currency)
             expense.amount = data["amount"]
 
         if "category" in data:
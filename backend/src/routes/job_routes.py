@@ -0,0 +1,102 @@
+import os
+from flask import Blueprint, request, jsonify, send_file, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from .. import db
+from ..models.job import Job
+from ..services.job_service import JobService
+
+# Create job blueprint
+job_bp = Blueprint("jobs", __name__, url_prefix="/jobs")
+
+
+@job_bp.route("", methods=["POST"])
+@jwt_required()
+def create_job():
+    """
+    Queue a report, summary, import or export to run in the background
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+
+    # Validate input
+    if not data or "kind" not in data:
+        return jsonify({"error": "Job kind is required"}), 400
+
+    try:
+        job = JobService.enqueue(current_user_id, data["kind"], data)
+
+        status_url = url_for("jobs.get_job", job_id=job.id)
+        return (
+            jsonify({"message": "Job queued", "job": job.to_dict()}),
+            202,
+            {"Location": status_url},
+        )
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@job_bp.route("", methods=["GET"])
+@jwt_required()
+def get_jobs():
+    """
+    List the most recent jobs of the current user
+    """
+    current_user_id = get_jwt_identity()
+    limit = min(request.args.get("limit", 20, type=int), 100)
+
+    jobs = JobService.get_jobs(current_user_id, limit)
+    return jsonify({"jobs": [job.to_dict() for job in jobs]}), 200
+
+
+@job_bp.route("/<int:job_id>", methods=["GET"])
+@jwt_required()
+def get_job(job_id):
+    """
+    Get the status of a job
+    """
+    current_user_id = get_jwt_identity()
+
+    job = JobService.get_job(current_user_id, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job.to_dict()), 200
+
+
+@job_bp.route("/<int:job_id>/result", methods=["GET"])
+@jwt_required()
+def get_job_result(job_id):
+    """
+    Fetch the result of a finished job
+    """
+    current_user_id = get_jwt_identity()
+
+    job = JobService.get_job(current_user_id, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not job.is_finished:
+        return (
+            jsonify({"message": "Job not finished", "job": job.to_dict()}),
+            202,
+            {"Retry-After": "5"},
+        )
+    if job.status == Job.STATUS_FAILED:
+        return jsonify({"error": job.error, "job": job.to_dict()}), 409
+
+    result = job.get_result()
+    if isinstance(result, dict) and result.get("file"):
+        path = JobService.get_result_path(job.id, "csv")
+        if not os.path.exists(path):
+            return jsonify({"error": "Job result expired"}), 410
+        return send_file(
+            os.path.abspath(path),
+            mimetype=result["mimetype"],
+            as_attachment=True,
+            download_name=f"{job.kind}.csv",
+        )
+
+    return jsonify({"job": job.to_dict(), "result": result}), 200
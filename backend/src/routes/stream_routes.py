@@ -0,0 +1,88 @@
+from datetime import timedelta
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt_extended import (
+    create_access_token,
+    get_jwt,
+    get_jwt_identity,
+    get_jwt_request_location,
+    jwt_required,
+)
+from .. import jwt
+from ..services.notification_service import NotificationService
+
+# Create stream blueprint
+stream_bp = Blueprint("stream", __name__, url_prefix="/stream")
+
+# Claim marking tokens that may only open the notification stream
+STREAM_SCOPE = "stream"
+
+# Stream tokens end up in URLs and access logs, so they expire quickly
+STREAM_TOKEN_TTL = timedelta(minutes=1)
+
+
+@jwt.token_verification_loader
+def _check_token_scope(jwt_header, jwt_data):
+    # Stream tokens are not accepted anywhere but the stream itself
+    return jwt_data.get("scope") != STREAM_SCOPE or request.blueprint == "stream"
+
+
+@jwt.token_verification_failed_loader
+def _reject_token_scope(jwt_header, jwt_data):
+    return jsonify({"error": "Stream tokens only open the notification stream"}), 403
+
+
+@stream_bp.route("/token", methods=["POST"])
+@jwt_required()
+def create_stream_token():
+    """
+    Issue a short-lived token for opening the notification stream
+
+    EventSource cannot set headers, so the stream token is passed in its
+    URL instead of the access token. It only opens the stream, and only
+    within a minute; reconnecting takes a new one.
+    """
+    if get_jwt().get("scope") == STREAM_SCOPE:
+        return jsonify({"error": "Stream tokens cannot issue tokens"}), 403
+
+    token = create_access_token(
+        identity=get_jwt_identity(),
+        expires_delta=STREAM_TOKEN_TTL,
+        additional_claims={"scope": STREAM_SCOPE},
+    )
+
+    return (
+        jsonify(
+            {
+                "token": token,
+                "expires_in": int(STREAM_TOKEN_TTL.total_seconds()),
+            }
+        ),
+        201,
+    )
+
+
+@stream_bp.route("", methods=["GET"])
+@jwt_required(locations=["headers", "query_string"])
+def stream_changes():
+    """
+    Push expense and event change notifications as server-sent events
+
+    EventSource cannot set headers, so a token from POST /stream/token may
+    be passed as the ``jwt`` query string parameter instead. Regular access
+    tokens are only accepted in the Authorization header.
+    """
+    if (
+        get_jwt_request_location() == "query_string"
+        and get_jwt().get("scope") != STREAM_SCOPE
+    ):
+        return jsonify(
+            {"error": "Query string tokens must come from /stream/token"}
+        ), 401
+
+    current_user_id = get_jwt_identity()
+
+    return Response(
+        stream_with_context(NotificationService.stream(current_user_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
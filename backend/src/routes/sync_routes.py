@@ -0,0 +1,26 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..services.sync_service import SyncService
+
+# Create sync blueprint
+sync_bp = Blueprint("sync", __name__, url_prefix="/sync")
+
+
+@sync_bp.route("/changes", methods=["GET"])
+@jwt_required()
+def get_changes():
+    """
+    Retrieve expense and event changes since a sync cursor
+    """
+    current_user_id = get_jwt_identity()
+
+    # Get query parameters
+    since = request.args.get("since", 0, type=int)
+    limit = request.args.get("limit", SyncService.DEFAULT_LIMIT, type=int)
+
+    try:
+        changes = SyncService.get_changes(current_user_id, since=since, limit=limit)
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    return jsonify(changes), 200
@@ -4,9 +4,32 @@
 # Import specific service modules
 from .expense_service import ExpenseService
 from .event_service import EventService
+from .sync_service import SyncService
+from .notification_service import NotificationService
+from .budget_service import BudgetService
+from .anomaly_service import AnomalyService
+from .admin_analytics_service import AdminAnalyticsService
+from .archive_service import ArchiveService
+from .job_service import JobService
+from .dashboard_service import DashboardService
+from .reminder_service import ReminderService
+from .batch_service import BatchService
 
 # List of all services for potential global access
-__all__ = ["ExpenseService", "EventService"]
+__all__ = [
+    "ExpenseService",
+    "EventService",
+    "SyncService",
+    "NotificationService",
+    "BudgetService",
+    "AnomalyService",
+    "AdminAnalyticsService",
+    "ArchiveService",
+    "JobService",
+    "DashboardService",
+    "ReminderService",
+    "BatchService",
+]
 
 
 # You can add any package-level service configurations or utility methods here
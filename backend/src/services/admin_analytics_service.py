@@ -0,0 +1,241 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, func, select, text
+from .. import db
+from ..models.expense import Expense
+from ..models.event import Event
+from ..models.user import User
+from ..models.category import Category
+from ..utils.money import from_cents
+from ..utils.sharding import shard_router
+from ..utils.sql_helpers import truncate_date, format_date_bucket
+
+
+class ChunkThrottle:
+    """
+    Rate limiter spacing out the start of chunk scans across workers
+    """
+
+    def __init__(self, chunks_per_second=None):
+        self.interval = 1.0 / chunks_per_second if chunks_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_start = time.monotonic()
+
+    def wait(self):
+        """
+        Block until the next chunk is allowed to start
+        """
+        if not self.interval:
+            return
+
+        with self._lock:
+            start = max(self._next_start, time.monotonic())
+            self._next_start = start + self.interval
+
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AdminAnalyticsService:
+    """
+    Service layer computing platform-wide statistics across all users
+
+    The expenses and events tables are split into user_id ranges which are
+    aggregated independently by a pool of workers and merged afterwards.
+    Every metric is grouped per user range first, so partial results add up
+    exactly; in particular a user is only ever counted in one chunk, which
+    makes distinct active user counts additive. With sharding on, every
+    shard is split into its own ranges, each user's data living on a
+    single shard.
+    """
+
+    DEFAULT_CHUNK_SIZE = 1000
+    DEFAULT_MAX_WORKERS = 4
+
+    # Upper bound for a single chunk query, in milliseconds (PostgreSQL only)
+    DEFAULT_STATEMENT_TIMEOUT = 30000
+
+    @staticmethod
+    def get_user_id_ranges(connection, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Split the user id space into half-open ranges
+
+        Args:
+            connection: SQLAlchemy connection
+            chunk_size (int): Width of each user id range
+
+        Returns:
+            list: (start, end) tuples covering every user id
+        """
+        lowest, highest = connection.execute(
+            select(func.min(User.id), func.max(User.id))
+        ).one()
+        if lowest is None:
+            return []
+
+        return [
+            (start, min(start + chunk_size, highest + 1))
+            for start in range(lowest, highest + 1, chunk_size)
+        ]
+
+    @staticmethod
+    def aggregate_chunk(connection, start, end, statement_timeout=None):
+        """
+        Aggregate the expenses and events of one user id range
+
+        Args:
+            connection: SQLAlchemy connection
+            start (int): First user id of the range
+            end (int): User id following the range
+            statement_timeout (int, optional): Per-query limit in milliseconds
+
+        Returns:
+            dict: Partial results keyed by metric
+        """
+        dialect_name = connection.dialect.name
+        if statement_timeout and dialect_name == "postgresql":
+            # SET LOCAL ends with the chunk's transaction, before the
+            # connection returns to the pool
+            connection.execute(
+                text(f"SET LOCAL statement_timeout = {int(statement_timeout)}")
+            )
+
+        month = truncate_date("month", Expense.date, dialect_name).label("month")
+        day = truncate_date("day", Event.start_time, dialect_name).label("day")
+
+        # Sum per category id first, then join the few groups to their names.
+        # Users spend in different currencies, which are never added up.
+        per_category = (
+            select(
+                Expense.category_id,
+                Expense.currency,
+                func.sum(Expense.amount_cents).label("total"),
+            )
+            .where(Expense.user_id >= start, Expense.user_id < end)
+            .group_by(Expense.category_id, Expense.currency)
+            .subquery()
+        )
+        category_spend = connection.execute(
+            select(
+                Category.name, per_category.c.currency, func.sum(per_category.c.total)
+            )
+            .join(per_category, per_category.c.category_id == Category.id)
+            .group_by(Category.name, per_category.c.currency)
+        )
+        active_users = connection.execute(
+            select(month, func.count(func.distinct(Expense.user_id)))
+            .where(Expense.user_id >= start, Expense.user_id < end)
+            .group_by(month)
+        )
+        event_volume = connection.execute(
+            select(day, func.count(Event.id))
+            .where(Event.user_id >= start, Event.user_id < end)
+            .group_by(day)
+        )
+
+        return {
+            "spend_by_category": Counter(
+                {
+                    (category, currency): int(total)
+                    for category, currency, total in category_spend
+                }
+            ),
+            "active_users_by_month": Counter(
+                {
+                    format_date_bucket(value, "month"): count
+                    for value, count in active_users
+                }
+            ),
+            "events_by_day": Counter(
+                {
+                    format_date_bucket(value, "day"): count
+                    for value, count in event_volume
+                }
+            ),
+        }
+
+    @staticmethod
+    def collect_platform_statistics(
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        max_workers=DEFAULT_MAX_WORKERS,
+        chunks_per_second=None,
+        statement_timeout=DEFAULT_STATEMENT_TIMEOUT,
+        database_url=None,
+    ):
+        """
+        Compute platform-wide statistics with parallel chunked scans
+
+        Args:
+            chunk_size (int): Width of each user id range
+            max_workers (int): Number of chunks aggregated concurrently
+            chunks_per_second (float, optional): Maximum rate of chunk starts
+            statement_timeout (int, optional): Per-query limit in milliseconds
+            database_url (str, optional): Read replica to scan instead of the
+                primary database or its shards
+
+        Returns:
+            dict: Spend per category, active users per month and events per day
+        """
+        engines = (
+            [create_engine(database_url, pool_size=max_workers)]
+            if database_url
+            else shard_router.engines or [db.engine]
+        )
+        throttle = ChunkThrottle(chunks_per_second)
+
+        def run_chunk(chunk):
+            engine, start, end = chunk
+            throttle.wait()
+            with engine.connect() as connection:
+                return AdminAnalyticsService.aggregate_chunk(
+                    connection, start, end, statement_timeout=statement_timeout
+                )
+
+        try:
+            chunks = []
+            for engine in engines:
+                with engine.connect() as connection:
+                    chunks.extend(
+                        (engine, start, end)
+                        for start, end in AdminAnalyticsService.get_user_id_ranges(
+                            connection, chunk_size
+                        )
+                    )
+
+            totals = {
+                "spend_by_category": Counter(),
+                "active_users_by_month": Counter(),
+                "events_by_day": Counter(),
+            }
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for partial in executor.map(run_chunk, chunks):
+                    for metric, values in partial.items():
+                        totals[metric].update(values)
+        finally:
+            if database_url:
+                engines[0].dispose()
+
+        return {
+            "chunks": len(chunks),
+            "spend_by_category": [
+                {
+                    "category": category,
+                    "currency": currency,
+                    "total_amount": from_cents(total, currency),
+                }
+                for (category, currency), total in totals[
+                    "spend_by_category"
+                ].most_common()
+            ],
+            "active_users_by_month": [
+                {"month": month, "active_users": count}
+                for month, count in sorted(totals["active_users_by_month"].items())
+            ],
+            "events_by_day": [
+                {"date": day, "event_count": count}
+                for day, count in sorted(totals["events_by_day"].items())
+            ],
+        }
@@ -0,0 +1,342 @@
+import numpy as np
+from datetime import datetime, timedelta
+from .. import db
+from ..models.expense import Expense
+from ..models.category_baseline import BaselineRefresh, CategoryBaseline
+from ..utils.money import minor_units
+from ..utils.sharding import shard_router
+
+
+def _group_medians(codes, values, group_count):
+    """
+    Compute the median of values per group code without a Python loop
+
+    Args:
+        codes (ndarray): Group code of every value, each in [0, group_count)
+        values (ndarray): Values to summarize
+        group_count (int): Number of groups, all of which must be non-empty
+
+    Returns:
+        ndarray: Median per group
+    """
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    lower = sorted_values[starts + (counts - 1) // 2]
+    upper = sorted_values[starts + counts // 2]
+    return (lower + upper) / 2
+
+
+def compute_baselines(codes, amounts, days, group_count):
+    """
+    Compute robust per-group statistics of expense amounts
+
+    Args:
+        codes (ndarray): Group code of every expense
+        amounts (ndarray): Expense amounts
+        days (ndarray): Expense dates as day ordinals
+        group_count (int): Number of groups
+
+    Returns:
+        tuple: Median, median absolute deviation, expenses per active day
+            and sample count, each as an array indexed by group code
+    """
+    medians = _group_medians(codes, amounts, group_count)
+    mads = _group_medians(codes, np.abs(amounts - medians[codes]), group_count)
+
+    counts = np.bincount(codes, minlength=group_count)
+    active_days = np.bincount(
+        np.unique(codes.astype(np.int64) * 10_000_000 + days) // 10_000_000,
+        minlength=group_count,
+    )
+
+    return medians, mads, counts / active_days, counts
+
+
+class AnomalyService:
+    """
+    Service layer flagging unusual expenses with robust per-category statistics
+    """
+
+    # Modified z-score above which an amount is considered anomalous
+    DEFAULT_THRESHOLD = 3.5
+
+    # Minimum history before a category's amounts are scored
+    MIN_SAMPLES = 5
+
+    # Expenses in one category and day above this multiple of the usual rate
+    # count as a burst
+    BURST_FACTOR = 3
+    MIN_BURST_SIZE = 3
+
+    # Baselines older than this are recomputed on read
+    BASELINE_MAX_AGE = timedelta(days=1)
+
+    HISTORY_DAYS = 365
+
+    @staticmethod
+    def refresh_baselines(user_ids, history_days=HISTORY_DAYS):
+        """
+        Recompute the category baselines of a group of users
+
+        All expenses of the group are loaded with a single query and
+        summarized in one vectorized pass.
+
+        Args:
+            user_ids (list): Users' unique identifiers
+            history_days (int): Number of days of history to summarize
+        """
+        threshold_date = datetime.utcnow() - timedelta(days=history_days)
+        rows = (
+            db.session.query(
+                Expense.user_id,
+                Expense.category_id,
+                Expense.amount_cents,
+                Expense.currency,
+                Expense.date,
+            )
+            .filter(Expense.user_id.in_(user_ids), Expense.date >= threshold_date)
+            .all()
+        )
+
+        CategoryBaseline.query.filter(CategoryBaseline.user_id.in_(user_ids)).delete()
+        BaselineRefresh.query.filter(BaselineRefresh.user_id.in_(user_ids)).delete()
+        computed_at = datetime.utcnow()
+        db.session.add_all(
+            BaselineRefresh(user_id=user_id, computed_at=computed_at)
+            for user_id in set(user_ids)
+        )
+
+        if rows:
+            (
+                user_column,
+                category_column,
+                amount_column,
+                currency_column,
+                date_column,
+            ) = zip(*rows)
+            # One integer key per (user, category) pair
+            keys, codes = np.unique(
+                np.array(user_column, dtype=np.int64) << 32
+                | np.array(category_column, dtype=np.int64),
+                return_inverse=True,
+            )
+            amounts = np.array(amount_column, dtype=np.float64) / np.array(
+                [minor_units(currency) for currency in currency_column],
+                dtype=np.float64,
+            )
+            days = np.fromiter(
+                (date.toordinal() for date in date_column),
+                dtype=np.int64,
+                count=len(rows),
+            )
+
+            medians, mads, rates, counts = compute_baselines(
+                codes, amounts, days, len(keys)
+            )
+
+            db.session.add_all(
+                CategoryBaseline(
+                    user_id=int(key >> 32),
+                    category_id=int(key & 0xFFFFFFFF),
+                    median_amount=float(medians[index]),
+                    mad_amount=float(mads[index]),
+                    daily_rate=float(rates[index]),
+                    sample_count=int(counts[index]),
+                )
+                for index, key in enumerate(keys)
+            )
+
+        db.session.commit()
+
+    @staticmethod
+    def get_baselines(user_id):
+        """
+        Get the category baselines of a user, recomputing them when outdated
+
+        Args:
+            user_id (int): User's unique identifier
+
+        Returns:
+            dict: Baselines keyed by category id
+        """
+        # Users without baselines still have a refresh time, so they are
+        # not recomputed on every read
+        computed_at = (
+            db.session.query(BaselineRefresh.computed_at)
+            .filter_by(user_id=user_id)
+            .scalar()
+        )
+
+        if computed_at is None or (
+            datetime.utcnow() - computed_at.replace(tzinfo=None)
+            > AnomalyService.BASELINE_MAX_AGE
+        ):
+            AnomalyService.refresh_baselines([user_id])
+        baselines = CategoryBaseline.query.filter_by(user_id=user_id).all()
+
+        return {baseline.category_id: baseline for baseline in baselines}
+
+    @staticmethod
+    def get_anomalies(user_id, days=30, threshold=DEFAULT_THRESHOLD):
+        """
+        Flag a user's recent expenses that stand out from their history
+
+        Args:
+            user_id (int): User's unique identifier
+            days (int): Number of recent days to score
+            threshold (float): Modified z-score above which amounts are flagged
+
+        Returns:
+            list: Flagged expenses with their score and reasons, highest first
+        """
+        baselines = AnomalyService.get_baselines(user_id)
+        since = datetime.utcnow() - timedelta(days=days)
+        expenses = (
+            Expense.query.filter(Expense.user_id == user_id, Expense.date >= since)
+            .order_by(Expense.date.desc())
+            .all()
+        )
+
+        return AnomalyService.score_expenses(expenses, baselines, threshold)
+
+    @staticmethod
+    def score_expenses(expenses, baselines, threshold=DEFAULT_THRESHOLD):
+        """
+        Score expenses against category baselines in a vectorized pass
+
+        Args:
+            expenses (list): Expense objects of a single user
+            baselines (dict): CategoryBaseline objects keyed by category id
+            threshold (float): Modified z-score above which amounts are flagged
+
+        Returns:
+            list: Flagged expenses with their score and reasons, highest first
+        """
+        if not expenses:
+            return []
+
+        category_ids, codes = np.unique(
+            np.array([expense.category_id for expense in expenses]), return_inverse=True
+        )
+
+        # Per-category baseline columns; NaN where the history is too short
+        medians = np.full(len(category_ids), np.nan)
+        mads = np.full(len(category_ids), np.nan)
+        rates = np.full(len(category_ids), np.nan)
+        for index, category_id in enumerate(category_ids.tolist()):
+            baseline = baselines.get(category_id)
+            if (
+                baseline is not None
+                and baseline.sample_count >= AnomalyService.MIN_SAMPLES
+            ):
+                medians[index] = baseline.median_amount
+                # Avoid dividing by zero for categories with constant amounts
+                mads[index] = max(
+                    baseline.mad_amount, 0.05 * abs(baseline.median_amount), 0.01
+                )
+                rates[index] = baseline.daily_rate
+
+        amounts = np.array([expense.amount for expense in expenses], dtype=np.float64)
+        days = np.array([expense.date.toordinal() for expense in expenses])
+
+        # Modified z-score (Iglewicz and Hoaglin)
+        with np.errstate(invalid="ignore"):
+            scores = np.abs(0.6745 * (amounts - medians[codes]) / mads[codes])
+        amount_flags = np.nan_to_num(scores) > threshold
+
+        # Expenses per category and day compared to the usual daily rate
+        pair_keys, pair_codes = np.unique(
+            codes.astype(np.int64) * 10_000_000 + days, return_inverse=True
+        )
+        pair_counts = np.bincount(pair_codes)[pair_codes]
+        burst_limit = np.maximum(
+            AnomalyService.MIN_BURST_SIZE,
+            AnomalyService.BURST_FACTOR * np.nan_to_num(rates[codes], nan=np.inf),
+        )
+        burst_flags = pair_counts > burst_limit
+
+        flagged = []
+        for index in np.flatnonzero(amount_flags | burst_flags):
+            reasons = []
+            if amount_flags[index]:
+                reasons.append("amount")
+            if burst_flags[index]:
+                reasons.append("burst")
+            flagged.append(
+                {
+                    "expense": expenses[index].to_dict(),
+                    "score": round(float(np.nan_to_num(scores[index])), 2),
+                    "reasons": reasons,
+                }
+            )
+
+        return sorted(flagged, key=lambda item: item["score"], reverse=True)
+
+    @staticmethod
+    def score_all_users(chunk_size=500, days=30, threshold=DEFAULT_THRESHOLD):
+        """
+        Refresh baselines and score recent expenses of every user in chunks
+
+        Users are scanned shard by shard, each shard holding the expenses
+        and baselines of its own users.
+
+        Args:
+            chunk_size (int): Number of users processed per chunk
+            days (int): Number of recent days to score
+            threshold (float): Modified z-score above which amounts are flagged
+
+        Yields:
+            tuple: User id and flagged expenses, for users with anomalies
+        """
+        for shard in shard_router.shards():
+            with shard_router.bind_shard(shard):
+                yield from AnomalyService._score_shard_users(
+                    chunk_size, days, threshold
+                )
+
+    @staticmethod
+    def _score_shard_users(chunk_size, days, threshold):
+        last_user_id = 0
+        since = datetime.utcnow() - timedelta(days=days)
+
+        while True:
+            user_ids = [
+                user_id
+                for (user_id,) in db.session.query(Expense.user_id)
+                .filter(Expense.user_id > last_user_id)
+                .distinct()
+                .order_by(Expense.user_id)
+                .limit(chunk_size)
+            ]
+            if not user_ids:
+                return
+
+            AnomalyService.refresh_baselines(user_ids)
+
+            baselines = {}
+            for baseline in CategoryBaseline.query.filter(
+                CategoryBaseline.user_id.in_(user_ids)
+            ):
+                baselines.setdefault(baseline.user_id, {})[baseline.category_id] = (
+                    baseline
+                )
+
+            expenses = {}
+            for expense in Expense.query.filter(
+                Expense.user_id.in_(user_ids), Expense.date >= since
+            ):
+                expenses.setdefault(expense.user_id, []).append(expense)
+
+            for user_id, user_expenses in expenses.items():
+                flagged = AnomalyService.score_expenses(
+                    user_expenses, baselines.get(user_id, {}), threshold
+                )
+                if flagged:
+                    yield user_id, flagged
+
+            # Release the chunk's objects before loading the next one
+            db.session.expunge_all()
+            last_user_id = user_ids[-1]
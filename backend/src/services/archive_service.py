@@ -0,0 +1,250 @@
+import os
+from collections import Counter
+import numpy as np
+from flask import current_app
+from .. import db
+from ..models.expense import Expense
+from ..models.category import category_cache
+from ..utils.money import from_cents
+from ..utils.sharding import shard_router
+from ..utils.columnar_archive import (
+    ArchiveReader,
+    write_archive,
+    datetime_to_micros,
+    micros_to_datetime,
+)
+
+ARCHIVE_COLUMNS = ("id", "date", "amount", "category", "currency", "description")
+
+
+class ArchiveService:
+    """
+    Service layer moving old expenses to per-user columnar archive files
+
+    Archived expenses are removed from the expenses table with a bulk delete
+    that bypasses the ORM events, so monthly totals, quantile sketches and
+    the sync feed keep treating them as existing expenses. Reports, summaries
+    and exports merge them back in transparently.
+    """
+
+    DEFAULT_ARCHIVE_DIR = "archive"
+
+    @staticmethod
+    def get_archive_dir():
+        """
+        Get the directory holding archive files
+        """
+        return current_app.config.get(
+            "EXPENSE_ARCHIVE_DIR", ArchiveService.DEFAULT_ARCHIVE_DIR
+        )
+
+    @staticmethod
+    def get_archive_path(user_id):
+        """
+        Get the archive file of a user, bucketed to keep directories small
+        """
+        return os.path.join(
+            ArchiveService.get_archive_dir(),
+            f"{user_id // 1000:06d}",
+            f"expenses_{user_id}.exparc",
+        )
+
+    @staticmethod
+    def open_archive(user_id, start_date=None, end_date=None):
+        """
+        Open a user's archive if it may hold rows in a date range
+
+        Args:
+            user_id (int): User's unique identifier
+            start_date (datetime, optional): Inclusive lower bound
+            end_date (datetime, optional): Inclusive upper bound
+
+        Returns:
+            ArchiveReader: Open reader to close after use, or None
+        """
+        path = ArchiveService.get_archive_path(user_id)
+        if not os.path.exists(path):
+            return None
+
+        reader = ArchiveReader(path)
+        if not reader.overlaps(start_date, end_date):
+            reader.close()
+            return None
+
+        return reader
+
+    @staticmethod
+    def archive_expenses(cutoff, user_ids=None):
+        """
+        Move expenses older than a cutoff into archive files
+
+        The archive file is durably replaced before the rows are deleted. If
+        the job dies in between, the next run rewrites the same ids, which
+        are deduplicated.
+
+        Args:
+            cutoff (datetime): Expenses dated before this are archived
+            user_ids (list, optional): Restrict the job to these users
+
+        Returns:
+            dict: Number of archived expenses per user
+        """
+        archived = {}
+        if user_ids is not None:
+            for user_id in user_ids:
+                with shard_router.bind(user_id):
+                    count = ArchiveService._archive_user(user_id, cutoff)
+                if count:
+                    archived[user_id] = count
+            return archived
+
+        for shard in shard_router.shards():
+            with shard_router.bind_shard(shard):
+                shard_user_ids = [
+                    user_id
+                    for (user_id,) in db.session.query(Expense.user_id)
+                    .filter(Expense.date < cutoff)
+                    .distinct()
+                    .order_by(Expense.user_id)
+                ]
+                for user_id in shard_user_ids:
+                    count = ArchiveService._archive_user(user_id, cutoff)
+                    if count:
+                        archived[user_id] = count
+
+        return archived
+
+    @staticmethod
+    def _archive_user(user_id, cutoff):
+        rows = (
+            db.session.query(
+                Expense.id,
+                Expense.date,
+                Expense.amount_cents,
+                Expense.category_id,
+                Expense.currency,
+                Expense.description,
+            )
+            .filter(Expense.user_id == user_id, Expense.date < cutoff)
+            .order_by(Expense.date)
+            .all()
+        )
+        if not rows:
+            return 0
+
+        ids, dates, amounts, category_ids, currencies, descriptions = zip(*rows)
+        names = category_cache.names(category_ids)
+        columns = {
+            "id": list(ids),
+            "date": [datetime_to_micros(date) for date in dates],
+            "amount": list(amounts),
+            "category": [names[category_id] for category_id in category_ids],
+            "currency": list(currencies),
+            "description": list(descriptions),
+        }
+
+        path = ArchiveService.get_archive_path(user_id)
+        if os.path.exists(path):
+            with ArchiveReader(path) as reader:
+                existing = reader.read(ARCHIVE_COLUMNS)
+                keep = ~np.isin(existing["id"], columns["id"])
+                for name in ARCHIVE_COLUMNS:
+                    columns[name] = list(existing[name][keep]) + columns[name]
+
+        order = np.argsort(np.asarray(columns["date"]), kind="stable")
+        write_archive(
+            path,
+            {
+                name: np.asarray(columns[name], dtype=object)[order]
+                for name in ARCHIVE_COLUMNS
+            },
+        )
+
+        # Bulk delete on purpose: archiving is not a user-visible deletion
+        Expense.query.filter(Expense.user_id == user_id, Expense.id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+
+        return len(ids)
+
+    @staticmethod
+    def summarize_archived(user_id, start_date=None, end_date=None):
+        """
+        Aggregate archived expenses in cents per category and per month
+
+        Args:
+            user_id (int): User's unique identifier
+            start_date (datetime, optional): Inclusive lower bound
+            end_date (datetime, optional): Inclusive upper bound
+
+        Returns:
+            dict: Category totals, category counts and monthly totals
+        """
+        summary = {
+            "category_totals": Counter(),
+            "category_counts": Counter(),
+            "monthly_totals": Counter(),
+        }
+
+        reader = ArchiveService.open_archive(user_id, start_date, end_date)
+        if reader is None:
+            return summary
+
+        with reader:
+            rows = reader.read(("date", "amount", "category"), start_date, end_date)
+            if not len(rows["amount"]):
+                return summary
+
+            categories, codes = np.unique(
+                rows["category"].astype(str), return_inverse=True
+            )
+            # Integer accumulation; bincount weights would go through floats
+            totals = np.zeros(len(categories), dtype=np.int64)
+            np.add.at(totals, codes, rows["amount"])
+            counts = np.bincount(codes)
+            for index, category in enumerate(categories):
+                summary["category_totals"][str(category)] = int(totals[index])
+                summary["category_counts"][str(category)] = int(counts[index])
+
+            months = rows["date"].astype("datetime64[us]").astype("datetime64[M]")
+            month_values, month_codes = np.unique(months, return_inverse=True)
+            month_totals = np.zeros(len(month_values), dtype=np.int64)
+            np.add.at(month_totals, month_codes, rows["amount"])
+            for index, month in enumerate(month_values):
+                summary["monthly_totals"][str(month)] = int(month_totals[index])
+
+        return summary
+
+    @staticmethod
+    def iter_archived(user_id, start_date=None, end_date=None):
+        """
+        Yield archived expenses as dictionaries shaped like Expense.to_dict
+
+        Args:
+            user_id (int): User's unique identifier
+            start_date (datetime, optional): Inclusive lower bound
+            end_date (datetime, optional): Inclusive upper bound
+
+        Yields:
+            dict: Archived expense
+        """
+        reader = ArchiveService.open_archive(user_id, start_date, end_date)
+        if reader is None:
+            return
+
+        with reader:
+            rows = reader.read(ARCHIVE_COLUMNS, start_date, end_date)
+            for index in range(len(rows["id"])):
+                yield {
+                    "id": int(rows["id"][index]),
+                    "user_id": user_id,
+                    "amount": from_cents(
+                        rows["amount"][index], rows["currency"][index]
+                    ),
+                    "currency": rows["currency"][index],
+                    "category": rows["category"][index],
+                    "description": rows["description"][index],
+                    "date": micros_to_datetime(rows["date"][index]).isoformat(),
+                    "archived": True,
+                }
@@ -0,0 +1,223 @@
+from datetime import datetime
+from .. import db
+from ..models.expense import Expense
+from ..models.event import Event
+from ..models.user import User
+from ..utils.money import validate_currency
+
+
+class OperationNotFound(LookupError):
+    """
+    Raised when an operation targets a record the user does not own
+    """
+
+
+def _parse_time(data, name):
+    value = data.get(name)
+    if not value:
+        raise ValueError(f"{name} is required")
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value}")
+
+
+def _get_owned(model, user_id, operation):
+    record_id = operation.get("id")
+    if not isinstance(record_id, int):
+        raise ValueError("An integer id is required")
+    record = model.query.filter_by(id=record_id, user_id=user_id).first()
+    if record is None:
+        raise OperationNotFound(f"{model.__name__} not found")
+    return record
+
+
+def _create_expense(user_id, operation):
+    data = operation.get("data") or {}
+    account_currency = User.currency_of(user_id)
+    currency = validate_currency(
+        data.get("currency", account_currency), account_currency
+    )
+    Expense.validate_expense(data.get("amount"), data.get("category"), currency)
+    expense = Expense(
+        user_id=user_id,
+        amount=data.get("amount"),
+        currency=currency,
+        category=data.get("category"),
+        description=data.get("description"),
+    )
+    db.session.add(expense)
+    return expense
+
+
+def _update_expense(user_id, operation):
+    data = operation.get("data") or {}
+    expense = _get_owned(Expense, user_id, operation)
+    if "currency" in data:
+        expense.currency = validate_currency(
+            data["currency"], User.currency_of(user_id)
+        )
+    if "amount" in data:
+        Expense.validate_expense(data["amount"], expense.category, expense.currency)
+        expense.amount = data["amount"]
+    if "category" in data:
+        Expense.validate_expense(expense.amount, data["category"])
+        expense.category = data["category"]
+    if "description" in data:
+        expense.description = data["description"]
+    return expense
+
+
+def _create_event(user_id, operation):
+    data = operation.get("data") or {}
+    start_time = _parse_time(data, "start_time")
+    end_time = _parse_time(data, "end_time")
+    Event.validate_event(start_time, end_time)
+    event = Event(
+        user_id=user_id,
+        title=data.get("title"),
+        description=data.get("description"),
+        start_time=start_time,
+        end_time=end_time,
+        category=data.get("category"),
+        location=data.get("location"),
+    )
+    db.session.add(event)
+    return event
+
+
+def _update_event(user_id, operation):
+    data = operation.get("data") or {}
+    event = _get_owned(Event, user_id, operation)
+    for field in ("title", "description", "category", "location"):
+        if field in data:
+            setattr(event, field, data[field])
+    if "start_time" in data and "end_time" in data:
+        start_time = _parse_time(data, "start_time")
+        end_time = _parse_time(data, "end_time")
+        Event.validate_event(start_time, end_time)
+        event.start_time = start_time
+        event.end_time = end_time
+    return event
+
+
+def _delete(model):
+    def handler(user_id, operation):
+        db.session.delete(_get_owned(model, user_id, operation))
+
+    return handler
+
+
+class BatchService:
+    """
+    Applies a list of expense and event changes in a single request
+
+    Operations follow the rules of the matching expense and event routes.
+    In atomic mode they share one transaction and the first failure undoes
+    the batch; otherwise each runs in its own savepoint, so a failure only
+    undoes that operation. Either way the batch commits once.
+    """
+
+    MAX_OPERATIONS = 500
+
+    # Handlers per (entity, op); they return the changed record, if any
+    HANDLERS = {
+        ("expense", "create"): _create_expense,
+        ("expense", "update"): _update_expense,
+        ("expense", "delete"): _delete(Expense),
+        ("event", "create"): _create_event,
+        ("event", "update"): _update_event,
+        ("event", "delete"): _delete(Event),
+    }
+
+    # Status of successful operations, as the single routes answer them
+    STATUS_CODES = {"create": 201, "update": 200, "delete": 200}
+
+    @staticmethod
+    def parse_operations(data):
+        """
+        Validate the body of a batch request
+
+        Args:
+            data (dict): Request body with an ``operations`` list
+
+        Returns:
+            list: Operations
+        """
+        operations = (data or {}).get("operations")
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("operations must be a non-empty list")
+        if len(operations) > BatchService.MAX_OPERATIONS:
+            raise ValueError(
+                f"A batch holds at most {BatchService.MAX_OPERATIONS} operations"
+            )
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                raise ValueError(f"Operation {index} must be an object")
+            key = (operation.get("entity"), operation.get("op"))
+            if key not in BatchService.HANDLERS:
+                raise ValueError(
+                    f"Operation {index}: unsupported op {key[1]!r} on {key[0]!r}"
+                )
+        return operations
+
+    @staticmethod
+    def run(user_id, operations, atomic=False):
+        """
+        Apply operations in order and commit the ones that succeeded
+
+        Args:
+            user_id (int): User's unique identifier
+            operations (list): Operations from parse_operations
+            atomic (bool): Undo the whole batch when one operation fails
+
+        Returns:
+            dict: Per-operation results and whether anything was committed
+        """
+        results = []
+        failed = False
+        for index, operation in enumerate(operations):
+            if failed and atomic:
+                results.append({"index": index, "status": 424, "error": "Skipped"})
+                continue
+
+            try:
+                if atomic:
+                    record = BatchService._apply(user_id, operation)
+                else:
+                    with db.session.begin_nested():
+                        record = BatchService._apply(user_id, operation)
+            except OperationNotFound as nf:
+                result = {"status": 404, "error": str(nf)}
+            except ValueError as ve:
+                result = {"status": 400, "error": str(ve)}
+            except Exception as e:
+                if atomic:
+                    db.session.rollback()
+                result = {"status": 500, "error": str(e)}
+            else:
+                result = {"status": BatchService.STATUS_CODES[operation["op"]]}
+                if record is not None:
+                    result[operation["entity"]] = record.to_dict()
+
+            if result["status"] >= 400:
+                failed = True
+            results.append({"index": index, **result})
+
+        if failed and atomic:
+            db.session.rollback()
+            return {"committed": False, "results": results}
+
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {"committed": True, "results": results}
+
+    @staticmethod
+    def _apply(user_id, operation):
+        handler = BatchService.HANDLERS[(operation["entity"], operation["op"])]
+        record = handler(user_id, operation)
+        db.session.flush()
+        return record
@@ -0,0 +1,221 @@
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from .. import db
+from ..models.budget import Budget, CategoryMonthTotal, PENDING_ALERTS_KEY, month_key
+from ..models.expense import Expense
+from ..models.user import User
+from ..models.category import Category, get_or_create_category_id
+from ..utils.columnar_archive import micros_to_datetime
+from ..utils.money import from_cents, to_cents
+from ..utils.pubsub import get_broker, user_channel
+from ..utils.session_buffers import register_buffer
+from .archive_service import ArchiveService
+
+
+class BudgetService:
+    """
+    Service layer for handling budget-related operations
+    """
+
+    @staticmethod
+    def get_budgets(user_id):
+        """
+        Retrieve all budgets of a user
+
+        Args:
+            user_id (int): User's unique identifier
+
+        Returns:
+            list: Budgets ordered by category
+        """
+        budgets = (
+            Budget.query.join(Category, Category.id == Budget.category_id)
+            .filter(Budget.user_id == user_id)
+            .order_by(Category.name)
+        )
+
+        currency = User.currency_of(user_id)
+        return [budget.to_dict(currency) for budget in budgets]
+
+    @staticmethod
+    def create_budget(user_id, budget_data):
+        """
+        Create a new budget with validation
+
+        Args:
+            user_id (int): User's unique identifier
+            budget_data (dict): Budget details
+
+        Returns:
+            Budget: Created budget object
+        """
+        monthly_limit = budget_data.get("monthly_limit")
+        category = budget_data.get("category")
+        alert_threshold = budget_data.get("alert_threshold", 1.0)
+
+        currency = User.currency_of(user_id)
+        Budget.validate_budget(monthly_limit, category, alert_threshold, currency)
+
+        new_budget = Budget(
+            user_id=user_id,
+            category=category,
+            monthly_limit_cents=to_cents(monthly_limit, currency),
+            alert_threshold=alert_threshold,
+        )
+
+        try:
+            db.session.add(new_budget)
+            db.session.commit()
+            return new_budget
+        except IntegrityError:
+            db.session.rollback()
+            raise ValueError("A budget already exists for this category")
+
+    @staticmethod
+    def update_budget(budget, budget_data):
+        """
+        Update an existing budget with validation
+
+        Args:
+            budget (Budget): Budget to update
+            budget_data (dict): Fields to change
+
+        Returns:
+            Budget: Updated budget object
+        """
+        currency = User.currency_of(budget.user_id)
+        monthly_limit = budget_data.get(
+            "monthly_limit", from_cents(budget.monthly_limit_cents, currency)
+        )
+        alert_threshold = budget_data.get("alert_threshold", budget.alert_threshold)
+
+        Budget.validate_budget(
+            monthly_limit, budget.category, alert_threshold, currency
+        )
+
+        budget.monthly_limit_cents = to_cents(monthly_limit, currency)
+        budget.alert_threshold = alert_threshold
+        db.session.commit()
+
+        return budget
+
+    @staticmethod
+    def get_budget_status(user_id, month=None):
+        """
+        Compare each budget against the running total of a month
+
+        Reads the precomputed monthly totals, so the cost depends on the
+        number of budgets rather than the number of expenses.
+
+        Args:
+            user_id (int): User's unique identifier
+            month (str, optional): Month as "YYYY-MM", defaults to the current one
+
+        Returns:
+            dict: Month and status of every budget
+        """
+        if not month:
+            month = month_key(datetime.utcnow())
+        else:
+            # Validate the month format
+            datetime.strptime(month, "%Y-%m")
+
+        rows = (
+            db.session.query(Budget, CategoryMonthTotal.total_cents)
+            .join(Category, Category.id == Budget.category_id)
+            .outerjoin(
+                CategoryMonthTotal,
+                and_(
+                    CategoryMonthTotal.user_id == Budget.user_id,
+                    CategoryMonthTotal.category_id == Budget.category_id,
+                    CategoryMonthTotal.month == month,
+                ),
+            )
+            .filter(Budget.user_id == user_id)
+            .order_by(Category.name)
+            .all()
+        )
+
+        currency = User.currency_of(user_id)
+        statuses = []
+        for budget, spent in rows:
+            spent = spent or 0
+            limit = budget.monthly_limit_cents
+            statuses.append(
+                {
+                    **budget.to_dict(currency),
+                    "spent": from_cents(spent, currency),
+                    "remaining": from_cents(limit - spent, currency),
+                    "percent_used": round(spent / limit * 100, 2),
+                    "alert": spent >= limit * budget.alert_threshold,
+                    "exceeded": spent > limit,
+                }
+            )
+
+        return {"month": month, "budgets": statuses}
+
+    @staticmethod
+    def rebuild_totals(user_id):
+        """
+        Recompute the monthly totals of a user from raw and archived expenses
+
+        Only needed to backfill expenses written before totals were
+        maintained, or to repair drift after bulk SQL changes.
+
+        Args:
+            user_id (int): User's unique identifier
+        """
+        totals = {}
+        expenses = (
+            db.session.query(Expense.category_id, Expense.date, Expense.amount_cents)
+            .filter(Expense.user_id == user_id)
+            .yield_per(1000)
+        )
+        for category_id, date, cents in expenses:
+            key = (category_id, month_key(date))
+            total_cents, transaction_count = totals.get(key, (0, 0))
+            totals[key] = (total_cents + cents, transaction_count + 1)
+
+        reader = ArchiveService.open_archive(user_id)
+        if reader is not None:
+            with reader:
+                rows = reader.read(("date", "amount", "category"))
+                # Archives store names; their categories are never deleted
+                category_ids = {
+                    name: get_or_create_category_id(db.session, user_id, str(name))
+                    for name in set(rows["category"])
+                }
+                for micros, cents, category in zip(
+                    rows["date"], rows["amount"], rows["category"]
+                ):
+                    key = (
+                        category_ids[category],
+                        month_key(micros_to_datetime(micros)),
+                    )
+                    total_cents, transaction_count = totals.get(key, (0, 0))
+                    totals[key] = (total_cents + int(cents), transaction_count + 1)
+
+        CategoryMonthTotal.query.filter_by(user_id=user_id).delete()
+        db.session.add_all(
+            CategoryMonthTotal(
+                user_id=user_id,
+                category_id=category_id,
+                month=month,
+                total_cents=cents,
+                transaction_count=count,
+            )
+            for (category_id, month), (cents, count) in totals.items()
+        )
+        db.session.commit()
+
+
+def _publish_budget_alerts(alerts):
+    broker = get_broker()
+    for alert in alerts:
+        broker.publish(
+            user_channel(alert["user_id"]), {"event": "budget_alert", **alert}
+        )
+
+
+register_buffer(PENDING_ALERTS_KEY, committed=_publish_budget_alerts)
@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app, g
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from .expense_service import ExpenseService
+from .event_service import EventService
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardService:
+    """
+    Service layer assembling the dashboard from independent widgets
+
+    Widgets run concurrently on a pool shared by all requests, so a burst
+    of dashboard loads cannot check out more than ``DASHBOARD_MAX_WORKERS``
+    extra connections. Each widget runs in its own application context and
+    therefore its own session; sessions are not safe to share between
+    threads.
+    """
+
+    # Looked up on each call, so profiled service methods stay profiled
+    WIDGETS = {
+        "expense_summary": lambda user_id: ExpenseService.get_expense_summary(user_id),
+        "top_categories": lambda user_id: ExpenseService.get_top_expenses_by_category(
+            user_id
+        ),
+        "monthly_spending": lambda user_id: ExpenseService.calculate_monthly_spending(
+            user_id
+        ),
+        "upcoming_events": lambda user_id: EventService.get_upcoming_events(user_id),
+        "event_summary": lambda user_id: EventService.generate_event_summary(user_id),
+    }
+
+    DEFAULT_MAX_WORKERS = 4
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def parse_widgets(value):
+        """
+        Parse a comma separated widget selection, all widgets when empty
+
+        Returns:
+            list: Widget names, without duplicates
+        """
+        if not value:
+            return list(DashboardService.WIDGETS)
+
+        widgets = list(dict.fromkeys(name.strip() for name in value.split(",")))
+        unknown = [name for name in widgets if name not in DashboardService.WIDGETS]
+        if unknown:
+            raise ValueError(
+                f"Unknown widgets: {', '.join(unknown)}. "
+                f"Widgets must be among: {', '.join(DashboardService.WIDGETS)}"
+            )
+        return widgets
+
+    @staticmethod
+    def get_dashboard(user_id, widgets):
+        """
+        Compute the selected widgets of a user's dashboard
+
+        A failing widget does not fail the dashboard; its error is reported
+        and the other widgets are still returned. Widgets still running when
+        the latency budget runs out are reported as errors too. Database
+        errors are raised instead, so the database guard counts them and
+        serves the last complete dashboard.
+
+        Args:
+            user_id (int): User's unique identifier
+            widgets (list): Widget names, see DashboardService.WIDGETS
+
+        Returns:
+            dict: Widget data by name, and errors by widget name
+        """
+        app = current_app._get_current_object()
+        # Widgets share the latency budget and the shard of the request
+        deadline = g.get("latency_deadline")
+        shard = g.get("shard")
+
+        def run_widget(name):
+            with app.app_context():
+                g.latency_deadline = deadline
+                g.shard = shard
+                return DashboardService.WIDGETS[name](user_id)
+
+        if len(widgets) == 1:
+            futures = {widgets[0]: None}
+        else:
+            executor = DashboardService._get_executor(app)
+            futures = {name: executor.submit(run_widget, name) for name in widgets}
+
+        dashboard = {}
+        errors = {}
+        for name, future in futures.items():
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                dashboard[name] = (
+                    future.result(timeout=timeout)
+                    if future is not None
+                    else DashboardService.WIDGETS[name](user_id)
+                )
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning("Dashboard widget %s ran out of time", name)
+                errors[name] = "Widget did not finish within the latency budget"
+            except (OperationalError, PoolTimeoutError):
+                for pending in futures.values():
+                    if pending is not None:
+                        pending.cancel()
+                raise
+            except Exception as e:
+                logger.exception("Dashboard widget %s failed", name)
+                errors[name] = str(e)
+
+        return {"widgets": dashboard, "errors": errors}
+
+    @staticmethod
+    def _get_executor(app):
+        with DashboardService._executor_lock:
+            if DashboardService._executor is None:
+                DashboardService._executor = ThreadPoolExecutor(
+                    max_workers=app.config.get(
+                        "DASHBOARD_MAX_WORKERS", DashboardService.DEFAULT_MAX_WORKERS
+                    ),
+                    thread_name_prefix="dashboard",
+                )
+            return DashboardService._executor
@@ -2,6 +2,8 @@ from sqlalchemy import func
 from datetime import datetime, timedelta
 from .. import db
 from ..models.event import Event
+from ..models.category import category_cache
+from ..utils.single_flight import single_flight
 
 
 class EventService:
@@ -48,7 +50,9 @@ class EventService:
             list: Events in the specified category
         """
         events = (
-            Event.query.filter_by(user_id=user_id, category=category)
+            Event.query.filter(
+                Event.user_id == user_id, Event.category_is(user_id, category)
+            )
             .order_by(Event.start_time.desc())
             .all()
         )
@@ -99,6 +103,7 @@ class EventService:
             raise ValueError(f"Error creating event: {str(e)}")
 
     @staticmethod
+    @single_flight.coalesce
     def generate_event_summary(user_id, start_date=None, end_date=None):
         """
         Generate a summary of events for a user
@@ -128,13 +133,16 @@ class EventService:
 
         # Events by category
         category_breakdown = (
-            db.session.query(Event.category, func.count(Event.id).label("event_count"))
+            db.session.query(
+                Event.category_id, func.count(Event.id).label("event_count")
+            )
             .filter(
                 Event.user_id == user_id, Event.start_time.between(start_date, end_date)
             )
-            .group_by(Event.category)
+            .group_by(Event.category_id)
             .all()
         )
+        names = category_cache.names([row.category_id for row in category_breakdown])
 
         # Busiest days
         busiest_days = (
@@ -156,8 +164,8 @@ class EventService:
             "start_date": start_date,
             "end_date": end_date,
             "category_breakdown": [
-                {"category": category, "event_count": event_count}
-                for category, event_count in category_breakdown
+                {"category": names.get(category_id), "event_count": event_count}
+                for category_id, event_count in category_breakdown
             ],
             "busiest_days": [
                 {"date": str(event_date), "event_count": event_count}
@@ -2,6 +2,15 @@ from sqlalchemy import func
 from datetime import datetime, timedelta
 from .. import db
 from ..models.expense import Expense
+from ..models.user import User
+from ..models.budget import month_key
+from ..models.category import Category, category_cache, get_or_create_category_id
+from ..models.category_sketch import CategorySketch
+from ..utils.money import average_cents, from_cents, validate_currency
+from ..utils.quantile_sketch import TDigest
+from ..utils.single_flight import single_flight
+from ..utils.sql_helpers import truncate_date, format_date_bucket
+from .archive_service import ArchiveService
 
 
 class ExpenseService:
@@ -9,6 +18,11 @@ class ExpenseService:
     Service layer for handling complex expense-related operations
     """
 
+    # Columns of CSV exports, in order
+    EXPORT_COLUMNS = ["id", "date", "amount", "currency", "category", "description"]
+
+    MAX_IMPORT_ROWS = 50000
+
     @staticmethod
     def calculate_monthly_spending(user_id, months=3):
         """
@@ -24,20 +38,27 @@ class ExpenseService:
         # Calculate the date threshold
         threshold_date = datetime.utcnow() - timedelta(days=months * 30)
 
+        month = truncate_date("month", Expense.date, db.engine.dialect.name)
         monthly_spending = (
             db.session.query(
-                func.date_trunc("month", Expense.date).label("month"),
-                func.sum(Expense.amount).label("total_amount"),
+                month.label("month"),
+                func.sum(Expense.amount_cents).label("total_cents"),
             )
             .filter(Expense.user_id == user_id, Expense.date >= threshold_date)
             .group_by("month")
-            .order_by("month")
             .all()
         )
 
+        totals = ArchiveService.summarize_archived(user_id, start_date=threshold_date)[
+            "monthly_totals"
+        ]
+        for month, cents in monthly_spending:
+            totals[format_date_bucket(month, "month")] += cents
+
+        currency = User.currency_of(user_id)
         return [
-            {"month": month.strftime("%Y-%m"), "total_amount": float(amount)}
-            for month, amount in monthly_spending
+            {"month": month, "total_amount": from_cents(cents, currency)}
+            for month, cents in sorted(totals.items())
         ]
 
     @staticmethod
@@ -52,20 +73,23 @@ class ExpenseService:
         Returns:
             list: Top expense categories
         """
-        top_categories = (
+        totals = ArchiveService.summarize_archived(user_id)["category_totals"]
+        category_totals = (
             db.session.query(
-                Expense.category, func.sum(Expense.amount).label("total_amount")
+                Expense.category_id, func.sum(Expense.amount_cents).label("total_cents")
             )
             .filter(Expense.user_id == user_id)
-            .group_by(Expense.category)
-            .order_by(func.sum(Expense.amount).desc())
-            .limit(limit)
+            .group_by(Expense.category_id)
             .all()
         )
+        names = category_cache.names([row.category_id for row in category_totals])
+        for category_id, cents in category_totals:
+            totals[names[category_id]] += cents
 
+        currency = User.currency_of(user_id)
         return [
-            {"category": category, "total_amount": float(amount)}
-            for category, amount in top_categories
+            {"category": category, "total_amount": from_cents(cents, currency)}
+            for category, cents in totals.most_common(limit)
         ]
 
     @staticmethod
@@ -84,39 +108,57 @@ class ExpenseService:
 
         monthly_averages = (
             db.session.query(
-                Expense.category, func.avg(Expense.amount).label("avg_amount")
+                Expense.category_id,
+                func.sum(Expense.amount_cents).label("total_cents"),
+                func.count(Expense.id).label("transaction_count"),
             )
             .filter(Expense.user_id == user_id, Expense.date >= threshold_date)
-            .group_by(Expense.category)
+            .group_by(Expense.category_id)
             .all()
         )
+        names = category_cache.names([row.category_id for row in monthly_averages])
 
+        currency = User.currency_of(user_id)
         return {
-            category: float(avg_amount) for category, avg_amount in monthly_averages
+            names[category_id]: from_cents(average_cents(cents, count), currency)
+            for category_id, cents, count in monthly_averages
         }
 
     @staticmethod
-    def add_expense(user_id, amount, category, description=None, date=None):
+    def add_expense(
+        user_id,
+        amount,
+        category,
+        description=None,
+        date=None,
+        currency=None,
+    ):
         """
         Add a new expense with validation
 
         Args:
             user_id (int): User's unique identifier
-            amount (float): Expense amount
+            amount (float): Expense amount, stored as integer cents
             category (str): Expense category
             description (str, optional): Expense description
             date (datetime, optional): Expense date
+            currency (str, optional): Three letter currency code, which
+                must be the user's account currency
 
         Returns:
             Expense: Created expense object
         """
+        account_currency = User.currency_of(user_id)
+        currency = validate_currency(currency or account_currency, account_currency)
+
         # Validate expense
-        Expense.validate_expense(amount, category)
+        Expense.validate_expense(amount, category, currency)
 
         # Create expense
         new_expense = Expense(
             user_id=user_id,
             amount=amount,
+            currency=currency,
             category=category,
             description=description,
             date=date or datetime.utcnow(),
@@ -131,6 +173,71 @@ class ExpenseService:
             raise ValueError(f"Error creating expense: {str(e)}")
 
     @staticmethod
+    def import_expenses(user_id, rows, batch_size=500):
+        """
+        Create many expenses in one transaction
+
+        Rows failing validation are reported and skipped. Valid rows are
+        flushed in batches and committed together, so a failed import can
+        be retried without creating duplicates.
+
+        Args:
+            user_id (int): User's unique identifier
+            rows (list): Expense dictionaries with amount, category and
+                optional description, currency and ISO 8601 date
+            batch_size (int): Rows flushed per round trip
+
+        Returns:
+            dict: Number of imported rows and the errors of rejected rows
+        """
+        if len(rows) > ExpenseService.MAX_IMPORT_ROWS:
+            raise ValueError(
+                f"At most {ExpenseService.MAX_IMPORT_ROWS} expenses can be imported"
+            )
+
+        account_currency = User.currency_of(user_id)
+        imported = 0
+        errors = []
+        try:
+            for index, row in enumerate(rows):
+                try:
+                    if not isinstance(row, dict):
+                        raise ValueError("Expense must be an object")
+                    currency = validate_currency(
+                        row.get("currency", account_currency), account_currency
+                    )
+                    Expense.validate_expense(
+                        row.get("amount"), row.get("category"), currency
+                    )
+                    date = row.get("date")
+                    expense = Expense(
+                        user_id=user_id,
+                        amount=row["amount"],
+                        currency=currency,
+                        category=row["category"],
+                        description=row.get("description"),
+                        date=datetime.fromisoformat(date)
+                        if date
+                        else datetime.utcnow(),
+                    )
+                except (TypeError, ValueError) as e:
+                    errors.append({"row": index, "error": str(e)})
+                    continue
+
+                db.session.add(expense)
+                imported += 1
+                if imported % batch_size == 0:
+                    db.session.flush()
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {"imported": imported, "errors": errors}
+
+    @staticmethod
+    @single_flight.coalesce
     def generate_expense_report(user_id, start_date=None, end_date=None):
         """
         Generate a comprehensive expense report
@@ -149,40 +256,291 @@ class ExpenseService:
         if not end_date:
             end_date = datetime.utcnow()
 
-        # Total spending
-        total_spending = (
-            db.session.query(func.sum(Expense.amount))
-            .filter(
-                Expense.user_id == user_id, Expense.date.between(start_date, end_date)
-            )
-            .scalar()
-            or 0.0
-        )
+        # Category breakdown, starting from archived expenses in the range
+        archived = ArchiveService.summarize_archived(user_id, start_date, end_date)
+        totals = archived["category_totals"]
+        counts = archived["category_counts"]
 
-        # Category breakdown
         category_breakdown = (
             db.session.query(
-                Expense.category,
-                func.sum(Expense.amount).label("total_amount"),
+                Expense.category_id,
+                func.sum(Expense.amount_cents).label("total_cents"),
                 func.count(Expense.id).label("transaction_count"),
             )
             .filter(
                 Expense.user_id == user_id, Expense.date.between(start_date, end_date)
             )
-            .group_by(Expense.category)
+            .group_by(Expense.category_id)
             .all()
         )
+        names = category_cache.names([row.category_id for row in category_breakdown])
+        for category_id, cents, transaction_count in category_breakdown:
+            totals[names[category_id]] += cents
+            counts[names[category_id]] += transaction_count
 
+        currency = User.currency_of(user_id)
         return {
-            "total_spending": float(total_spending),
+            "total_spending": from_cents(sum(totals.values()), currency),
             "start_date": start_date,
             "end_date": end_date,
             "category_breakdown": [
                 {
                     "category": category,
-                    "total_amount": float(total_amount),
-                    "transaction_count": transaction_count,
+                    "total_amount": from_cents(cents, currency),
+                    "transaction_count": counts[category],
                 }
-                for category, total_amount, transaction_count in category_breakdown
+                for category, cents in sorted(totals.items())
+            ],
+        }
+
+    @staticmethod
+    @single_flight.coalesce
+    def get_expense_summary(user_id):
+        """
+        Get all-time spending per category and per month
+
+        Args:
+            user_id (int): User's unique identifier
+
+        Returns:
+            dict: Category and monthly totals, archived expenses included
+        """
+        archived = ArchiveService.summarize_archived(user_id)
+        category_totals = archived["category_totals"]
+        monthly_totals = archived["monthly_totals"]
+
+        # Total expenses by category
+        category_summary = (
+            db.session.query(
+                Expense.category_id, func.sum(Expense.amount_cents).label("total_cents")
+            )
+            .filter(Expense.user_id == user_id)
+            .group_by(Expense.category_id)
+            .all()
+        )
+        names = category_cache.names([row.category_id for row in category_summary])
+        for category_id, cents in category_summary:
+            category_totals[names[category_id]] += cents
+
+        # Monthly total expenses
+        month = truncate_date("month", Expense.date, db.engine.dialect.name)
+        monthly_summary = (
+            db.session.query(
+                month.label("month"),
+                func.sum(Expense.amount_cents).label("total_cents"),
+            )
+            .filter(Expense.user_id == user_id)
+            .group_by("month")
+            .all()
+        )
+        for month, cents in monthly_summary:
+            monthly_totals[format_date_bucket(month, "month")] += cents
+
+        currency = User.currency_of(user_id)
+        return {
+            "category_summary": [
+                {"category": category, "total_amount": from_cents(cents, currency)}
+                for category, cents in category_totals.items()
+            ],
+            "monthly_summary": [
+                {"month": month, "total_amount": from_cents(cents, currency)}
+                for month, cents in sorted(monthly_totals.items())
             ],
         }
+
+    @staticmethod
+    def export_expenses(user_id, start_date=None, end_date=None, batch_size=1000):
+        """
+        Iterate over every expense of a user, oldest first
+
+        Archived expenses come first, as they all predate the live ones, then
+        live expenses are streamed in batches instead of loaded at once.
+
+        Args:
+            user_id (int): User's unique identifier
+            start_date (datetime, optional): Inclusive lower bound
+            end_date (datetime, optional): Inclusive upper bound
+            batch_size (int): Number of live rows fetched per round trip
+
+        Yields:
+            dict: Serialized expense
+        """
+        yield from ArchiveService.iter_archived(user_id, start_date, end_date)
+
+        query = Expense.query.filter(Expense.user_id == user_id)
+        if start_date:
+            query = query.filter(Expense.date >= start_date)
+        if end_date:
+            query = query.filter(Expense.date <= end_date)
+
+        for expense in query.order_by(Expense.date, Expense.id).yield_per(batch_size):
+            yield expense.to_dict()
+
+    @staticmethod
+    def get_category_statistics(
+        user_id, start_month=None, end_month=None, quantiles=(0.5, 0.9)
+    ):
+        """
+        Get spending quantiles per category from the monthly sketches
+
+        Sketches of every month in the range are merged instead of sorting
+        the raw expenses, so the cost depends on the number of months and
+        categories rather than the number of expenses.
+
+        Args:
+            user_id (int): User's unique identifier
+            start_month (str, optional): First month as "YYYY-MM"
+            end_month (str, optional): Last month as "YYYY-MM"
+            quantiles (iterable): Quantiles between 0 and 1 to estimate
+
+        Returns:
+            dict: Count, range and quantiles per category
+        """
+        # Default to the last 3 months if no range is provided
+        if not end_month:
+            end_month = month_key(datetime.utcnow())
+        if not start_month:
+            start_month = month_key(datetime.utcnow() - timedelta(days=90))
+
+        for month in (start_month, end_month):
+            try:
+                datetime.strptime(month, "%Y-%m")
+            except ValueError:
+                raise ValueError("Months must use the YYYY-MM format")
+
+        for q in quantiles:
+            if not 0 <= q <= 1:
+                raise ValueError("Quantiles must be between 0 and 1")
+
+        sketches = (
+            db.session.query(CategorySketch, Category.name)
+            .join(Category, Category.id == CategorySketch.category_id)
+            .filter(
+                CategorySketch.user_id == user_id,
+                CategorySketch.month.between(start_month, end_month),
+            )
+            .all()
+        )
+
+        digests = {}
+        for sketch, category in sketches:
+            # Stale months are recomputed for this read only; reads never
+            # write, refresh_stale_sketches stores them again
+            digest = (
+                ExpenseService._compute_sketch(sketch)
+                if sketch.stale
+                else sketch.to_digest()
+            )
+            digests.setdefault(category, TDigest()).merge(digest)
+
+        return {
+            "start_month": start_month,
+            "end_month": end_month,
+            "categories": [
+                {
+                    "category": category,
+                    "transaction_count": digest.count,
+                    "min_amount": digest.min,
+                    "max_amount": digest.max,
+                    "quantiles": {
+                        f"p{q * 100:g}": digest.quantile(q) for q in quantiles
+                    },
+                }
+                for category, digest in sorted(digests.items())
+                if digest.count
+            ],
+        }
+
+    @staticmethod
+    def rebuild_category_sketches(user_id):
+        """
+        Rebuild all quantile sketches of a user from raw and archived expenses
+
+        Only needed to backfill expenses written before sketches were
+        maintained.
+
+        Args:
+            user_id (int): User's unique identifier
+        """
+        digests = {}
+        expenses = (
+            db.session.query(
+                Expense.category_id,
+                Expense.date,
+                Expense.amount_cents,
+                Expense.currency,
+            )
+            .filter(Expense.user_id == user_id)
+            .yield_per(1000)
+        )
+        for category_id, date, cents, currency in expenses:
+            key = (month_key(date), category_id)
+            digests.setdefault(key, TDigest()).add(from_cents(cents, currency))
+        for archived in ArchiveService.iter_archived(user_id):
+            month = month_key(datetime.fromisoformat(archived["date"]))
+            # Archives store names; their categories are never deleted
+            category_id = get_or_create_category_id(
+                db.session, user_id, archived["category"]
+            )
+            digests.setdefault((month, category_id), TDigest()).add(archived["amount"])
+
+        CategorySketch.query.filter_by(user_id=user_id).delete()
+        db.session.add_all(
+            CategorySketch(
+                user_id=user_id,
+                month=month,
+                category_id=category_id,
+                digest=digest.to_json(),
+                stale=False,
+            )
+            for (month, category_id), digest in digests.items()
+        )
+        db.session.commit()
+
+    @staticmethod
+    def refresh_stale_sketches(user_id):
+        """
+        Recompute and store the sketches of a user flagged as stale
+
+        Args:
+            user_id (int): User's unique identifier
+
+        Returns:
+            int: Number of refreshed sketches
+        """
+        sketches = CategorySketch.query.filter_by(user_id=user_id, stale=True).all()
+        for sketch in sketches:
+            sketch.digest = ExpenseService._compute_sketch(sketch).to_json()
+            sketch.stale = False
+        db.session.commit()
+
+        return len(sketches)
+
+    @staticmethod
+    def _compute_sketch(sketch):
+        """
+        Recompute the digest of one sketch from the live and archived
+        expenses of its month
+        """
+        month_start = datetime.strptime(sketch.month, "%Y-%m")
+        month_end = (month_start + timedelta(days=32)).replace(day=1)
+
+        digest = TDigest()
+        amounts = db.session.query(Expense.amount_cents, Expense.currency).filter(
+            Expense.user_id == sketch.user_id,
+            Expense.category_id == sketch.category_id,
+            Expense.date >= month_start,
+            Expense.date < month_end,
+        )
+        for cents, currency in amounts:
+            digest.add(from_cents(cents, currency))
+
+        archived = ArchiveService.iter_archived(
+            sketch.user_id, month_start, month_end - timedelta(microseconds=1)
+        )
+        category = category_cache.name_of(sketch.category_id)
+        for expense in archived:
+            if expense["category"] == category:
+                digest.add(expense["amount"])
+
+        return digest
@@ -0,0 +1,356 @@
+import csv
+import logging
+import os
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from .. import db
+from ..models.job import Job
+from ..utils.sharding import shard_router
+from ..utils.validators import parse_datetime_param
+from .expense_service import ExpenseService
+from .event_service import EventService
+
+logger = logging.getLogger(__name__)
+
+
+def _date_range_payload(data):
+    payload = {}
+    for name in ("start_date", "end_date"):
+        value = parse_datetime_param(data.get(name), name)
+        payload[name] = value.isoformat() if value else None
+    return payload
+
+
+def _date_range(payload):
+    return [
+        datetime.fromisoformat(payload[name]) if payload.get(name) else None
+        for name in ("start_date", "end_date")
+    ]
+
+
+def _import_payload(data):
+    rows = data.get("expenses")
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("expenses must be a non-empty list")
+    if len(rows) > ExpenseService.MAX_IMPORT_ROWS:
+        raise ValueError(
+            f"At most {ExpenseService.MAX_IMPORT_ROWS} expenses can be imported"
+        )
+    return {"expenses": rows}
+
+
+def _run_expense_report(job, payload):
+    return ExpenseService.generate_expense_report(job.user_id, *_date_range(payload))
+
+
+def _run_event_summary(job, payload):
+    return EventService.generate_event_summary(job.user_id, *_date_range(payload))
+
+
+def _run_expense_import(job, payload):
+    return ExpenseService.import_expenses(job.user_id, payload["expenses"])
+
+
+def _run_expense_export(job, payload):
+    path = JobService.get_result_path(job.id, "csv")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = 0
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", newline="") as output:
+        writer = csv.DictWriter(
+            output, fieldnames=ExpenseService.EXPORT_COLUMNS, extrasaction="ignore"
+        )
+        writer.writeheader()
+        for expense in ExpenseService.export_expenses(
+            job.user_id, *_date_range(payload)
+        ):
+            writer.writerow(expense)
+            rows += 1
+    os.replace(temporary_path, path)
+
+    return {"file": os.path.basename(path), "mimetype": "text/csv", "rows": rows}
+
+
+class JobService:
+    """
+    Service layer for background jobs stored in the jobs table
+
+    Each kind maps to a payload parser, run when the job is enqueued so
+    invalid requests fail fast, and a handler run by a worker. Handlers
+    receive the job and its payload and return a JSON serializable result,
+    or write a file under the result directory and return its name.
+    ValueErrors are treated as permanent failures; other exceptions are
+    retried with an exponential backoff.
+    """
+
+    KINDS = {
+        "expense_report": (_date_range_payload, _run_expense_report),
+        "event_summary": (_date_range_payload, _run_event_summary),
+        "expense_export": (_date_range_payload, _run_expense_export),
+        "expense_import": (_import_payload, _run_expense_import),
+    }
+
+    DEFAULT_MAX_ATTEMPTS = 3
+    RETRY_BACKOFF = timedelta(seconds=30)
+    # Running jobs without a heartbeat for this long are assumed lost with
+    # their worker; workers beat every HEARTBEAT_INTERVAL
+    HEARTBEAT_INTERVAL = timedelta(seconds=30)
+    STALE_AFTER = timedelta(minutes=5)
+    DEFAULT_RESULT_TTL_HOURS = 24
+    DEFAULT_RESULT_DIR = "job_results"
+
+    @staticmethod
+    def get_result_path(job_id, extension):
+        """
+        Get the file holding the result of a job
+        """
+        result_dir = current_app.config.get(
+            "JOB_RESULT_DIR", JobService.DEFAULT_RESULT_DIR
+        )
+        return os.path.join(result_dir, f"job_{job_id}.{extension}")
+
+    @staticmethod
+    def enqueue(user_id, kind, data=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Validate a job request and queue it
+
+        Args:
+            user_id (int): User's unique identifier
+            kind (str): Job kind, one of JobService.KINDS
+            data (dict): Kind specific parameters
+            max_attempts (int): Runs allowed before the job fails
+
+        Returns:
+            Job: Queued job
+        """
+        if kind not in JobService.KINDS:
+            raise ValueError(
+                f"Job kind must be one of: {', '.join(sorted(JobService.KINDS))}"
+            )
+        parse_payload, _ = JobService.KINDS[kind]
+
+        job = Job(
+            user_id=user_id,
+            kind=kind,
+            payload=Job.dump(parse_payload(data or {})),
+            max_attempts=max_attempts,
+            run_after=datetime.utcnow(),
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def get_job(user_id, job_id):
+        """
+        Get a job of a user, or None
+        """
+        return Job.query.filter_by(id=job_id, user_id=user_id).first()
+
+    @staticmethod
+    def get_jobs(user_id, limit=20):
+        """
+        Get the most recent jobs of a user
+        """
+        return (
+            Job.query.filter_by(user_id=user_id)
+            .order_by(Job.created_at.desc(), Job.id.desc())
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def claim_next():
+        """
+        Mark the oldest runnable job as running
+
+        The update only succeeds while the job is still queued, so when
+        workers race for a job exactly one of them gets it.
+
+        Returns:
+            int: Id of the claimed job, or None if none is runnable
+        """
+        now = datetime.utcnow()
+        candidates = (
+            db.session.query(Job.id)
+            .filter(Job.status == Job.STATUS_QUEUED, Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .limit(5)
+            .all()
+        )
+        for (job_id,) in candidates:
+            claimed = Job.query.filter(
+                Job.id == job_id, Job.status == Job.STATUS_QUEUED
+            ).update(
+                {
+                    Job.status: Job.STATUS_RUNNING,
+                    Job.started_at: now,
+                    Job.heartbeat_at: now,
+                    Job.attempts: Job.attempts + 1,
+                },
+                synchronize_session=False,
+            )
+            db.session.commit()
+            if claimed:
+                return job_id
+        return None
+
+    @staticmethod
+    def run_job(job_id):
+        """
+        Run a claimed job and store its result or schedule a retry
+
+        Returns:
+            Job: Job in its new state
+        """
+        job = db.session.get(Job, job_id)
+        _, handler = JobService.KINDS.get(job.kind, (None, None))
+
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job.kind}")
+            with shard_router.bind(job.user_id):
+                result = handler(job, job.get_payload())
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            JobService._record_failure(job, e)
+        else:
+            job.result = Job.dump(result)
+            job.error = None
+            JobService._finish(job, Job.STATUS_SUCCEEDED)
+
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def _record_failure(job, error):
+        job.error = str(error)
+        retry = not isinstance(error, ValueError) and job.attempts < job.max_attempts
+        logger.warning(
+            "Job %s (%s) failed on attempt %s: %s",
+            job.id,
+            job.kind,
+            job.attempts,
+            error,
+            exc_info=error,
+        )
+        if retry:
+            job.status = Job.STATUS_QUEUED
+            job.run_after = datetime.utcnow() + JobService.RETRY_BACKOFF * (
+                2 ** (job.attempts - 1)
+            )
+        else:
+            JobService._finish(job, Job.STATUS_FAILED)
+
+    @staticmethod
+    def _finish(job, status):
+        ttl_hours = current_app.config.get(
+            "JOB_RESULT_TTL_HOURS", JobService.DEFAULT_RESULT_TTL_HOURS
+        )
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + timedelta(hours=ttl_hours)
+
+    @staticmethod
+    def run_pending(limit=None):
+        """
+        Run runnable jobs one after another in the current thread
+
+        Args:
+            limit (int, optional): Highest number of jobs to run
+
+        Returns:
+            int: Number of jobs run
+        """
+        count = 0
+        while limit is None or count < limit:
+            job_id = JobService.claim_next()
+            if job_id is None:
+                break
+            try:
+                JobService.run_job(job_id)
+            except Exception:
+                # The job stays running and is requeued once it goes stale
+                db.session.rollback()
+                logger.exception("Running job %s failed", job_id)
+            count += 1
+        return count
+
+    @staticmethod
+    def heartbeat(job_ids):
+        """
+        Record that the given running jobs are still being worked on
+
+        Args:
+            job_ids (iterable): Ids of the jobs run by the calling worker
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        Job.query.filter(Job.id.in_(job_ids), Job.status == Job.STATUS_RUNNING).update(
+            {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+
+    @staticmethod
+    def requeue_stale():
+        """
+        Queue again running jobs whose worker stopped sending heartbeats
+
+        Jobs that used up their attempts are failed instead, so a job that
+        kills its worker is not run forever.
+
+        Returns:
+            int: Number of requeued jobs
+        """
+        now = datetime.utcnow()
+        stale = Job.query.filter(
+            Job.status == Job.STATUS_RUNNING,
+            func.coalesce(Job.heartbeat_at, Job.started_at)
+            < now - JobService.STALE_AFTER,
+        )
+        count = stale.filter(Job.attempts < Job.max_attempts).update(
+            {Job.status: Job.STATUS_QUEUED, Job.run_after: now},
+            synchronize_session=False,
+        )
+
+        ttl_hours = current_app.config.get(
+            "JOB_RESULT_TTL_HOURS", JobService.DEFAULT_RESULT_TTL_HOURS
+        )
+        failed = stale.filter(Job.attempts >= Job.max_attempts).update(
+            {
+                Job.status: Job.STATUS_FAILED,
+                Job.error: "The worker running the job stopped responding",
+                Job.finished_at: now,
+                Job.expires_at: now + timedelta(hours=ttl_hours),
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if failed:
+            logger.warning("Failed %s jobs that lost their worker too often", failed)
+        return count
+
+    @staticmethod
+    def purge_expired():
+        """
+        Delete finished jobs whose result expired, with their result files
+
+        Returns:
+            int: Number of deleted jobs
+        """
+        expired = Job.query.filter(
+            Job.expires_at.isnot(None), Job.expires_at < datetime.utcnow()
+        ).all()
+        for job in expired:
+            result = job.get_result() if job.status == Job.STATUS_SUCCEEDED else None
+            if isinstance(result, dict) and result.get("file"):
+                path = JobService.get_result_path(job.id, "csv")
+                if os.path.exists(path):
+                    os.remove(path)
+            db.session.delete(job)
+        db.session.commit()
+        return len(expired)
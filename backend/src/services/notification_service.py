@@ -0,0 +1,101 @@
+import json
+import time
+from ..models.sync_change import on_changes_committed
+from ..utils.pubsub import get_broker, set_broker, user_channel, RedisBroker
+
+
+class NotificationService:
+    """
+    Service layer pushing expense and event change notifications to clients
+    """
+
+    # Seconds between keep-alive comments on an idle stream
+    HEARTBEAT_INTERVAL = 15
+
+    # Seconds before a stream is closed so the client reconnects and the
+    # worker is released
+    MAX_STREAM_DURATION = 300
+
+    @staticmethod
+    def configure(app):
+        """
+        Select the broker from the application configuration
+
+        Args:
+            app (Flask): Flask application
+        """
+        redis_url = app.config.get("PUBSUB_REDIS_URL")
+        if redis_url:
+            set_broker(RedisBroker(redis_url))
+
+    @staticmethod
+    def publish_changes(changes):
+        """
+        Publish committed changes to the channels of their owners
+
+        Args:
+            changes (list): Change dictionaries recorded by the sync log
+        """
+        broker = get_broker()
+        for change in changes:
+            broker.publish(
+                user_channel(change["user_id"]),
+                {
+                    "cursor": change["cursor"],
+                    "entity_type": change["entity_type"],
+                    "entity_id": change["entity_id"],
+                    "operation": change["operation"],
+                },
+            )
+
+    @staticmethod
+    def publish_reminder(reminder):
+        """
+        Push an event reminder to its owner's open streams
+
+        Args:
+            reminder (dict): Reminder built by the reminder scheduler
+        """
+        get_broker().publish(
+            user_channel(reminder["user_id"]), {"event": "reminder", **reminder}
+        )
+
+    @staticmethod
+    def stream(user_id, heartbeat=HEARTBEAT_INTERVAL, duration=MAX_STREAM_DURATION):
+        """
+        Generate a server-sent events stream of a user's changes
+
+        Each event carries the sync cursor as its id, so a reconnecting client
+        can catch up through the sync feed using its Last-Event-ID.
+
+        Args:
+            user_id (int): User's unique identifier
+            heartbeat (float): Seconds between keep-alive comments
+            duration (float): Seconds before the stream ends
+
+        Yields:
+            str: Server-sent events frames
+        """
+        subscription = get_broker().subscribe(user_channel(user_id))
+        deadline = time.monotonic() + duration
+
+        try:
+            yield f"retry: {int(heartbeat * 1000)}\n\n"
+
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                # Only sync changes carry a cursor usable as Last-Event-ID
+                frame = f"event: {message.get('event', 'change')}\n"
+                frame += f"data: {json.dumps(message)}\n\n"
+                if "cursor" in message:
+                    frame = f"id: {message['cursor']}\n" + frame
+                yield frame
+        finally:
+            subscription.close()
+
+
+on_changes_committed(NotificationService.publish_changes)
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from ..models.event import Event
+from ..models.event_reminder import EventReminder
+from ..models.sync_change import SyncChange, SYNC_ENTITY_TYPES, commit_watermark
+
+
+class ReminderService:
+    """
+    Database side of event reminders: loading due events and claiming
+    reminders exactly once
+
+    Methods take a connection, so the scheduler can work through each shard
+    in turn without binding a session to a user.
+    """
+
+    EVENT_COLUMNS = (Event.id, Event.user_id, Event.title, Event.start_time)
+
+    # Claims not marked sent after this are assumed lost with their scheduler
+    CLAIM_TIMEOUT = timedelta(minutes=5)
+
+    @staticmethod
+    def get_events_starting_between(connection, start, end):
+        """
+        Get the events of every user starting in a time range
+
+        Returns:
+            list: Rows of id, user_id, title and start_time
+        """
+        return connection.execute(
+            select(*ReminderService.EVENT_COLUMNS)
+            .where(Event.start_time > start, Event.start_time <= end)
+            .order_by(Event.start_time)
+        ).all()
+
+    @staticmethod
+    def get_events(connection, event_ids):
+        """
+        Get events by id; deleted ones are missing from the result
+        """
+        return connection.execute(
+            select(*ReminderService.EVENT_COLUMNS).where(Event.id.in_(event_ids))
+        ).all()
+
+    @staticmethod
+    def get_last_change_cursor(connection):
+        """
+        Get the cursor of the latest committed change of the sync log
+        """
+        statement = select(func.max(SyncChange.id))
+        watermark = commit_watermark(connection)
+        if watermark is not None:
+            statement = statement.where(SyncChange.changed_at < watermark)
+        return connection.execute(statement).scalar() or 0
+
+    @staticmethod
+    def get_event_changes(connection, cursor, limit):
+        """
+        Get event changes of every user logged after a cursor, up to the
+        commit watermark
+
+        Returns:
+            tuple: Changed event rows as (entity_id, operation), and the
+                cursor to continue from
+        """
+        statement = select(
+            SyncChange.id,
+            SyncChange.entity_type,
+            SyncChange.entity_id,
+            SyncChange.operation,
+        ).where(SyncChange.id > cursor)
+        watermark = commit_watermark(connection)
+        if watermark is not None:
+            statement = statement.where(SyncChange.changed_at < watermark)
+        changes = connection.execute(
+            statement.order_by(SyncChange.id).limit(limit)
+        ).all()
+        if not changes:
+            return [], cursor
+
+        event_type = SYNC_ENTITY_TYPES[Event]
+        return (
+            [
+                (entity_id, operation)
+                for _, entity_type, entity_id, operation in changes
+                if entity_type == event_type
+            ],
+            changes[-1].id,
+        )
+
+    @staticmethod
+    def claim(connection, user_id, event_id, remind_at, now=None):
+        """
+        Record that a reminder is being sent
+
+        A claim older than CLAIM_TIMEOUT that was never marked sent is taken
+        over, so a scheduler stopping between claiming and sending does not
+        lose the reminder.
+
+        Returns:
+            bool: False if the reminder was sent or is being sent
+        """
+        table = EventReminder.__table__
+        now = now or datetime.utcnow()
+        values = {
+            "user_id": user_id,
+            "event_id": event_id,
+            "remind_at": remind_at,
+            "status": EventReminder.STATUS_CLAIMED,
+            "claimed_at": now,
+        }
+        dialects = {"postgresql": postgresql, "sqlite": sqlite}
+        dialect = dialects.get(connection.dialect.name)
+        if dialect is None:
+            exists = connection.execute(
+                select(table.c.id).where(
+                    table.c.event_id == event_id, table.c.remind_at == remind_at
+                )
+            ).first()
+            if not exists:
+                connection.execute(table.insert().values(**values))
+                return True
+        else:
+            result = connection.execute(
+                dialect.insert(table)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=["event_id", "remind_at"])
+            )
+            if result.rowcount == 1:
+                return True
+
+        result = connection.execute(
+            table.update()
+            .where(
+                table.c.event_id == event_id,
+                table.c.remind_at == remind_at,
+                table.c.status == EventReminder.STATUS_CLAIMED,
+                table.c.claimed_at <= now - ReminderService.CLAIM_TIMEOUT,
+            )
+            .values(claimed_at=now)
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    def claim_expires_at(connection, event_id, remind_at):
+        """
+        Get when the claim of a reminder that is being sent can be taken over
+
+        Returns:
+            datetime: End of the claim, or None if the reminder was sent
+        """
+        table = EventReminder.__table__
+        claimed_at = connection.execute(
+            select(table.c.claimed_at).where(
+                table.c.event_id == event_id,
+                table.c.remind_at == remind_at,
+                table.c.status == EventReminder.STATUS_CLAIMED,
+            )
+        ).scalar()
+        if claimed_at is None:
+            return None
+        return claimed_at + ReminderService.CLAIM_TIMEOUT
+
+    @staticmethod
+    def mark_sent(connection, event_id, remind_at):
+        table = EventReminder.__table__
+        connection.execute(
+            table.update()
+            .where(table.c.event_id == event_id, table.c.remind_at == remind_at)
+            .values(status=EventReminder.STATUS_SENT, sent_at=datetime.utcnow())
+        )
+
+    @staticmethod
+    def release(connection, event_id, remind_at):
+        """
+        Drop the claim of a reminder whose delivery failed, so it can be retried
+        """
+        table = EventReminder.__table__
+        connection.execute(
+            table.delete().where(
+                table.c.event_id == event_id,
+                table.c.remind_at == remind_at,
+                table.c.status == EventReminder.STATUS_CLAIMED,
+            )
+        )
@@ -0,0 +1,111 @@
+from .. import db
+from ..models.expense import Expense
+from ..models.event import Event
+from ..models.sync_change import SyncChange, commit_watermark
+
+
+class SyncService:
+    """
+    Service layer for the incremental client sync feed
+    """
+
+    DEFAULT_LIMIT = 500
+    MAX_LIMIT = 1000
+
+    # Models resolved for non-deleted changes, keyed by entity type
+    ENTITY_MODELS = {"expense": Expense, "event": Event}
+
+    @staticmethod
+    def get_latest_cursor(user_id):
+        """
+        Get the most recent sync cursor for a user
+
+        Args:
+            user_id (int): User's unique identifier
+
+        Returns:
+            int: Latest cursor, or 0 if the user has no changes yet
+        """
+        query = db.session.query(SyncChange.id).filter(SyncChange.user_id == user_id)
+        watermark = commit_watermark(
+            db.session.connection(bind_arguments={"mapper": SyncChange.__mapper__})
+        )
+        if watermark is not None:
+            query = query.filter(SyncChange.changed_at < watermark)
+        latest = query.order_by(SyncChange.id.desc()).limit(1).scalar()
+
+        return latest or 0
+
+    @staticmethod
+    def get_changes(user_id, since=0, limit=DEFAULT_LIMIT):
+        """
+        Retrieve created, updated and deleted entities after a cursor
+
+        Multiple changes to the same entity within the page are collapsed to
+        the latest one, so clients only receive the current state or a
+        tombstone for each entity. Changes above the commit watermark are
+        left for a later call, so the cursor never skips a change committed
+        after changes with higher cursors.
+
+        Args:
+            user_id (int): User's unique identifier
+            since (int): Cursor returned by a previous call, 0 for a full sync
+            limit (int): Maximum number of change log entries to consume
+
+        Returns:
+            dict: Changes, the next cursor and whether more changes remain
+        """
+        if since < 0:
+            raise ValueError("Cursor must be a non-negative integer")
+
+        limit = max(1, min(limit, SyncService.MAX_LIMIT))
+
+        query = SyncChange.query.filter(
+            SyncChange.user_id == user_id, SyncChange.id > since
+        )
+        watermark = commit_watermark(
+            db.session.connection(bind_arguments={"mapper": SyncChange.__mapper__})
+        )
+        if watermark is not None:
+            query = query.filter(SyncChange.changed_at < watermark)
+
+        # Fetch one extra row to detect whether another page exists
+        changes = query.order_by(SyncChange.id.asc()).limit(limit + 1).all()
+
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        # Keep only the latest change per entity
+        latest = {}
+        for change in changes:
+            latest[(change.entity_type, change.entity_id)] = change
+
+        # Load current state for every entity that still exists
+        live_ids = {}
+        for (entity_type, entity_id), change in latest.items():
+            if change.operation != SyncChange.OPERATION_DELETED:
+                live_ids.setdefault(entity_type, []).append(entity_id)
+
+        entities = {}
+        for entity_type, ids in live_ids.items():
+            model = SyncService.ENTITY_MODELS[entity_type]
+            rows = model.query.filter(model.user_id == user_id, model.id.in_(ids))
+            for row in rows:
+                entities[(entity_type, row.id)] = row.to_dict()
+
+        results = []
+        for key, change in sorted(latest.items(), key=lambda item: item[1].id):
+            entry = change.to_dict()
+            if change.operation != SyncChange.OPERATION_DELETED:
+                data = entities.get(key)
+                if data is None:
+                    # Deleted after this page was read; the tombstone follows
+                    continue
+                entry["data"] = data
+            results.append(entry)
+
+        return {
+            "changes": results,
+            "next_cursor": changes[-1].id if changes else since,
+            "has_more": has_more,
+        }
@@ -0,0 +1,181 @@
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    ForeignKeyConstraint,
+    Integer,
+    MetaData,
+    Table,
+    UniqueConstraint,
+    and_,
+    insert,
+    inspect,
+    select,
+    text,
+)
+
+# Tables whose free-text category column moves to the categories table
+CATEGORIZED_TABLES = ("expenses", "events", "budgets")
+
+# Per-category figures derived from expenses; they are recreated keyed by
+# category id and refilled instead of converted
+DERIVED_TABLES = ("category_month_totals", "category_sketches", "category_baselines")
+
+
+def migrate_category_columns(connection):
+    """
+    Move free-text category columns to integer references
+
+    Distinct (user_id, category) pairs are inserted into the categories
+    table, a category_id column is filled from it and the text column is
+    dropped. Tables already migrated are skipped, so this is safe to rerun.
+
+    Args:
+        connection: SQLAlchemy connection inside a transaction
+
+    Returns:
+        dict: Number of rows linked per migrated table
+    """
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    migrated = {}
+
+    for table in CATEGORIZED_TABLES:
+        if table not in existing:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "category" not in columns:
+            continue
+
+        connection.execute(
+            text(
+                "INSERT INTO categories (user_id, name) "
+                f"SELECT DISTINCT t.user_id, t.category FROM {table} t "
+                "WHERE t.category IS NOT NULL AND NOT EXISTS ("
+                "SELECT 1 FROM categories c "
+                "WHERE c.user_id = t.user_id AND c.name = t.category)"
+            )
+        )
+
+        if table == "budgets" and connection.dialect.name == "sqlite":
+            migrated[table] = _rebuild_sqlite_budgets(connection)
+            continue
+
+        if "category_id" not in columns:
+            connection.execute(
+                text(
+                    f"ALTER TABLE {table} ADD COLUMN category_id INTEGER "
+                    "REFERENCES categories (id)"
+                )
+            )
+        result = connection.execute(
+            text(
+                f"UPDATE {table} SET category_id = ("
+                "SELECT c.id FROM categories c "
+                f"WHERE c.user_id = {table}.user_id AND c.name = {table}.category) "
+                "WHERE category_id IS NULL AND category IS NOT NULL"
+            )
+        )
+        migrated[table] = result.rowcount
+
+        if table in ("expenses", "budgets") and connection.dialect.name == "postgresql":
+            connection.execute(
+                text(f"ALTER TABLE {table} ALTER COLUMN category_id SET NOT NULL")
+            )
+        # Also drops the budgets' unique (user_id, category) constraint
+        connection.execute(text(f"ALTER TABLE {table} DROP COLUMN category"))
+        if table == "budgets":
+            connection.execute(
+                text(
+                    "ALTER TABLE budgets ADD CONSTRAINT uq_budgets_user_category_id "
+                    "UNIQUE (user_id, category_id)"
+                )
+            )
+        else:
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_user_id_category_id "
+                    f"ON {table} (user_id, category_id)"
+                )
+            )
+
+    return migrated
+
+
+def _rebuild_sqlite_budgets(connection):
+    # SQLite cannot drop a column of a unique constraint, so the table is
+    # copied with the category replaced; other columns are kept as they are
+    metadata = MetaData()
+    legacy = Table("budgets", metadata, autoload_with=connection)
+    categories = Table("categories", metadata, autoload_with=connection)
+    kept = [column for column in legacy.c if column.name != "category"]
+    budgets = Table(
+        "budgets_migrated",
+        metadata,
+        *[column._copy() for column in kept],
+        *[
+            ForeignKeyConstraint(
+                constraint.column_keys,
+                [element.target_fullname for element in constraint.elements],
+            )
+            for constraint in legacy.foreign_key_constraints
+            if "category" not in constraint.column_keys
+        ],
+        Column("category_id", Integer, ForeignKey("categories.id"), nullable=False),
+        UniqueConstraint("user_id", "category_id", name="uq_budgets_user_category_id"),
+    )
+    budgets.create(connection)
+
+    result = connection.execute(
+        insert(budgets).from_select(
+            [column.name for column in kept] + ["category_id"],
+            select(*kept, categories.c.id).join(
+                categories,
+                and_(
+                    categories.c.user_id == legacy.c.user_id,
+                    categories.c.name == legacy.c.category,
+                ),
+            ),
+        )
+    )
+    connection.execute(text("DROP TABLE budgets"))
+    connection.execute(text("ALTER TABLE budgets_migrated RENAME TO budgets"))
+    return result.rowcount
+
+
+def recreate_derived_tables(connection):
+    """
+    Recreate the per-category summary tables still keyed by category name
+
+    Their rows are derived from expenses, so they are dropped rather than
+    converted. Monthly totals and sketches must be rebuilt afterwards;
+    baselines are recomputed when next read.
+
+    Args:
+        connection: SQLAlchemy connection inside a transaction
+
+    Returns:
+        list: Names of the recreated tables
+    """
+    from .. import db
+
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    recreated = []
+
+    for name in DERIVED_TABLES:
+        if name not in existing:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(name)}
+        if "category" not in columns:
+            continue
+
+        table = db.metadata.tables[name]
+        table.drop(connection)
+        table.create(connection)
+        recreated.append(name)
+
+    if "category_baselines" in recreated and "baseline_refreshes" in existing:
+        # Have the emptied baselines recomputed on their next read
+        connection.execute(text("DELETE FROM baseline_refreshes"))
+
+    return recreated
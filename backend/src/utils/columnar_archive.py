@@ -0,0 +1,247 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+MAGIC = b"EXPARC02"
+HEADER_LENGTH = struct.Struct("<I")
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Fixed-width columns and their numpy dtypes; amounts are integer cents
+NUMERIC_COLUMNS = {"id": "<i8", "date": "<i8", "amount": "<i8"}
+
+# Low-cardinality text columns stored as codes into a header dictionary
+DICTIONARY_COLUMNS = ("category", "currency")
+
+
+def datetime_to_micros(value):
+    """
+    Convert a datetime to microseconds since the epoch, treating naive values as UTC
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+
+def micros_to_datetime(value):
+    """
+    Convert microseconds since the epoch back to a naive UTC datetime
+    """
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def write_archive(path, rows):
+    """
+    Write expense rows to a compressed columnar archive file
+
+    Each column is stored contiguously and compressed on its own, so readers
+    only inflate the columns they need. Categories and currencies are
+    dictionary encoded.
+    The file is written to a temporary name and atomically moved in place.
+
+    Args:
+        path (str): Destination file
+        rows (dict): Column arrays with keys id, date (microseconds), amount
+            (cents), category, currency and description, all of the same
+            length
+    """
+    count = len(rows["id"])
+    dictionaries = {}
+    codes = {}
+    for name in DICTIONARY_COLUMNS:
+        dictionaries[name], codes[name] = np.unique(
+            np.asarray(rows[name], dtype=object).astype(str), return_inverse=True
+        )
+
+    descriptions = [
+        (description or "").encode("utf-8") for description in rows["description"]
+    ]
+    description_offsets = np.zeros(count + 1, dtype="<i8")
+    description_offsets[1:] = np.cumsum([len(item) for item in descriptions])
+    description_nulls = np.array(
+        [description is None for description in rows["description"]], dtype=np.uint8
+    )
+
+    payloads = {
+        "id": np.asarray(rows["id"], dtype="<i8").tobytes(),
+        "date": np.asarray(rows["date"], dtype="<i8").tobytes(),
+        "amount": np.asarray(rows["amount"], dtype="<i8").tobytes(),
+        **{name: codes[name].astype("<u4").tobytes() for name in DICTIONARY_COLUMNS},
+        "description": b"".join(descriptions),
+        "description_offsets": description_offsets.tobytes(),
+        "description_nulls": description_nulls.tobytes(),
+    }
+
+    header = {
+        "rows": count,
+        "min_date": int(np.min(rows["date"])) if count else None,
+        "max_date": int(np.max(rows["date"])) if count else None,
+        "dictionaries": {
+            name: values.tolist() for name, values in dictionaries.items()
+        },
+        "columns": {},
+    }
+    blobs = []
+    offset = 0
+    for name, payload in payloads.items():
+        blob = zlib.compress(payload, 6)
+        header["columns"][name] = {"offset": offset, "length": len(blob)}
+        blobs.append(blob)
+        offset += len(blob)
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as output:
+            output.write(MAGIC)
+            output.write(HEADER_LENGTH.pack(len(header_bytes)))
+            output.write(header_bytes)
+            for blob in blobs:
+                output.write(blob)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+class ArchiveReader:
+    """
+    Memory-mapped reader of a columnar expense archive
+
+    Only the header is parsed on open. Column blocks are inflated straight
+    from the mapping on first access, so the kernel pages in just the bytes
+    of the requested columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+
+        if self._map[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an expense archive")
+
+        start = len(MAGIC)
+        (header_length,) = HEADER_LENGTH.unpack_from(self._map, start)
+        start += HEADER_LENGTH.size
+        self.header = json.loads(bytes(self._map[start : start + header_length]))
+        self._data_start = start + header_length
+        self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the mapping and the file handle
+        """
+        self._columns.clear()
+        self._map.close()
+        self._file.close()
+
+    @property
+    def row_count(self):
+        return self.header["rows"]
+
+    def overlaps(self, start=None, end=None):
+        """
+        Check whether the archive may hold rows in a date range
+
+        Args:
+            start (datetime, optional): Inclusive lower bound
+            end (datetime, optional): Inclusive upper bound
+
+        Returns:
+            bool: False if the range misses every archived row
+        """
+        if not self.row_count:
+            return False
+        if start is not None and self.header["max_date"] < datetime_to_micros(start):
+            return False
+        if end is not None and self.header["min_date"] > datetime_to_micros(end):
+            return False
+        return True
+
+    def column(self, name):
+        """
+        Get a decoded column as a numpy array
+
+        Args:
+            name (str): id, date, amount, category, currency or description
+
+        Returns:
+            ndarray: Column values; text columns as objects
+        """
+        if name not in self._columns:
+            if name in NUMERIC_COLUMNS:
+                values = np.frombuffer(self._inflate(name), dtype=NUMERIC_COLUMNS[name])
+            elif name in DICTIONARY_COLUMNS:
+                codes = np.frombuffer(self._inflate(name), dtype="<u4")
+                dictionary = self.header["dictionaries"][name]
+                values = np.asarray(dictionary, dtype=object)[codes]
+            elif name == "description":
+                blob = self._inflate("description")
+                offsets = np.frombuffer(self._inflate("description_offsets"), "<i8")
+                nulls = np.frombuffer(self._inflate("description_nulls"), np.uint8)
+                values = np.array(
+                    [
+                        None if nulls[index] else blob[start:end].decode("utf-8")
+                        for index, (start, end) in enumerate(
+                            zip(offsets[:-1], offsets[1:])
+                        )
+                    ],
+                    dtype=object,
+                )
+            else:
+                raise KeyError(name)
+            self._columns[name] = values
+
+        return self._columns[name]
+
+    def read(self, columns, start=None, end=None):
+        """
+        Read columns of the rows falling in a date range
+
+        Args:
+            columns (iterable): Column names to return
+            start (datetime, optional): Inclusive lower bound
+            end (datetime, optional): Inclusive upper bound
+
+        Returns:
+            dict: Column arrays restricted to the matching rows
+        """
+        dates = self.column("date")
+        mask = np.ones(len(dates), dtype=bool)
+        if start is not None:
+            mask &= dates >= datetime_to_micros(start)
+        if end is not None:
+            mask &= dates <= datetime_to_micros(end)
+
+        return {name: self.column(name)[mask] for name in columns}
+
+    def _inflate(self, name):
+        location = self.header["columns"][name]
+        start = self._data_start + location["offset"]
+        # Release the buffer views right away so the mapping can be closed
+        with memoryview(self._map) as view:
+            with view[start : start + location["length"]] as block:
+                return zlib.decompress(block)
@@ -0,0 +1,251 @@
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, has_app_context, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+class CircuitBreaker:
+    """
+    Stops sending work to the database after repeated failures
+
+    The breaker opens after ``failure_threshold`` consecutive failures.
+    While open, calls are refused without touching the database; after
+    ``reset_seconds`` a single trial call is let through and its outcome
+    closes or reopens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.reset_seconds:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """
+        Tell whether a call may use the database now
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_after(self):
+        """
+        Seconds until the next trial call, 0 when the breaker is closed
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+            return max(0, remaining)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            trial_failed = self._trial_running
+            self._trial_running = False
+            if trial_failed or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(
+                        "Database circuit opened after %s failures", self._failures
+                    )
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """
+        End a trial call whose outcome says nothing about the database
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def trip(self):
+        """
+        Open the breaker immediately
+        """
+        with self._lock:
+            self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class DatabaseGuard:
+    """
+    Keeps read endpoints responsive while the database is slow or down
+
+    Guarded endpoints get a latency budget. On PostgreSQL every transaction
+    they begin gets a ``statement_timeout`` of the budget left, so a query
+    stuck behind locks or a saturated server is cancelled instead of holding
+    a worker. Timeouts, connection errors and responses over budget count
+    as failures of the circuit breaker.
+
+    Successful responses are remembered per endpoint, user and query
+    string. When the breaker is open or the database fails, the last one is
+    returned marked as stale, with a ``stale`` field and a Warning header,
+    or a 503 when there is none. Budgets can be overridden per endpoint
+    with the LATENCY_BUDGETS_MS setting.
+    """
+
+    DEFAULT_MAX_ENTRIES = 4096
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.max_entries = self.DEFAULT_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._responses = OrderedDict()
+
+    def configure(self, app):
+        """
+        Apply the CIRCUIT_BREAKER_* settings of an application
+        """
+        self.breaker.failure_threshold = int(
+            app.config.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)
+        )
+        self.breaker.reset_seconds = float(
+            app.config.get("CIRCUIT_BREAKER_RESET_SECONDS", 30)
+        )
+
+    def install(self):
+        """
+        Apply the statement timeout of the current budget to new transactions
+        """
+        event.listen(Session, "after_begin", self._set_statement_timeout)
+
+    def read(self, budget_ms):
+        """
+        Guard a read-only view, placed below ``jwt_required``
+
+        Args:
+            budget_ms (int): Default latency budget of the endpoint
+        """
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                return self._run(view, budget_ms, args, kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+
+    def _run(self, view, budget_ms, args, kwargs):
+        budget_ms = current_app.config.get("LATENCY_BUDGETS_MS", {}).get(
+            request.endpoint, budget_ms
+        )
+        key = (request.endpoint, get_jwt_identity(), request.full_path)
+
+        if not self.breaker.allow():
+            return self._fallback(key, "Database circuit open")
+
+        started = time.monotonic()
+        g.latency_deadline = started + budget_ms / 1000
+        try:
+            response = make_response(view(*args, **kwargs))
+        except (OperationalError, PoolTimeoutError) as e:
+            db.session.rollback()
+            self.breaker.record_failure()
+            logger.warning("Database failure on %s: %s", request.endpoint, e)
+            return self._fallback(key, "Database unavailable")
+        except Exception:
+            self.breaker.release()
+            raise
+        finally:
+            g.pop("latency_deadline", None)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if elapsed_ms > budget_ms:
+            self.breaker.record_failure()
+            logger.warning(
+                "%s took %.0f ms, over its %s ms budget",
+                request.endpoint,
+                elapsed_ms,
+                budget_ms,
+            )
+        else:
+            self.breaker.record_success()
+
+        if response.status_code == 200 and response.is_json:
+            self._store(key, response.get_json())
+        return response
+
+    def _store(self, key, data):
+        with self._lock:
+            self._responses.pop(key, None)
+            self._responses[key] = (time.time(), data)
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+
+    def _fallback(self, key, reason):
+        with self._lock:
+            entry = self._responses.get(key)
+        retry_after = str(max(1, round(self.breaker.retry_after())))
+
+        if entry is None:
+            response = jsonify(
+                {"error": "Service temporarily unavailable", "reason": reason}
+            )
+            response.status_code = 503
+            response.headers["Retry-After"] = retry_after
+            return response
+
+        cached_at, data = entry
+        if isinstance(data, dict):
+            data = {**data, "stale": True, "stale_age_seconds": time.time() - cached_at}
+        response = jsonify(data)
+        response.headers["Warning"] = STALE_WARNING
+        response.headers["Retry-After"] = retry_after
+        return response
+
+    @staticmethod
+    def _set_statement_timeout(session, transaction, connection):
+        if transaction.parent is not None or connection.dialect.name != "postgresql":
+            return
+        deadline = g.get("latency_deadline") if has_app_context() else None
+        if deadline is None:
+            return
+        remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {remaining_ms}")
+
+
+database_guard = DatabaseGuard()
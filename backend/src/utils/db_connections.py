@@ -30,7 +30,8 @@ def create_db_connection(db_url=None):
             db_url,
             pool_size=10,  # Number of connections to keep open
             max_overflow=20,  # Maximum number of connections beyond pool_size
-            pool_timeout=30,  # Timeout for getting a connection from the pool
+            # Fail fast instead of queueing when every connection is busy
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "3")),
             pool_recycle=1800,  # Recycle connections after 30 minutes
             echo=False,  # Set to True for SQL query logging
         )
@@ -2,10 +2,8 @@ import logging
 from flask import jsonify
 from sqlalchemy.exc import SQLAlchemyError
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Records go through the queue installed by utils.log_pipeline, so logging
+# here never waits on I/O; arguments are formatted by the listener thread
 logger = logging.getLogger(__name__)
 
 
@@ -19,7 +17,7 @@ def handle_validation_error(error):
     Returns:
         tuple: Flask response with error details
     """
-    logger.warning(f"Validation Error: {str(error)}")
+    logger.warning("Validation Error: %s", error)
     return jsonify(
         {"status": "error", "type": "validation", "message": str(error)}
     ), 400
@@ -35,7 +33,7 @@ def handle_database_error(error):
     Returns:
         tuple: Flask response with error details
     """
-    logger.error(f"Database Error: {str(error)}")
+    logger.error("Database Error: %s", error)
     return jsonify(
         {
             "status": "error",
@@ -55,7 +53,7 @@ def handle_authentication_error(error):
     Returns:
         tuple: Flask response with error details
     """
-    logger.warning(f"Authentication Error: {str(error)}")
+    logger.warning("Authentication Error: %s", error)
     return jsonify(
         {"status": "error", "type": "authentication", "message": str(error)}
     ), 401
@@ -71,7 +69,7 @@ def global_error_handler(error):
     Returns:
         tuple: Flask response with error details
     """
-    logger.critical(f"Unhandled Error: {str(error)}", exc_info=True)
+    logger.critical("Unhandled Error: %s", error, exc_info=error)
     return jsonify(
         {
             "status": "error",
@@ -91,6 +89,9 @@ class CustomErrorHandler:
         """
         Log errors with different severity levels
 
+        The record is queued for the background listener and dropped if
+        the queue is full, so this never blocks the response.
+
         Args:
             error (Exception): Error to log
             level (str): Logging level
@@ -104,7 +105,7 @@ class CustomErrorHandler:
         }
 
         log_method = log_methods.get(level, logger.error)
-        log_method(f"Error: {str(error)}", exc_info=True)
+        log_method("Error: %s", error, exc_info=error)
 
     @staticmethod
     def create_error_response(message, status_code=400, error_type="generic"):
@@ -0,0 +1,242 @@
+import functools
+import hashlib
+from datetime import datetime, timedelta, timezone
+from flask import Response, current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .. import db
+from ..models.idempotency_key import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 64
+DEFAULT_TTL_HOURS = 24
+
+# Session.info key holding the key row of the request being run
+PENDING_KEY = "pending_idempotency_key"
+
+
+def _utc(value):
+    # PostgreSQL returns aware datetimes, SQLite naive UTC ones
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _error(message, status_code):
+    response = jsonify({"error": message})
+    response.status_code = status_code
+    return response
+
+
+def _request_hash():
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()[:32]
+
+
+def _replay(record, request_hash):
+    if record.request_hash != request_hash:
+        return _error(f"{IDEMPOTENCY_HEADER} was already used for another request", 422)
+    if record.status_code is None:
+        return _error(
+            f"The request with this {IDEMPOTENCY_HEADER} stored no response", 409
+        )
+
+    response = Response(
+        record.response, status=record.status_code, mimetype="application/json"
+    )
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _stored_replay(user_id, key, request_hash):
+    record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if record is None or _utc(record.expires_at) <= datetime.utcnow():
+        return None
+    return _replay(record, request_hash)
+
+
+def _claim(user_id, key, request_hash):
+    """
+    Add the key to the current transaction, or answer the request from its
+    stored row
+
+    The row is flushed but not committed, so it commits or rolls back
+    together with whatever the view creates. A concurrent request with the
+    same key waits on the unique index until this transaction ends.
+
+    Returns:
+        tuple: The added row, or None and the response to send
+    """
+    now = datetime.utcnow()
+    record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if record is not None:
+        if _utc(record.expires_at) > now:
+            return None, _replay(record, request_hash)
+        db.session.delete(record)
+        db.session.flush()
+
+    ttl = current_app.config.get("IDEMPOTENCY_KEY_TTL_HOURS", DEFAULT_TTL_HOURS)
+    record = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=request_hash,
+        created_at=now,
+        expires_at=now + timedelta(hours=ttl),
+    )
+    db.session.add(record)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # A concurrent request with the key committed first
+        db.session.rollback()
+        replay = _stored_replay(user_id, key, request_hash)
+        if replay is None:
+            return None, _error(
+                f"A request with this {IDEMPOTENCY_HEADER} is in progress", 409
+            )
+        return None, replay
+    return record, None
+
+
+def _store(user_id, key, request_hash, response):
+    """
+    Store the response of a request that did not commit, such as a
+    validation error
+    """
+    now = datetime.utcnow()
+    ttl = current_app.config.get("IDEMPOTENCY_KEY_TTL_HOURS", DEFAULT_TTL_HOURS)
+    IdempotencyKey.query.filter_by(user_id=user_id, key=key).filter(
+        IdempotencyKey.expires_at <= now
+    ).delete()
+    db.session.add(
+        IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            request_hash=request_hash,
+            status_code=response.status_code,
+            response=response.get_data(as_text=True),
+            created_at=now,
+            expires_at=now + timedelta(hours=ttl),
+        )
+    )
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return _stored_replay(user_id, key, request_hash) or response
+    return response
+
+
+def idempotent(model, serialize):
+    """
+    Answer retries of a create request carrying an Idempotency-Key header
+    with the response of the first attempt
+
+    The key is written in the transaction of the view, and when that
+    transaction creates a ``model`` row the 201 response built by
+    ``serialize`` is stored with it. The key is then never committed
+    without the row it created and vice versa, so a retry either replays
+    the response or runs the view again on a clean slate. Other client
+    errors are stored as well; server errors are not, so the retry runs
+    again. Reusing a key for a different request is refused. Place under
+    jwt_required; keys are scoped to the authenticated user.
+
+    Args:
+        model: Model class the view creates
+        serialize: Builds the response body from the created row
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                if current_app.config.get("IDEMPOTENCY_KEY_REQUIRED"):
+                    return _error(f"The {IDEMPOTENCY_HEADER} header is required", 428)
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return _error(
+                    f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters",
+                    400,
+                )
+
+            user_id = get_jwt_identity()
+            request_hash = _request_hash()
+            record, replay = _claim(user_id, key, request_hash)
+            if replay is not None:
+                return replay
+
+            pending = {"record": record, "model": model, "serialize": serialize}
+            db.session.info[PENDING_KEY] = pending
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.info.pop(PENDING_KEY, None)
+
+            if pending.get("stored") and response.status_code < 500:
+                return response
+
+            # Nothing was committed, so the key row goes with the rollback
+            db.session.rollback()
+            if response.status_code >= 500:
+                return _stored_replay(user_id, key, request_hash) or response
+            return _store(user_id, key, request_hash, response)
+
+        return wrapper
+
+    return decorator
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_created_row(session, flush_context):
+    pending = session.info.get(PENDING_KEY)
+    if pending is None or "created" in pending:
+        return
+    for target in session.new:
+        if isinstance(target, pending["model"]):
+            pending["created"] = target
+            return
+
+
+@event.listens_for(Session, "before_commit")
+def _store_created_response(session):
+    pending = session.info.get(PENDING_KEY)
+    if pending is None or session.get_nested_transaction() is not None:
+        return
+
+    session.flush()
+    created = pending.get("created")
+    if created is None:
+        return
+
+    # Serialize what readers will load once committed, server defaults included
+    session.refresh(created)
+    record = pending["record"]
+    record.status_code = 201
+    record.response = current_app.json.dumps(pending["serialize"](created))
+    pending["stored"] = True
+
+
+def purge_expired_keys():
+    """
+    Delete expired idempotency keys on every database holding them
+
+    Returns:
+        int: Number of deleted keys
+    """
+    from .sharding import shard_router
+
+    table = IdempotencyKey.__table__
+    purged = 0
+    for engine in shard_router.engines or [db.engine]:
+        with engine.begin() as connection:
+            purged += connection.execute(
+                table.delete().where(table.c.expires_at < datetime.utcnow())
+            ).rowcount
+    return purged
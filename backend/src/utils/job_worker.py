@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between requeues of stale jobs and purges of expired results
+HOUSEKEEPING_INTERVAL = 300
+
+
+def _initialize_process():
+    from .. import db, app
+    from .log_pipeline import configure_logging
+
+    # The log listener thread of the parent does not survive the fork
+    configure_logging()
+
+    # Connections inherited from the parent process must not be reused
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _run_in_process(job_id):
+    from .. import app
+    from ..services.job_service import JobService
+
+    with app.app_context():
+        JobService.run_job(job_id)
+
+
+class JobWorker:
+    """
+    Claims queued jobs and runs them on a thread or process pool
+
+    A dispatcher thread claims jobs while the pool has free slots, so jobs
+    are never claimed long before they can start, and sends the heartbeats
+    of the jobs it runs. Threads suit jobs that
+    mostly wait on the database; processes suit CPU heavy reports, at the
+    cost of a separate connection pool per process. Several workers, on
+    one machine or many, can share the jobs table.
+    """
+
+    POOLS = ("thread", "process")
+
+    def __init__(self, app, pool="thread", size=4, poll_interval=1.0):
+        if pool not in self.POOLS:
+            raise ValueError(f"Pool must be one of: {', '.join(self.POOLS)}")
+        if size < 1:
+            raise ValueError("Pool size must be positive")
+
+        self.app = app
+        self.pool = pool
+        self.size = size
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start dispatching jobs from a background thread
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="job-worker-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop claiming jobs and wait for the running ones to finish
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """
+        Dispatch jobs until stopped
+        """
+        from ..services.job_service import JobService
+
+        if self.pool == "process":
+            executor = ProcessPoolExecutor(self.size, initializer=_initialize_process)
+            submit = _run_in_process
+        else:
+            executor = ThreadPoolExecutor(self.size, thread_name_prefix="job-worker")
+            submit = self._run_in_thread
+
+        running = {}
+        next_housekeeping = 0
+        next_heartbeat = (
+            time.monotonic() + JobService.HEARTBEAT_INTERVAL.total_seconds()
+        )
+        with executor:
+            while not self._stopped.is_set():
+                if time.monotonic() >= next_housekeeping:
+                    self._housekeeping()
+                    next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL
+                if time.monotonic() >= next_heartbeat:
+                    self._heartbeat(running.values())
+                    next_heartbeat = (
+                        time.monotonic() + JobService.HEARTBEAT_INTERVAL.total_seconds()
+                    )
+
+                job_id = None
+                if len(running) < self.size:
+                    try:
+                        with self.app.app_context():
+                            job_id = JobService.claim_next()
+                    except Exception:
+                        # Back off instead of stopping on a database outage
+                        logger.exception("Claiming a job failed")
+                        self._stopped.wait(self.poll_interval)
+                        continue
+                if job_id is not None:
+                    running[executor.submit(submit, job_id)] = job_id
+                    continue
+
+                if running:
+                    done, _ = wait(
+                        running, self.poll_interval, return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        del running[future]
+                        self._log_failure(future)
+                else:
+                    self._stopped.wait(self.poll_interval)
+
+            for future in wait(running).done:
+                self._log_failure(future)
+
+    def _run_in_thread(self, job_id):
+        from ..services.job_service import JobService
+
+        with self.app.app_context():
+            JobService.run_job(job_id)
+
+    def _heartbeat(self, job_ids):
+        from ..services.job_service import JobService
+
+        try:
+            with self.app.app_context():
+                JobService.heartbeat(job_ids)
+        except Exception:
+            logger.exception("Sending job heartbeats failed")
+
+    def _housekeeping(self):
+        from ..services.job_service import JobService
+
+        try:
+            with self.app.app_context():
+                requeued = JobService.requeue_stale()
+                purged = JobService.purge_expired()
+            if requeued or purged:
+                logger.info("Requeued %s stale jobs, purged %s", requeued, purged)
+        except Exception:
+            logger.exception("Job housekeeping failed")
+
+    @staticmethod
+    def _log_failure(future):
+        # run_job records job errors itself; this is a failure to record them
+        error = future.exception()
+        if error is not None:
+            logger.error("Job worker failed to run a job", exc_info=error)
@@ -0,0 +1,285 @@
+from sqlalchemy import false
+from ..models.category import category_cache
+from ..models.user import User
+from .money import parse_amount, to_cents
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+MAX_CATEGORIES = 20
+MAX_PREFIX_LENGTH = 100
+
+# Highest code point, used as the exclusive upper bound of a prefix range
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+
+class RangeFilter:
+    """
+    Inclusive range on an indexed column, e.g. ``min_amount``/``max_amount``
+
+    Args:
+        column (str): Model attribute the range applies to
+        low_param (str): Query parameter of the lower bound
+        high_param (str): Query parameter of the upper bound
+        parse: Converts a raw parameter to a column value, raising ValueError
+        end_column (str): Attribute checked against the upper bound instead
+            of ``column``, for rows spanning an interval such as events
+    """
+
+    is_range = True
+
+    def __init__(self, column, low_param, high_param, parse, end_column=None):
+        self.column = column
+        self.low_param = low_param
+        self.high_param = high_param
+        self.parse = parse
+        self.end_column = end_column
+        self.params = (low_param, high_param)
+
+    def parse_args(self, args):
+        low = self._parse_bound(args, self.low_param)
+        high = self._parse_bound(args, self.high_param)
+        if low is None and high is None:
+            return None
+        if low is not None and high is not None and low > high:
+            raise ValueError(
+                f"{self.low_param} must not be greater than {self.high_param}"
+            )
+        return low, high
+
+    def _parse_bound(self, args, name):
+        value = args.get(name)
+        if value is None or value == "":
+            return None
+        return self.parse(value, name)
+
+    def apply(self, query, model, value, user_id):
+        low, high = value
+        column = getattr(model, self.column)
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            if self.end_column:
+                # Intervals end after they start, so the redundant bound on
+                # the indexed column is always true but narrows the scan
+                query = query.filter(
+                    getattr(model, self.end_column) <= high, column < high
+                )
+            else:
+                query = query.filter(column <= high)
+        return query
+
+
+class AmountFilter(RangeFilter):
+    """
+    Range on ``amount_cents`` given in units of the user's currency
+
+    Bounds stay decimals while parsing and are scaled to minor units once
+    the user, and with it the currency, is known.
+    """
+
+    def __init__(self, low_param, high_param):
+        super().__init__("amount_cents", low_param, high_param, parse_amount_param)
+
+    def apply(self, query, model, value, user_id):
+        currency = User.currency_of(user_id)
+        value = tuple(
+            None if bound is None else to_cents(bound, currency) for bound in value
+        )
+        return super().apply(query, model, value, user_id)
+
+
+class PrefixFilter:
+    """
+    Case-sensitive prefix match that an ordinary B-tree index can serve
+
+    The prefix is turned into a range, which PostgreSQL and SQLite both
+    answer from an index on (user_id, column); LIKE with a leading literal
+    is only index-backed under specific collations. The range only equals
+    the prefix match under a bytewise collation, so the LIKE still filters
+    the rows the range selects.
+    """
+
+    is_range = True
+
+    def __init__(self, column, param):
+        self.column = column
+        self.param = param
+        self.params = (param,)
+
+    def parse_args(self, args):
+        prefix = args.get(self.param)
+        if not prefix:
+            return None
+        if len(prefix) > MAX_PREFIX_LENGTH:
+            raise ValueError(
+                f"{self.param} must be at most {MAX_PREFIX_LENGTH} characters"
+            )
+        return prefix
+
+    def apply(self, query, model, value, user_id):
+        column = getattr(model, self.column)
+        return query.filter(
+            column >= value,
+            column < value + PREFIX_UPPER_BOUND,
+            column.startswith(value, autoescape=True),
+        )
+
+
+class CategoryFilter:
+    """
+    Match any of several comma-separated category names
+
+    Names are resolved to ids first, so the filter is an IN list on the
+    (user_id, category_id) index and unknown names simply match nothing.
+    """
+
+    is_range = False
+
+    def __init__(self, param="category"):
+        self.column = "category_id"
+        self.param = param
+        self.params = (param,)
+
+    def parse_args(self, args):
+        names = []
+        for value in args.getlist(self.param):
+            names.extend(name.strip() for name in value.split(","))
+        names = list(dict.fromkeys(name for name in names if name))
+        if not names:
+            return None
+        if len(names) > MAX_CATEGORIES:
+            raise ValueError(f"At most {MAX_CATEGORIES} categories can be combined")
+        return names
+
+    def apply(self, query, model, value, user_id):
+        category_ids = [
+            category_id
+            for category_id in (category_cache.id_of(user_id, name) for name in value)
+            if category_id is not None
+        ]
+        if not category_ids:
+            return query.filter(false())
+        return query.filter(model.category_id.in_(category_ids))
+
+
+class ListQuery:
+    """
+    Declarative filters and sort orders of a per-user list endpoint
+
+    Every filter and sort column must follow user_id in an index. A
+    request may use the index of its sort column plus at most one other
+    range index, and page sizes are capped, so accepted combinations
+    never scan a whole table and only sort rows an index range selected.
+
+    Args:
+        model: Model class listed by the endpoint
+        filters (list): Filter declarations
+        sorts (dict): Sort parameter values mapped to indexed attributes
+        default_sort (str): Sort used when none is requested; a leading
+            "-" means descending
+    """
+
+    def __init__(self, model, filters, sorts, default_sort):
+        self.model = model
+        self.filters = filters
+        self.sorts = sorts
+        self.default_sort = default_sort
+
+    def parse(self, args, ranked=False):
+        """
+        Validate request arguments into typed filters and a sort order
+
+        Args:
+            args: Request arguments (a MultiDict)
+            ranked (bool): Results are ordered by search relevance, so no
+                sort may be requested
+
+        Returns:
+            dict: Parsed filters, sort, page and per_page
+
+        Raises:
+            ValueError: If a parameter is invalid or the combination is not
+                backed by an index
+        """
+        requested_sort = args.get("sort")
+        if ranked and requested_sort:
+            raise ValueError(
+                "sort cannot be combined with q; results are ordered by relevance"
+            )
+        sort = requested_sort or self.default_sort
+        descending = sort.startswith("-")
+        sort_key = sort.lstrip("-")
+        if sort_key not in self.sorts:
+            raise ValueError(
+                f"sort must be one of: {', '.join(sorted(self.sorts))}, "
+                "optionally prefixed with - for descending order"
+            )
+        sort_column = self.sorts[sort_key]
+
+        filters = []
+        for declaration in self.filters:
+            value = declaration.parse_args(args)
+            if value is not None:
+                filters.append((declaration, value))
+
+        # Ranges on different columns cannot share one composite index
+        range_columns = {
+            declaration.column
+            for declaration, _ in filters
+            if declaration.is_range and declaration.column != sort_column
+        }
+        if len(range_columns) > 1:
+            params = [
+                param
+                for declaration, _ in filters
+                if declaration.column in range_columns
+                for param in declaration.params
+                if param in args
+            ]
+            raise ValueError(
+                f"{', '.join(params)} cannot be combined unless sorting by one "
+                "of the filtered fields"
+            )
+
+        page = args.get("page", 1, type=int)
+        per_page = args.get("per_page", DEFAULT_PER_PAGE, type=int)
+        if page < 1 or per_page < 1:
+            raise ValueError("page and per_page must be positive")
+
+        return {
+            "filters": filters,
+            "sort": (None if ranked else sort_column, descending),
+            "page": page,
+            "per_page": min(per_page, MAX_PER_PAGE),
+        }
+
+    def apply(self, query, parsed, user_id):
+        """
+        Add the parsed filters to a query
+
+        Returns:
+            tuple: Filtered query and the ORDER BY clauses, which are empty
+                for ranked queries
+        """
+        for declaration, value in parsed["filters"]:
+            query = declaration.apply(query, self.model, value, user_id)
+
+        sort_column, descending = parsed["sort"]
+        if sort_column is None:
+            return query, []
+
+        column = getattr(self.model, sort_column)
+        # The id tie-breaker keeps pages stable when sort values repeat
+        if descending:
+            return query, [column.desc(), self.model.id.desc()]
+        return query, [column.asc(), self.model.id.asc()]
+
+
+def parse_amount_param(value, name):
+    """
+    Parse an amount query parameter into a Decimal in currency units
+    """
+    try:
+        return parse_amount(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
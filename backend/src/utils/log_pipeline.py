@@ -0,0 +1,217 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = "X-Request-ID"
+MAX_REQUEST_ID_LENGTH = 128
+
+# Attributes every LogRecord has; anything else was passed through extra=
+STANDARD_ATTRIBUTES = set(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))
+) | {"message", "asctime", "request_id"}
+
+
+def get_request_id():
+    """
+    Return the id of the current request, or None outside requests
+    """
+    if has_request_context():
+        return getattr(g, "request_id", None)
+    return None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Render records as one JSON object per line
+
+    Values passed with ``extra=`` become fields of the object, so callers
+    can log structured data such as the slow query entries.
+    """
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, tz=timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for name, value in vars(record).items():
+            if name not in STANDARD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through a burst of identical records, then only a sample of them
+
+    Records are identical when they share a logger, level, message template
+    and exception type. Within each interval the first ``burst`` records
+    pass and after that one in ``sample_every``; the next record that
+    passes carries the number suppressed in between.
+    """
+
+    def __init__(self, burst=10, interval=60.0, sample_every=100, max_keys=1000):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample_every = sample_every
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._windows = OrderedDict()
+
+    def filter(self, record):
+        exc_type = record.exc_info[0].__name__ if record.exc_info else None
+        key = (record.name, record.levelno, str(record.msg), exc_type)
+        now = time.monotonic()
+
+        with self._lock:
+            window = self._windows.pop(key, None)
+            if window is None or now - window["started"] >= self.interval:
+                suppressed = window["suppressed"] if window else 0
+                window = {"started": now, "count": 0, "suppressed": suppressed}
+            self._windows[key] = window
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+
+            window["count"] += 1
+            over_burst = window["count"] - self.burst
+            if over_burst > 0 and over_burst % self.sample_every:
+                window["suppressed"] += 1
+                return False
+
+            if window["suppressed"]:
+                record.suppressed = window["suppressed"]
+                window["suppressed"] = 0
+        return True
+
+
+_exception_formatter = logging.Formatter()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hand records to the listener thread without ever waiting
+
+    Formatting is left to the listener. When the queue is full the record
+    is dropped and counted instead of blocking the request.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def format(self, record):
+        # Only merge the arguments; the listener's formatter does the rest
+        return record.getMessage()
+
+    def prepare(self, record):
+        # The listener has no request context, so capture the id now
+        record.request_id = get_request_id()
+        # The queued copy drops exc_info, so keep the rendered traceback
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        exc_text = record.exc_text
+        record = super().prepare(record)
+        record.exc_text = exc_text
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+
+
+def configure_logging(app=None, level=logging.INFO, queue_size=10000, stream=None):
+    """
+    Route all logging through a bounded queue drained by a background thread
+
+    The root logger only enqueues records; a listener thread writes them
+    as JSON lines. Repetitive records are rate limited before they are
+    queued. With an app, every request gets an id, taken from the
+    X-Request-ID header when present, that is added to its records and
+    returned in the response. Calling this again replaces the pipeline.
+
+    Args:
+        app: Flask application to assign request ids on
+        level (int): Root logger level
+        queue_size (int): Records buffered before new ones are dropped
+        stream: Output stream, stderr by default
+
+    Returns:
+        NonBlockingQueueHandler: Handler installed on the root logger
+    """
+    global _listener
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(RateLimitFilter())
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for existing in [
+        existing
+        for existing in root.handlers
+        if isinstance(existing, NonBlockingQueueHandler)
+    ]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    if app is not None:
+        app.before_request(_assign_request_id)
+        app.after_request(_return_request_id)
+
+    return handler
+
+
+def stop_logging():
+    """
+    Flush queued records and stop the listener thread
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def _assign_request_id():
+    request_id = request.headers.get(REQUEST_ID_HEADER, "")[:MAX_REQUEST_ID_LENGTH]
+    g.request_id = request_id or uuid.uuid4().hex
+
+
+def _return_request_id(response):
+    request_id = get_request_id()
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
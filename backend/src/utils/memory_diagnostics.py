@@ -0,0 +1,190 @@
+import os
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, request
+
+# Allocations made by the tracing machinery itself are not reported
+IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+# Source lines kept per endpoint; smaller contributors are dropped
+MAX_SOURCES = 500
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+    )
+
+
+@contextmanager
+def trace_peak():
+    """
+    Measure the peak of traced memory allocated inside the block
+
+    Yields:
+        dict: Filled with "peak" and "current" in bytes when the block exits
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = {}
+    try:
+        yield result
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        result["current"] = current - baseline
+        result["peak"] = peak - baseline
+        if started:
+            tracemalloc.stop()
+
+
+class MemoryDiagnostics:
+    """
+    Attributes memory growth during requests to the source lines responsible
+
+    While enabled, tracemalloc traces every allocation and a snapshot is
+    taken before and after each selected request; the difference is summed
+    per endpoint and source line. Snapshots cover the whole process, so
+    concurrent requests blur each other's numbers and tracing slows
+    everything down: enable it on one worker, for a short time.
+    """
+
+    DEFAULT_FRAMES = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.settings = None
+        self._results = {}
+        self._started_tracing = False
+
+    def install(self, app):
+        """
+        Register the request hooks on an application
+        """
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def start(self, endpoints=None, frames=DEFAULT_FRAMES):
+        """
+        Start tracing allocations and discard previous results
+
+        Args:
+            endpoints (list): Endpoint names to diagnose, all when omitted
+            frames (int): Stack frames stored per allocation; more frames
+                cost more memory but group growth by call path
+
+        Returns:
+            dict: Diagnostics status
+        """
+        if not 1 <= frames <= 50:
+            raise ValueError("Frames must be between 1 and 50")
+
+        self.stop()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._started_tracing = True
+        with self._lock:
+            self._results = {}
+        self.settings = {
+            "endpoints": sorted(endpoints) if endpoints else None,
+            "frames": tracemalloc.get_traceback_limit(),
+        }
+        return self.status()
+
+    def stop(self):
+        """
+        Stop tracing; collected results are kept
+        """
+        self.settings = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def status(self, top=20):
+        """
+        Summarize the growth recorded per endpoint
+
+        Args:
+            top (int): Allocating source lines listed per endpoint
+
+        Returns:
+            dict: Settings and, per endpoint, the request count, the
+                largest peak above the memory in use when the request
+                started and the lines that grew the most
+        """
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    "requests": result["requests"],
+                    "max_peak_bytes": result["max_peak"],
+                    "total_growth_bytes": sum(result["sizes"].values()),
+                    "top_allocators": [
+                        {
+                            "source": source,
+                            "size_diff_bytes": size,
+                            "count_diff": result["counts"][source],
+                        }
+                        for source, size in result["sizes"].most_common(top)
+                    ],
+                }
+                for endpoint, result in self._results.items()
+            }
+        return {
+            "active": self.settings is not None,
+            "settings": self.settings,
+            "endpoints": endpoints,
+        }
+
+    def _before_request(self):
+        settings = self.settings
+        if settings is None or not tracemalloc.is_tracing():
+            return
+        if settings["endpoints"] and request.endpoint not in settings["endpoints"]:
+            return
+
+        g._memory_snapshot = _snapshot()
+        g._memory_baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def _teardown_request(self, exception=None):
+        before = g.pop("_memory_snapshot", None)
+        if before is None or not tracemalloc.is_tracing():
+            return
+
+        peak = tracemalloc.get_traced_memory()[1] - g.pop("_memory_baseline")
+        after = _snapshot()
+        differences = after.compare_to(before, "traceback")
+
+        with self._lock:
+            result = self._results.setdefault(
+                request.endpoint,
+                {"requests": 0, "max_peak": 0, "sizes": Counter(), "counts": Counter()},
+            )
+            result["requests"] += 1
+            result["max_peak"] = max(result["max_peak"], peak)
+            for difference in differences:
+                if difference.size_diff <= 0:
+                    continue
+                # Allocating line first, then its callers
+                source = " <- ".join(
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                    for frame in reversed(difference.traceback)
+                )
+                result["sizes"][source] += difference.size_diff
+                result["counts"][source] += difference.count_diff
+
+            # Keep memory use of the diagnostics itself bounded
+            if len(result["sizes"]) > MAX_SOURCES:
+                result["sizes"] = Counter(
+                    dict(result["sizes"].most_common(MAX_SOURCES))
+                )
+                result["counts"] = Counter(
+                    {source: result["counts"][source] for source in result["sizes"]}
+                )
+
+
+memory_diagnostics = MemoryDiagnostics()
@@ -0,0 +1,275 @@
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from sqlalchemy import inspect, text
+
+DEFAULT_CURRENCY = "USD"
+
+# Minor units per unit of the default currency, used by migrations of
+# amounts that predate per-currency scaling
+CENTS_PER_UNIT = 100
+
+# ISO 4217 minor unit exponents that differ from the usual two decimals
+CURRENCY_EXPONENTS = {
+    "BIF": 0,
+    "CLP": 0,
+    "DJF": 0,
+    "GNF": 0,
+    "ISK": 0,
+    "JPY": 0,
+    "KMF": 0,
+    "KRW": 0,
+    "PYG": 0,
+    "RWF": 0,
+    "UGX": 0,
+    "VND": 0,
+    "VUV": 0,
+    "XAF": 0,
+    "XOF": 0,
+    "XPF": 0,
+    "BHD": 3,
+    "IQD": 3,
+    "JOD": 3,
+    "KWD": 3,
+    "LYD": 3,
+    "OMR": 3,
+    "TND": 3,
+}
+
+CURRENCY_PATTERN = re.compile(r"^[A-Z]{3}$")
+
+
+def minor_units(currency):
+    """
+    Number of stored minor units (cents, fils, ...) in one currency unit
+    """
+    return 10 ** CURRENCY_EXPONENTS.get(currency or DEFAULT_CURRENCY, 2)
+
+
+def parse_amount(amount):
+    """
+    Convert an amount in currency units to an exact Decimal
+
+    Args:
+        amount (int, float, str or Decimal): Amount in currency units
+
+    Returns:
+        Decimal: The amount
+    """
+    if isinstance(amount, bool):
+        raise ValueError("Amount must be a number")
+
+    try:
+        value = Decimal(str(amount))
+    except (InvalidOperation, ValueError):
+        raise ValueError("Amount must be a number")
+    if not value.is_finite():
+        raise ValueError("Amount must be a finite number")
+    return value
+
+
+def to_cents(amount, currency=DEFAULT_CURRENCY):
+    """
+    Convert an amount in currency units to integer minor units
+
+    Values are rounded half up to the currency's minor unit through
+    Decimal, so 0.1 + 0.2 style binary float errors never reach the
+    database. Amounts are "cents" throughout the code, but one yen is
+    stored as 1 and one Kuwaiti dinar as 1000.
+
+    Args:
+        amount (int, float, str or Decimal): Amount in currency units
+        currency (str): Currency code the amount is in
+
+    Returns:
+        int: Amount in minor units
+    """
+    value = parse_amount(amount)
+    return int(
+        (value * minor_units(currency)).to_integral_value(rounding=ROUND_HALF_UP)
+    )
+
+
+def from_cents(cents, currency=DEFAULT_CURRENCY):
+    """
+    Convert integer minor units to a float in currency units for JSON
+    responses
+
+    Dividing an exact integer yields the float closest to the decimal
+    value, so amounts serialize without trailing noise.
+    """
+    if cents is None:
+        return None
+    return int(cents) / minor_units(currency)
+
+
+def average_cents(total_cents, count):
+    """
+    Divide a cent total by a count, rounded half up to the cent
+    """
+    if not count:
+        return 0
+    return int(
+        (Decimal(int(total_cents)) / count).to_integral_value(rounding=ROUND_HALF_UP)
+    )
+
+
+def validate_currency(currency, expected=None):
+    """
+    Check that a currency is an ISO 4217 style three letter code
+
+    Args:
+        currency (str): Currency code to check
+        expected (str): The user's account currency. Totals are summed
+            across a user's expenses, so other currencies are rejected.
+
+    Returns:
+        str: Upper-cased currency code
+    """
+    if not isinstance(currency, str) or not CURRENCY_PATTERN.match(currency.upper()):
+        raise ValueError("Currency must be a three letter code")
+    currency = currency.upper()
+    if expected is not None and currency != expected:
+        raise ValueError(f"Currency must be {expected}, the account currency")
+    return currency
+
+
+# Float amount columns replaced by integer cents: table -> (old, new)
+AMOUNT_COLUMNS = {
+    "expenses": ("amount", "amount_cents"),
+    "category_month_totals": ("total_amount", "total_cents"),
+    "budgets": ("monthly_limit", "monthly_limit_cents"),
+}
+
+
+def migrate_amount_columns(connection):
+    """
+    Replace float amount columns with integer cents columns
+
+    Amounts are rounded to the nearest cent. Expenses also get a currency
+    column set to the default currency, while budget limits are scaled by
+    the account currency when users already have one. Tables already
+    migrated are skipped, so this is safe to rerun.
+
+    Args:
+        connection: SQLAlchemy connection inside a transaction
+
+    Returns:
+        dict: Number of converted rows per migrated table
+    """
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    migrated = {}
+
+    for table, (old_column, new_column) in AMOUNT_COLUMNS.items():
+        if table not in existing:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if old_column not in columns:
+            continue
+
+        if new_column not in columns:
+            connection.execute(
+                text(
+                    f"ALTER TABLE {table} ADD COLUMN {new_column} BIGINT "
+                    "NOT NULL DEFAULT 0"
+                )
+            )
+        if table == "expenses" and "currency" not in columns:
+            connection.execute(
+                text(
+                    "ALTER TABLE expenses ADD COLUMN currency VARCHAR(3) "
+                    f"NOT NULL DEFAULT '{DEFAULT_CURRENCY}'"
+                )
+            )
+
+        scale = CENTS_PER_UNIT
+        if table == "budgets" and "currency" in {
+            column["name"] for column in inspector.get_columns("users")
+        }:
+            # Limits are in the account currency, which may already be set
+            scale = _account_minor_units("budgets.user_id")
+        result = connection.execute(
+            text(
+                f"UPDATE {table} SET {new_column} = "
+                f"CAST(ROUND({old_column} * {scale}) AS BIGINT)"
+            )
+        )
+        migrated[table] = result.rowcount
+
+        connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {old_column}"))
+
+    return migrated
+
+
+def _account_minor_units(user_id):
+    # SQL expression for the minor units of the currency of a user id column
+    cases = " ".join(
+        f"WHEN '{currency}' THEN {10**exponent}"
+        for currency, exponent in sorted(CURRENCY_EXPONENTS.items())
+    )
+    return (
+        f"(CASE (SELECT currency FROM users WHERE users.id = {user_id}) "
+        f"{cases} ELSE {CENTS_PER_UNIT} END)"
+    )
+
+
+def migrate_user_currency(connection):
+    """
+    Add the account currency column to users
+
+    Each user gets the currency most of their expenses are in, or the
+    default currency. Skipped when the column already exists.
+
+    Args:
+        connection: SQLAlchemy connection inside a transaction
+
+    Returns:
+        int or None: Number of users whose currency was taken from their
+            expenses, or None when already migrated
+    """
+    columns = {column["name"] for column in inspect(connection).get_columns("users")}
+    if "currency" in columns:
+        return None
+
+    connection.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN currency VARCHAR(3) "
+            f"NOT NULL DEFAULT '{DEFAULT_CURRENCY}'"
+        )
+    )
+    result = connection.execute(
+        text(
+            "UPDATE users SET currency = ("
+            "SELECT currency FROM expenses WHERE expenses.user_id = users.id "
+            "GROUP BY currency ORDER BY count(*) DESC, currency LIMIT 1"
+            ") WHERE EXISTS ("
+            "SELECT 1 FROM expenses WHERE expenses.user_id = users.id)"
+        )
+    )
+    return result.rowcount
+
+
+def copy_user_currency(source, target):
+    """
+    Copy the account currency of users with expenses on a shard to the
+    main database, whose copy of the users table has no expenses to read
+
+    Args:
+        source: SQLAlchemy connection to the shard, after migrate_user_currency
+        target: SQLAlchemy connection to the main database
+
+    Returns:
+        int: Number of users whose currency was copied
+    """
+    rows = source.execute(
+        text(
+            "SELECT id, currency FROM users WHERE EXISTS ("
+            "SELECT 1 FROM expenses WHERE expenses.user_id = users.id)"
+        )
+    ).all()
+    if rows:
+        target.execute(
+            text("UPDATE users SET currency = :currency WHERE id = :id"),
+            [{"id": user_id, "currency": currency} for user_id, currency in rows],
+        )
+    return len(rows)
@@ -0,0 +1,404 @@
+import logging
+import random
+import statistics
+import time
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+# Tables partitioned by month, with their partition key column
+PARTITIONED_TABLES = {"expenses": "date", "events": "start_time"}
+
+
+def month_start(value):
+    """
+    Get the first instant of the month containing a datetime
+    """
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """
+    Shift the first day of a month by a number of months
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    """
+    Build the name of the partition holding one month of a table
+    """
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(connection, table):
+    """
+    Check whether a table is a PostgreSQL partitioned table
+
+    Args:
+        connection: SQLAlchemy connection
+        table (str): Table name
+
+    Returns:
+        bool: True if the table is partitioned
+    """
+    if connection.dialect.name != "postgresql":
+        return False
+
+    return bool(
+        connection.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+            ),
+            {"table": table},
+        ).scalar()
+    )
+
+
+def default_partition(connection, table):
+    """
+    Find the default partition and the partition key column of a table
+
+    Args:
+        connection: SQLAlchemy connection
+        table (str): Partitioned table name
+
+    Returns:
+        tuple: Default partition name, or None if there is none, and the
+            partition key column
+    """
+    return tuple(
+        connection.execute(
+            text(
+                "SELECT d.relname, a.attname FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "JOIN pg_attribute a "
+                "ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0] "
+                "LEFT JOIN pg_class d ON d.oid = p.partdefid "
+                "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+            ),
+            {"table": table},
+        ).one()
+    )
+
+
+def ensure_partitions(connection, table, start, end):
+    """
+    Create the monthly partitions of a table covering a date range
+
+    Existing partitions are left untouched, so this is safe to run
+    repeatedly, e.g. from a daily cron job. PostgreSQL refuses to create a
+    partition while the default partition holds rows for it, so those rows
+    are moved into the new partition, with the default partition detached
+    meanwhile; run within a transaction.
+
+    Args:
+        connection: SQLAlchemy connection
+        table (str): Partitioned table name
+        start (datetime): First month to cover
+        end (datetime): Last month to cover
+
+    Returns:
+        list: Names of the partitions covering the range
+    """
+    default, column = default_partition(connection, table)
+    names = []
+    month = month_start(start)
+    while month <= end:
+        name = partition_name(table, month)
+        bounds = {"low": month, "high": add_months(month, 1)}
+        exists = connection.execute(
+            text("SELECT to_regclass(:name)"), {"name": name}
+        ).scalar()
+        in_range = f"{column} >= :low AND {column} < :high"
+        stranded = (
+            default is not None
+            and exists is None
+            and connection.execute(
+                text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})"),
+                bounds,
+            ).scalar()
+        )
+
+        if stranded:
+            connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+        if exists is None:
+            connection.execute(
+                text(
+                    f"CREATE TABLE {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                    f"TO ('{add_months(month, 1):%Y-%m-%d}')"
+                )
+            )
+        if stranded:
+            moved = connection.execute(
+                text(
+                    f"WITH moved AS (DELETE FROM {default} WHERE {in_range} "
+                    f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+                ),
+                bounds,
+            ).rowcount
+            connection.execute(
+                text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+            )
+            logger.warning(
+                "Moved %s rows from %s to the new partition %s; create "
+                "partitions further ahead to keep the default partition empty",
+                moved,
+                default,
+                name,
+            )
+
+        names.append(name)
+        month = add_months(month, 1)
+
+    return names
+
+
+def ensure_future_partitions(connection, months_ahead=3):
+    """
+    Create partitions for the current and upcoming months of every table
+
+    Rows outside the covered months land in each table's default partition,
+    so a missed run degrades pruning but never rejects writes.
+
+    Args:
+        connection: SQLAlchemy connection
+        months_ahead (int): Number of future months to prepare
+
+    Returns:
+        dict: Partition names per table, empty for non-partitioned tables
+    """
+    current = month_start(datetime.utcnow())
+    created = {}
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(connection, table):
+            created[table] = ensure_partitions(
+                connection, table, current, add_months(current, months_ahead)
+            )
+        else:
+            created[table] = []
+
+    return created
+
+
+def convert_to_partitioned(connection, table, months_ahead=3):
+    """
+    Rebuild a table as a PostgreSQL table partitioned by month
+
+    The existing table is renamed, a partitioned copy with the same columns
+    and defaults is created, partitions covering the existing data are
+    added and the rows are copied over. The primary key becomes
+    (id, partition key), as PostgreSQL requires the partition key in every
+    unique constraint; ids keep coming from the original sequence. The
+    foreign keys of the original table are recreated on the copy.
+
+    Args:
+        connection: SQLAlchemy connection inside a transaction
+        table (str): Name of a table listed in PARTITIONED_TABLES
+        months_ahead (int): Number of future months to prepare
+
+    Returns:
+        str: Name of the preserved unpartitioned table
+    """
+    if connection.dialect.name != "postgresql":
+        raise RuntimeError("Declarative partitioning requires PostgreSQL")
+
+    if is_partitioned(connection, table):
+        raise RuntimeError(f"Table {table} is already partitioned")
+
+    column = PARTITIONED_TABLES[table]
+    legacy = f"{table}_unpartitioned"
+
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    connection.execute(
+        text(
+            f"CREATE TABLE {table} "
+            f"(LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({column})"
+        )
+    )
+    connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+    connection.execute(
+        text(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey_partitioned "
+            f"PRIMARY KEY (id, {column})"
+        )
+    )
+    for foreign_key in inspect(connection).get_foreign_keys(legacy):
+        connection.execute(text(_foreign_key_clause(table, foreign_key)))
+    connection.execute(
+        text(
+            f"CREATE INDEX ix_{table}_user_id_{column}_part ON {table} (user_id, {column})"
+        )
+    )
+    connection.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    )
+
+    # Keep the id sequence alive once the legacy table is dropped
+    connection.execute(
+        text(f"ALTER SEQUENCE IF EXISTS {table}_id_seq OWNED BY {table}.id")
+    )
+
+    oldest, newest = connection.execute(
+        text(f"SELECT min({column}), max({column}) FROM {legacy}")
+    ).one()
+    current = month_start(datetime.utcnow())
+    start = month_start(oldest) if oldest else current
+    end = max(add_months(current, months_ahead), month_start(newest or current))
+    ensure_partitions(connection, table, start, end)
+
+    connection.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+
+    return legacy
+
+
+def _foreign_key_clause(table, foreign_key):
+    # Rebuild a reflected foreign key as an ALTER TABLE statement on table
+    options = foreign_key.get("options", {})
+    clause = (
+        f"ALTER TABLE {table} ADD FOREIGN KEY "
+        f"({', '.join(foreign_key['constrained_columns'])}) "
+        f"REFERENCES {foreign_key['referred_table']} "
+        f"({', '.join(foreign_key['referred_columns'])})"
+    )
+    for option in ("ondelete", "onupdate"):
+        if options.get(option):
+            clause += f" ON {option[2:].upper()} {options[option]}"
+    return clause
+
+
+def run_pruning_benchmark(connection, rows=100000, months=24, repeat=5):
+    """
+    Time a one-month query on flat and month-partitioned scratch tables
+
+    On PostgreSQL the plan of the partitioned table is inspected to report
+    how many partitions survive pruning. Other dialects have no declarative
+    partitioning and only the flat table is measured.
+
+    Args:
+        connection: SQLAlchemy connection
+        rows (int): Number of rows to seed
+        months (int): Number of months the rows are spread over
+        repeat (int): Number of timed runs per table, the median is reported
+
+    Returns:
+        dict: Timings and scanned relations per table
+    """
+    dialect_name = connection.dialect.name
+    first_month = add_months(month_start(datetime.utcnow()), -months + 1)
+    seconds_per_month = 30 * 24 * 3600
+    tables = ["bench_expenses_flat"]
+    if dialect_name == "postgresql":
+        tables.append("bench_expenses_partitioned")
+
+    try:
+        connection.execute(
+            text(
+                "CREATE TABLE bench_expenses_flat "
+                "(id INTEGER, user_id INTEGER, amount FLOAT, date TIMESTAMP NOT NULL)"
+            )
+        )
+        if dialect_name == "postgresql":
+            connection.execute(
+                text(
+                    "CREATE TABLE bench_expenses_partitioned "
+                    "(LIKE bench_expenses_flat) PARTITION BY RANGE (date)"
+                )
+            )
+            ensure_partitions(
+                connection,
+                "bench_expenses_partitioned",
+                first_month,
+                add_months(first_month, months - 1),
+            )
+
+        batch = []
+        for row_id in range(rows):
+            batch.append(
+                {
+                    "id": row_id,
+                    "user_id": random.randint(1, 100),
+                    "amount": round(random.uniform(1, 200), 2),
+                    "date": datetime.fromtimestamp(
+                        first_month.timestamp()
+                        + random.random() * (months - 1) * seconds_per_month
+                    ),
+                }
+            )
+            if len(batch) == 10000 or row_id == rows - 1:
+                for table in tables:
+                    connection.execute(
+                        text(
+                            f"INSERT INTO {table} (id, user_id, amount, date) "
+                            "VALUES (:id, :user_id, :amount, :date)"
+                        ),
+                        batch,
+                    )
+                batch = []
+
+        for table in tables:
+            connection.execute(
+                text(f"CREATE INDEX ix_{table}_user_date ON {table} (user_id, date)")
+            )
+            if dialect_name == "postgresql":
+                connection.execute(text(f"ANALYZE {table}"))
+
+        target = add_months(first_month, months // 2)
+        params = {"user_id": 42, "start": target, "end": add_months(target, 1)}
+        results = {"dialect": dialect_name, "rows": rows, "months": months}
+
+        for table in tables:
+            query = (
+                f"SELECT sum(amount) FROM {table} WHERE user_id = :user_id "
+                "AND date >= :start AND date < :end"
+            )
+
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                connection.execute(text(query), params).scalar()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            if dialect_name == "postgresql":
+                plan = connection.execute(
+                    text(f"EXPLAIN (FORMAT JSON) {query}"), params
+                ).scalar()
+                scanned = sorted(set(_relation_names(plan)))
+            else:
+                plan = connection.execute(
+                    text(f"EXPLAIN QUERY PLAN {query}"), params
+                ).all()
+                scanned = [row[-1] for row in plan]
+
+            results[table] = {
+                "median_ms": round(statistics.median(timings), 3),
+                "scanned": scanned,
+            }
+
+        return results
+    finally:
+        for table in reversed(tables):
+            connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+
+def _relation_names(plan):
+    """
+    Collect the relation names scanned by a PostgreSQL JSON plan
+    """
+    names = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if "Relation Name" in node:
+                names.append(node["Relation Name"])
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return names
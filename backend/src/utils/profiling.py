@@ -0,0 +1,316 @@
+import cProfile
+import functools
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+from collections import Counter
+from flask import g, request
+
+# Distinct stacks kept per profile; rarer ones are counted together
+MAX_STACKS = 10000
+OTHER_STACK = "[other]"
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+
+
+def collapse_stack(frame):
+    """
+    Render a frame and its callers as a collapsed flamegraph stack
+
+    Returns:
+        str: Semicolon separated frames, outermost first
+    """
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class RequestProfiler:
+    """
+    Profiles selected endpoints and service methods of a live process
+
+    Profiling is off until an admin starts it. Targets are endpoint names
+    such as "expenses.get_expenses" or service methods such as
+    "ExpenseService.generate_expense_report"; without targets every
+    endpoint is eligible. ``sample_rate`` is the fraction of eligible calls
+    profiled.
+
+    The "cprofile" mode records every function call and aggregates the
+    results into pstats. The "sampling" mode has a background thread read
+    the stacks of profiled threads every ``interval_ms`` and count them, at
+    a much lower overhead.
+    """
+
+    MODES = ("cprofile", "sampling")
+    DEFAULT_INTERVAL_MS = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.settings = None
+        self._profiles = {}
+        self._sampled_threads = {}
+        self._sampler = None
+        self._wrapped = []
+
+    def install(self, app):
+        """
+        Register the request hooks on an application
+        """
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def start(
+        self,
+        mode,
+        targets=None,
+        sample_rate=1.0,
+        interval_ms=DEFAULT_INTERVAL_MS,
+    ):
+        """
+        Start profiling, replacing any previous settings
+
+        Args:
+            mode (str): "cprofile" or "sampling"
+            targets (list): Endpoint names and Service.method names
+            sample_rate (float): Fraction of eligible calls to profile
+            interval_ms (float): Sampling interval of the sampling mode
+
+        Returns:
+            dict: Profiler status
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Mode must be one of: {', '.join(self.MODES)}")
+        if not 0 < sample_rate <= 1:
+            raise ValueError("Sample rate must be greater than 0 and at most 1")
+        if interval_ms <= 0:
+            raise ValueError("Sampling interval must be positive")
+
+        service_methods = [
+            target for target in targets or [] if self._service_method(target)
+        ]
+        endpoints = set(targets or []) - set(service_methods)
+
+        self.stop()
+        for target in service_methods:
+            self._wrap_service_method(target)
+
+        self.settings = {
+            "mode": mode,
+            "targets": sorted(targets or []),
+            "endpoints": endpoints if targets else None,
+            "sample_rate": sample_rate,
+            "interval_ms": interval_ms,
+        }
+        if mode == "sampling":
+            self._sampler = _Sampler(self, interval_ms / 1000)
+            self._sampler.start()
+        return self.status()
+
+    def stop(self):
+        """
+        Stop profiling; collected profiles are kept
+        """
+        self.settings = None
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+        for service, name, original in self._wrapped:
+            setattr(service, name, original)
+        self._wrapped = []
+
+    def status(self):
+        settings = dict(self.settings or {})
+        settings.pop("endpoints", None)
+        with self._lock:
+            profiles = {
+                key: {
+                    "calls": profile["calls"],
+                    "samples": sum(profile["stacks"].values()),
+                }
+                for key, profile in self._profiles.items()
+            }
+        return {"active": bool(settings), "settings": settings, "profiles": profiles}
+
+    def clear(self):
+        with self._lock:
+            self._profiles = {}
+
+    def _service_method(self, target):
+        from .. import services
+
+        class_name, _, method_name = target.partition(".")
+        if class_name not in services.__all__:
+            return None
+        service = getattr(services, class_name)
+        method = service.__dict__.get(method_name)
+        if not isinstance(method, staticmethod):
+            raise ValueError(f"{target} is not a service method")
+        return service, method_name, method
+
+    def _wrap_service_method(self, target):
+        service, name, original = self._service_method(target)
+        function = original.__func__
+
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            token = self._begin(target) if self._sampled() else None
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if token is not None:
+                    self._end(token)
+
+        setattr(service, name, staticmethod(profiled))
+        self._wrapped.append((service, name, original))
+
+    def _sampled(self):
+        settings = self.settings
+        return settings is not None and random.random() < settings["sample_rate"]
+
+    def _before_request(self):
+        settings = self.settings
+        if settings is None or request.endpoint is None:
+            return
+        endpoints = settings["endpoints"]
+        if endpoints is not None and request.endpoint not in endpoints:
+            return
+        if self._sampled():
+            g._profile_token = self._begin(request.endpoint)
+
+    def _teardown_request(self, exception=None):
+        token = g.pop("_profile_token", None)
+        if token is not None:
+            self._end(token)
+
+    def _begin(self, key):
+        settings = self.settings
+        # Nested targets, e.g. a profiled service inside a profiled
+        # endpoint, are covered by the outer profile
+        if settings is None or getattr(self._local, "active", False):
+            return None
+
+        profile = None
+        if settings["mode"] == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler already runs on this thread
+                return None
+        else:
+            self._sampled_threads[threading.get_ident()] = key
+
+        self._local.active = True
+        return key, profile
+
+    def _end(self, token):
+        key, profile = token
+        self._local.active = False
+
+        stats = None
+        if profile is not None:
+            profile.disable()
+            stats = pstats.Stats(profile)
+        else:
+            self._sampled_threads.pop(threading.get_ident(), None)
+
+        with self._lock:
+            entry = self._profile(key)
+            entry["calls"] += 1
+            if stats is not None:
+                if entry["stats"] is None:
+                    entry["stats"] = stats
+                else:
+                    entry["stats"].add(stats)
+
+    def _profile(self, key):
+        entry = self._profiles.get(key)
+        if entry is None:
+            entry = {"calls": 0, "stats": None, "stacks": Counter()}
+            self._profiles[key] = entry
+        return entry
+
+    def add_sample(self, key, stack):
+        with self._lock:
+            stacks = self._profile(key)["stacks"]
+            if stack not in stacks and len(stacks) >= MAX_STACKS:
+                stack = OTHER_STACK
+            stacks[stack] += 1
+
+    def sample_threads(self):
+        frames = sys._current_frames()
+        for thread_id, key in list(self._sampled_threads.items()):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                self.add_sample(key, collapse_stack(frame))
+
+    def render(self, key, output_format="text", limit=50):
+        """
+        Render an aggregated profile
+
+        Args:
+            key (str): Endpoint or service method
+            output_format (str): "text" for a readable cProfile summary,
+                "pstats" for a file pstats.Stats can load, or "collapsed"
+                for sampled stacks in flamegraph.pl input format
+            limit (int): Functions listed by the text format
+
+        Returns:
+            tuple: Body and MIME type
+        """
+        with self._lock:
+            entry = self._profiles.get(key)
+            if entry is None:
+                raise KeyError(key)
+
+            if output_format == "collapsed":
+                body = "".join(
+                    f"{stack} {count}\n" for stack, count in entry["stacks"].items()
+                )
+                return body, "text/plain"
+
+            if output_format not in ("text", "pstats"):
+                raise ValueError("Format must be one of: text, pstats, collapsed")
+            if entry["stats"] is None:
+                raise ValueError("No cProfile data was collected for this target")
+
+            if output_format == "pstats":
+                return marshal.dumps(entry["stats"].stats), "application/octet-stream"
+
+            buffer = io.StringIO()
+            stats = pstats.Stats(stream=buffer)
+            stats.add(entry["stats"])
+            stats.sort_stats("cumulative").print_stats(limit)
+            return buffer.getvalue(), "text/plain"
+
+
+class _Sampler(threading.Thread):
+    """
+    Background thread sampling the stacks of profiled threads
+    """
+
+    def __init__(self, profiler, interval):
+        super().__init__(name="request-profiler-sampler", daemon=True)
+        self.profiler = profiler
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.profiler.sample_threads()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,212 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Handle returned by a broker for consuming messages of one channel
+    """
+
+    def __init__(self, broker, channel, max_pending=100):
+        self.broker = broker
+        self.channel = channel
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def deliver(self, message):
+        """
+        Enqueue a message, dropping the oldest one if the consumer lags behind
+
+        Args:
+            message (dict): Message to deliver
+        """
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """
+        Wait for the next message
+
+        Args:
+            timeout (float, optional): Seconds to wait before giving up
+
+        Returns:
+            dict: Next message, or None if the timeout expired
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """
+        Stop receiving messages
+        """
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    In-process publish/subscribe broker
+
+    Only reaches subscribers living in the same worker process. Multi-worker
+    deployments should swap in a broker shared between processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, channel, message):
+        """
+        Publish a message to every subscriber of a channel
+
+        Args:
+            channel (str): Channel name
+            message (dict): JSON-serializable message
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def subscribe(self, channel):
+        """
+        Subscribe to a channel
+
+        Args:
+            channel (str): Channel name
+
+        Returns:
+            Subscription: Handle for consuming messages
+        """
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Remove a subscription from its channel
+
+        Args:
+            subscription (Subscription): Subscription to remove
+        """
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+
+class RedisBroker(LocalBroker):
+    """
+    Broker fanning messages out across worker processes through Redis
+
+    Messages are published to Redis and a single listener thread per process
+    hands them to the local subscribers, so each worker holds one Redis
+    connection regardless of how many streams it serves. Malformed messages
+    are logged and skipped, and the listener reconnects when the connection
+    drops or fails otherwise; messages published meanwhile are lost, and
+    clients catch up through the sync feed.
+    """
+
+    # Seconds between reconnection attempts, doubled up to the maximum
+    RECONNECT_DELAY = 1
+    MAX_RECONNECT_DELAY = 30
+
+    def __init__(self, url, prefix="webdashboard:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RedisBroker requires the 'redis' package") from e
+
+        super().__init__()
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._connection_errors = (redis.ConnectionError, redis.TimeoutError)
+        self._pubsub = self._subscribe()
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def publish(self, channel, message):
+        """
+        Publish a message to subscribers in every worker process
+        """
+        self._client.publish(f"{self.prefix}{channel}", json.dumps(message))
+
+    def _subscribe(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f"{self.prefix}*")
+        return pubsub
+
+    def _listen(self):
+        delay = self.RECONNECT_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self._subscribe()
+                    logger.info("Reconnected to Redis pub/sub")
+                for item in self._pubsub.listen():
+                    delay = self.RECONNECT_DELAY
+                    try:
+                        channel = item["channel"].decode()[len(self.prefix) :]
+                        super().publish(channel, json.loads(item["data"]))
+                    except Exception:
+                        # One bad message must not stop delivery of the rest
+                        logger.exception("Dropped a pub/sub message")
+            except Exception as e:
+                if isinstance(e, self._connection_errors):
+                    logger.warning(
+                        "Lost the Redis pub/sub connection, reconnecting in %ss", delay
+                    )
+                else:
+                    logger.exception(
+                        "Redis pub/sub listener failed, reconnecting in %ss", delay
+                    )
+                if self._pubsub is not None:
+                    self._pubsub.close()
+                    self._pubsub = None
+                time.sleep(delay)
+                delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+
+_broker = LocalBroker()
+
+
+def get_broker():
+    """
+    Get the process-wide broker
+    """
+    return _broker
+
+
+def set_broker(broker):
+    """
+    Replace the process-wide broker, e.g. with a RedisBroker in production
+
+    Args:
+        broker: Object implementing publish, subscribe and unsubscribe
+    """
+    global _broker
+    _broker = broker
+
+
+def user_channel(user_id):
+    """
+    Build the channel name carrying notifications for a user
+    """
+    return f"user:{user_id}"
@@ -0,0 +1,179 @@
+import json
+import math
+from bisect import bisect_right
+
+
+class TDigest:
+    """
+    Mergeable t-digest sketch for approximate quantiles
+
+    Values are summarized as weighted centroids, kept small near the tails
+    and larger around the median, so extreme quantiles stay accurate while
+    the sketch size is bounded by the compression parameter. Two digests can
+    be merged without access to the values they summarize.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._centroids = []
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        """
+        Add a value to the digest
+
+        Args:
+            value (float): Observed value
+            weight (int): Number of observations of the value
+        """
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Merge another digest into this one
+
+        Args:
+            other (TDigest): Digest to merge
+        """
+        if not other.count:
+            return
+
+        self._buffer.extend(other._centroids)
+        self._buffer.extend(other._buffer)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def quantile(self, q):
+        """
+        Estimate the value at a quantile
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Estimated value, or None for an empty digest
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+
+        if not self.count:
+            return None
+
+        self._compress()
+        centroids = self._centroids
+        if len(centroids) == 1:
+            return centroids[0][0]
+
+        # Position of each centroid's center in the cumulative weight
+        centers = []
+        cumulative = 0
+        for _, weight in centroids:
+            centers.append(cumulative + weight / 2)
+            cumulative += weight
+
+        target = q * self.count
+        if target <= centers[0]:
+            return self._interpolate(target, 0, self.min, centers[0], centroids[0][0])
+        if target >= centers[-1]:
+            return self._interpolate(
+                target, centers[-1], centroids[-1][0], self.count, self.max
+            )
+
+        index = bisect_right(centers, target) - 1
+        return self._interpolate(
+            target,
+            centers[index],
+            centroids[index][0],
+            centers[index + 1],
+            centroids[index + 1][0],
+        )
+
+    def to_json(self):
+        """
+        Serialize the digest to a compact JSON string
+        """
+        self._compress()
+        return json.dumps(
+            {
+                "compression": self.compression,
+                "min": self.min if self.count else None,
+                "max": self.max if self.count else None,
+                "centroids": [[mean, weight] for mean, weight in self._centroids],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, payload):
+        """
+        Restore a digest serialized with to_json
+
+        Args:
+            payload (str): Serialized digest
+
+        Returns:
+            TDigest: Restored digest
+        """
+        data = json.loads(payload)
+        digest = cls(compression=data["compression"])
+        digest._centroids = [(mean, weight) for mean, weight in data["centroids"]]
+        digest.count = sum(weight for _, weight in digest._centroids)
+        if digest.count:
+            digest.min = data["min"]
+            digest.max = data["max"]
+        return digest
+
+    @staticmethod
+    def _interpolate(target, left_position, left_value, right_position, right_value):
+        if right_position == left_position:
+            return left_value
+        fraction = (target - left_position) / (right_position - left_position)
+        return left_value + fraction * (right_value - left_value)
+
+    def _scale(self, q):
+        # k1 scale function: small centroids near q=0 and q=1
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _scale_inverse(self, k):
+        angle = min(k * 2 * math.pi / self.compression, math.pi / 2)
+        return (math.sin(angle) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+
+        items = sorted(self._centroids + self._buffer)
+        self._buffer = []
+
+        merged = []
+        mean, weight = items[0]
+        weight_so_far = 0
+        limit = self._scale_inverse(self._scale(0) + 1) * self.count
+
+        for item_mean, item_weight in items[1:]:
+            if weight_so_far + weight + item_weight <= limit:
+                weight += item_weight
+                mean += (item_mean - mean) * item_weight / weight
+            else:
+                merged.append((mean, weight))
+                weight_so_far += weight
+                limit = (
+                    self._scale_inverse(self._scale(weight_so_far / self.count) + 1)
+                    * self.count
+                )
+                mean, weight = item_mean, item_weight
+
+        merged.append((mean, weight))
+        self._centroids = merged
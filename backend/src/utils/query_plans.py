@@ -0,0 +1,144 @@
+import json
+import re
+from contextlib import contextmanager
+from sqlalchemy import event, inspect
+
+# Statements whose plans are checked; inserts of literal rows have none
+EXPLAINED_STATEMENTS = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+SQLITE_SCAN_PATTERN = re.compile(r"^SCAN (\w+)")
+
+
+@contextmanager
+def capture_queries(engine):
+    """
+    Record the statements an engine executes inside the block
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Yields:
+        list: (statement, parameters) tuples in execution order
+    """
+    queries = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+            queries.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+
+def explain_query(connection, statement, parameters=None):
+    """
+    Fetch the plan of a statement without running it
+
+    On PostgreSQL sequential scans are disabled for the explain, so a
+    sequential scan left in the plan means no index can serve the query,
+    however small the tables are.
+
+    Args:
+        connection: SQLAlchemy connection
+        statement (str): SQL as sent to the driver
+        parameters: Driver parameters of the statement
+
+    Returns:
+        dict: Plan lines, tables read by a full scan and the estimated
+            total cost (None on SQLite, which has no cost model)
+    """
+    parameters = parameters or ()
+    dialect_name = connection.dialect.name
+
+    if dialect_name == "postgresql":
+        with connection.begin_nested():
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            result = connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            ).scalar()
+        if isinstance(result, str):
+            result = json.loads(result)
+        plan = result[0]
+        nodes = list(_plan_nodes(plan["Plan"]))
+        return {
+            "statement": statement,
+            "plan": [
+                f"{node['Node Type']} {node.get('Relation Name', '')}".strip()
+                for node in nodes
+            ],
+            "full_scans": [
+                node["Relation Name"]
+                for node in nodes
+                if node["Node Type"] == "Seq Scan"
+            ],
+            "cost": plan["Plan"]["Total Cost"],
+        }
+
+    if dialect_name == "sqlite":
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).all()
+        details = [row[-1] for row in rows]
+        tables = set(inspect(connection).get_table_names())
+        full_scans = []
+        for detail in details:
+            match = SQLITE_SCAN_PATTERN.match(detail)
+            # Whole-index scans read every row too, while virtual tables
+            # such as FTS5 indexes are searched by their own index
+            if match and match.group(1) in tables and "VIRTUAL TABLE" not in detail:
+                full_scans.append(match.group(1))
+        return {
+            "statement": statement,
+            "plan": details,
+            "full_scans": full_scans,
+            "cost": None,
+        }
+
+    raise ValueError(f"Query plans are not supported on {dialect_name}")
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def find_plan_regressions(connection, queries, max_cost=None, allowed_scans=()):
+    """
+    Explain captured queries and report the ones without an index path
+
+    Args:
+        connection: SQLAlchemy connection
+        queries (list): (statement, parameters) tuples, see capture_queries
+        max_cost (float): Highest accepted estimated cost, where supported
+        allowed_scans (iterable): Tables that may be scanned, e.g. tiny
+            lookup tables
+
+    Returns:
+        list: Plans of the offending queries, each with a "reasons" list
+    """
+    allowed_scans = set(allowed_scans)
+    regressions = []
+    seen = set()
+
+    for statement, parameters in queries:
+        if statement in seen:
+            continue
+        seen.add(statement)
+
+        plan = explain_query(connection, statement, parameters)
+        reasons = [
+            f"full scan of {table}"
+            for table in plan["full_scans"]
+            if table not in allowed_scans
+        ]
+        if max_cost is not None and plan["cost"] is not None:
+            if plan["cost"] > max_cost:
+                reasons.append(f"cost {plan['cost']} exceeds {max_cost}")
+        if reasons:
+            regressions.append(dict(plan, reasons=reasons))
+
+    return regressions
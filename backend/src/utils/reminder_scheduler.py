@@ -0,0 +1,243 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _utc(value):
+    # PostgreSQL returns aware datetimes, SQLite naive UTC ones
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ReminderScheduler:
+    """
+    Fires a reminder ``lead`` before each event starts
+
+    Only events whose reminder falls within ``horizon`` are held in memory,
+    in a min-heap keyed by reminder time, so a tick only looks at the top
+    of the heap. The heap is rebuilt from the events table every
+    ``reload_interval`` seconds; in between, the sync change log is tailed
+    so created, updated and deleted events are picked up at once, by this
+    or any other process. Superseded heap entries are skipped when popped
+    rather than removed.
+
+    Each reminder is claimed in the event_reminders table before it goes to
+    the sink, so concurrent or restarted schedulers send it once. A failing
+    sink releases the claim and the reminder is retried; a reminder claimed
+    by a scheduler that stopped is sent once the claim expires.
+
+    The default sink publishes to the process-wide broker, which must reach
+    the web workers; the in-process broker is refused.
+    """
+
+    DEFAULT_LEAD = timedelta(minutes=15)
+    DEFAULT_HORIZON = timedelta(hours=1)
+    RETRY_DELAY = timedelta(seconds=30)
+    # Changes applied per tick, so a burst of writes is spread over ticks
+    MAX_CHANGES_PER_TICK = 500
+
+    def __init__(
+        self,
+        app,
+        sink=None,
+        lead=DEFAULT_LEAD,
+        horizon=DEFAULT_HORIZON,
+        tick_interval=1.0,
+        reload_interval=300.0,
+    ):
+        if horizon.total_seconds() <= reload_interval:
+            raise ValueError("The horizon must be longer than the reload interval")
+
+        from ..services.notification_service import NotificationService
+        from .pubsub import LocalBroker, get_broker
+
+        if sink is None:
+            if type(get_broker()) is LocalBroker:
+                raise RuntimeError(
+                    "Reminders published to the in-process broker reach no "
+                    "client; set PUBSUB_REDIS_URL"
+                )
+            sink = NotificationService.publish_reminder
+
+        self.app = app
+        self.sink = sink
+        self.lead = lead
+        self.horizon = horizon
+        self.tick_interval = tick_interval
+        self.reload_interval = reload_interval
+        self._heap = []
+        self._entries = {}
+        self._cursors = {}
+        self._next_reload = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start ticking from a background thread
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="reminder-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """
+        Tick until stopped
+        """
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.tick()
+            except Exception:
+                logger.exception("Reminder scheduler tick failed")
+            self._stopped.wait(self.tick_interval)
+
+    @property
+    def pending(self):
+        """
+        Number of reminders scheduled within the horizon
+        """
+        return len(self._entries)
+
+    def tick(self, now=None):
+        """
+        Apply event changes and fire the reminders that are due
+
+        Returns:
+            int: Number of reminders sent
+        """
+        now = now or datetime.utcnow()
+        if time.monotonic() >= self._next_reload:
+            self.reload(now)
+        else:
+            self._apply_changes(now)
+
+        sent = 0
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, event_id = heapq.heappop(self._heap)
+            entry = self._entries.get(event_id)
+            if entry is None or entry["fire_at"] != fire_at:
+                continue
+            del self._entries[event_id]
+            if self._deliver(entry, now):
+                sent += 1
+        return sent
+
+    def reload(self, now=None):
+        """
+        Rebuild the heap from the events starting within the horizon
+        """
+        from ..services.reminder_service import ReminderService
+
+        now = now or datetime.utcnow()
+        self._heap = []
+        self._entries = {}
+        for index, engine in enumerate(self._engines()):
+            with engine.connect() as connection:
+                # Changes logged while loading are applied again next tick
+                self._cursors[index] = ReminderService.get_last_change_cursor(
+                    connection
+                )
+                rows = ReminderService.get_events_starting_between(
+                    connection, now, now + self.lead + self.horizon
+                )
+            for row in rows:
+                self._schedule(row, index, now)
+        self._next_reload = time.monotonic() + self.reload_interval
+
+    def _engines(self):
+        from .. import db
+        from .sharding import shard_router
+
+        return shard_router.engines or [db.engine]
+
+    def _apply_changes(self, now):
+        from ..services.reminder_service import ReminderService
+
+        for index, engine in enumerate(self._engines()):
+            with engine.connect() as connection:
+                changes, self._cursors[index] = ReminderService.get_event_changes(
+                    connection, self._cursors.get(index, 0), self.MAX_CHANGES_PER_TICK
+                )
+                if not changes:
+                    continue
+                event_ids = {event_id for event_id, _ in changes}
+                rows = ReminderService.get_events(connection, event_ids)
+
+            for event_id in event_ids:
+                self._entries.pop(event_id, None)
+            for row in rows:
+                self._schedule(row, index, now)
+
+    def _schedule(self, row, engine_index, now):
+        start_time = _utc(row.start_time)
+        remind_at = start_time - self.lead
+        if start_time <= now or remind_at > now + self.horizon:
+            self._entries.pop(row.id, None)
+            return
+
+        self._entries[row.id] = {
+            "event_id": row.id,
+            "user_id": row.user_id,
+            "title": row.title,
+            "start_time": start_time,
+            "remind_at": remind_at,
+            "fire_at": remind_at,
+            "engine": engine_index,
+        }
+        heapq.heappush(self._heap, (remind_at, row.id))
+
+    def _deliver(self, entry, now):
+        from ..services.reminder_service import ReminderService
+
+        engine = self._engines()[entry["engine"]]
+        key = (entry["event_id"], entry["remind_at"])
+        with engine.begin() as connection:
+            if not ReminderService.claim(connection, entry["user_id"], *key, now):
+                expires_at = ReminderService.claim_expires_at(connection, *key)
+                if expires_at is not None and _utc(expires_at) > now:
+                    # Another scheduler is sending it, or stopped while it was
+                    self._retry(entry, _utc(expires_at))
+                return False
+
+        try:
+            self.sink(
+                {
+                    "event_id": entry["event_id"],
+                    "user_id": entry["user_id"],
+                    "title": entry["title"],
+                    "start_time": entry["start_time"].isoformat(),
+                    "remind_at": entry["remind_at"].isoformat(),
+                }
+            )
+        except Exception:
+            logger.exception("Sending the reminder of event %s failed", key[0])
+            with engine.begin() as connection:
+                ReminderService.release(connection, *key)
+            self._retry(entry, now + self.RETRY_DELAY)
+            return False
+
+        with engine.begin() as connection:
+            ReminderService.mark_sent(connection, *key)
+        return True
+
+    def _retry(self, entry, retry_at):
+        # Retry under the same key, so the claim still deduplicates
+        event_id = entry["event_id"]
+        if entry["start_time"] > retry_at and event_id not in self._entries:
+            entry["fire_at"] = retry_at
+            self._entries[event_id] = entry
+            heapq.heappush(self._heap, (retry_at, event_id))
@@ -0,0 +1,85 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Session.info key holding, per open savepoint, the length of every buffer
+# when it began
+SAVEPOINT_MARKS_KEY = "session_buffer_savepoints"
+
+# Handlers of every registered buffer, keyed by Session.info key
+_buffers = {}
+
+
+def register_buffer(key, committed=None, discarded=None):
+    """
+    Declare a per-transaction buffer of items stored in Session.info
+
+    Items appended inside a savepoint are discarded when the savepoint rolls
+    back and kept when it is released; the whole buffer is handed over once
+    the outermost transaction commits or rolls back.
+
+    Args:
+        key (str): Session.info key of the buffer
+        committed (callable, optional): Called with the items of a committed
+            transaction
+        discarded (callable, optional): Called with the items of a rolled
+            back transaction or savepoint
+    """
+    _buffers[key] = (committed, discarded)
+
+
+def savepoint_list(session, key):
+    """
+    Get the buffer of the session's current transaction, creating it if needed
+
+    Args:
+        session: SQLAlchemy session
+        key (str): Session.info key passed to register_buffer
+
+    Returns:
+        list: Items collected so far, to append to
+    """
+    return session.info.setdefault(key, [])
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session, transaction):
+    if transaction.nested:
+        session.info.setdefault(SAVEPOINT_MARKS_KEY, {})[transaction] = {
+            key: len(session.info.get(key, ())) for key in _buffers
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _hand_over_committed(session):
+    savepoint = session.get_nested_transaction()
+    if savepoint is not None:
+        # Items of a released savepoint wait for the enclosing commit
+        session.info.get(SAVEPOINT_MARKS_KEY, {}).pop(savepoint, None)
+        return
+
+    session.info.pop(SAVEPOINT_MARKS_KEY, None)
+    for key, (committed, _) in _buffers.items():
+        items = session.info.pop(key, None)
+        if items and committed is not None:
+            committed(items)
+
+
+@event.listens_for(Session, "after_rollback")
+def _hand_over_discarded(session):
+    savepoint = session.get_nested_transaction()
+    if savepoint is not None:
+        # Only the items added since the savepoint began are undone
+        marks = session.info.get(SAVEPOINT_MARKS_KEY, {}).pop(savepoint, {})
+    else:
+        session.info.pop(SAVEPOINT_MARKS_KEY, None)
+
+    for key, (_, discarded) in _buffers.items():
+        if savepoint is not None:
+            items = session.info.get(key, [])
+            mark = marks.get(key, 0)
+            removed = items[mark:]
+            del items[mark:]
+        else:
+            removed = session.info.pop(key, None)
+        if removed and discarded is not None:
+            discarded(removed)
@@ -0,0 +1,613 @@
+import bisect
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+from itertools import chain
+from flask import g, has_app_context, jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import (
+    create_engine,
+    event,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.sql.util import find_tables
+
+logger = logging.getLogger(__name__)
+
+# Tables with a user_id column that stay on the main database: the job
+# queue is shared by all workers and the directory locates the shards
+GLOBAL_TABLES = {"users", "jobs", "user_shards"}
+
+# Ids reserved per shard, so rows keep their ids when moved between
+# shards; ids below the first range belong to the main database
+DEFAULT_ID_SPAN = 100_000_000
+
+# Seconds a move waits after marking a user as moving, so requests that
+# checked the directory just before finish committing
+DEFAULT_MOVE_SETTLE_SECONDS = 1.0
+
+# Session.info key holding the (user id, shard) a transaction wrote to
+SHARD_WRITE_KEY = "shard_write"
+
+
+class UserMovingError(RuntimeError):
+    """
+    Raised when a user's data is being moved and cannot be used meanwhile
+    """
+
+
+class HashRing:
+    """
+    Consistent hash ring of shard indexes
+
+    Every shard owns ``replicas`` points on the ring and a key belongs to
+    the first point at or after its hash. Adding a shard only takes keys
+    from the others in proportion, instead of reshuffling them all.
+    """
+
+    def __init__(self, shard_count, replicas=100):
+        self._points = sorted(
+            (self._hash(f"shard-{shard}-{replica}"), shard)
+            for shard in range(shard_count)
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in self._points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], "big")
+
+    def shard_for(self, key):
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._points)
+        return self._points[index][1]
+
+
+class ShardedSession(Session):
+    """
+    Session sending statements on user tables to the shard bound to the
+    current application context, and the rest to the main database
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            shard = g.get("shard")
+            if shard is not None and shard_router.routes(mapper, clause):
+                return shard_router.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _writes_shard(session):
+    return any(
+        shard_router.routes(type(instance))
+        for instance in chain(session.new, session.dirty, session.deleted)
+    )
+
+
+@event.listens_for(ShardedSession, "after_flush")
+def _remember_shard_write(session, flush_context):
+    if has_app_context() and g.get("shard") is not None and _writes_shard(session):
+        session.info[SHARD_WRITE_KEY] = (g.get("shard_user"), g.shard)
+
+
+@event.listens_for(ShardedSession, "before_commit")
+def _check_shard_write(session):
+    # A move that started since the request was routed would copy the
+    # user's rows without this write and then delete it with the rest
+    if session.get_nested_transaction() is not None:
+        return
+    written = session.info.get(SHARD_WRITE_KEY)
+    if written is None and has_app_context() and g.get("shard") is not None:
+        if _writes_shard(session):
+            written = (g.get("shard_user"), g.shard)
+    if written is None or written[0] is None:
+        return
+    user_id, shard = written
+    entry = shard_router._directory_entry(user_id)
+    if entry is None or entry.moving or entry.shard != shard:
+        raise UserMovingError("Account is being moved, retry shortly")
+
+
+@event.listens_for(ShardedSession, "after_transaction_end")
+def _forget_shard_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(SHARD_WRITE_KEY, None)
+
+
+class ShardRouter:
+    """
+    Maps users to one of several databases holding their data
+
+    Tables with a ``user_id`` column live on the shards, except
+    GLOBAL_TABLES; users, the job queue and the shard directory stay on
+    the main database, and each shard keeps a copy of the rows of its
+    users so foreign keys hold. Requests are bound to the shard of their
+    authenticated user, other code binds explicitly with ``bind``.
+
+    Every shard hands out ids from its own range, so a user's rows keep
+    their ids when a rebalance moves them. Without SHARD_DATABASE_URIS
+    sharding is off and everything stays on the main database; users
+    with data there when sharding is turned on are refused until
+    ``migrate`` moves them to their shard.
+    """
+
+    def __init__(self):
+        self.engines = []
+        self.ring = None
+        self.id_span = DEFAULT_ID_SPAN
+        self.settle_seconds = DEFAULT_MOVE_SETTLE_SECONDS
+        self._sharded_tables = None
+        self._sharded_names = None
+
+    @property
+    def enabled(self):
+        return bool(self.engines)
+
+    def configure(self, app):
+        """
+        Create the shard engines listed in the SHARD_DATABASE_URIS setting
+        """
+        self.reset()
+        uris = app.config.get("SHARD_DATABASE_URIS") or []
+        options = app.config.get("SHARD_ENGINE_OPTIONS", {})
+        self.engines = [create_engine(uri, **options) for uri in uris]
+        self.ring = HashRing(len(self.engines)) if self.engines else None
+        self.id_span = int(app.config.get("SHARD_ID_SPAN", DEFAULT_ID_SPAN))
+        self.settle_seconds = float(
+            app.config.get("SHARD_MOVE_SETTLE_SECONDS", DEFAULT_MOVE_SETTLE_SECONDS)
+        )
+
+    def reset(self):
+        """
+        Dispose of the shard engines and turn sharding off
+        """
+        for engine in self.engines:
+            engine.dispose()
+        self.engines = []
+        self.ring = None
+
+    def install(self, app):
+        """
+        Register the request hook binding requests to their user's shard
+        """
+        app.before_request(self._bind_request)
+
+    def sharded_tables(self):
+        """
+        Tables stored on the shards, parents first
+        """
+        if self._sharded_tables is None:
+            from .. import db
+
+            self._sharded_tables = [
+                table
+                for table in db.metadata.sorted_tables
+                if "user_id" in table.c and table.name not in GLOBAL_TABLES
+            ]
+        return self._sharded_tables
+
+    def routes(self, mapper=None, clause=None):
+        """
+        Tell whether a statement targets sharded tables
+        """
+        names = self._sharded_names
+        if names is None:
+            names = self._sharded_names = {
+                table.name for table in self.sharded_tables()
+            }
+        if mapper is not None:
+            return inspect(mapper).local_table.name in names
+        if clause is not None:
+            return any(
+                getattr(table, "name", None) in names
+                for table in find_tables(clause, include_crud=True)
+            )
+        return False
+
+    @contextmanager
+    def bind(self, user_id):
+        """
+        Send the statements of the block to the shard of a user
+
+        Raises:
+            UserMovingError: If the user's data is being moved
+        """
+        previous = g.get("shard"), g.get("shard_user")
+        if self.enabled:
+            g.shard, g.shard_user = self._route(user_id), user_id
+        else:
+            g.shard, g.shard_user = None, None
+        try:
+            yield g.shard
+        finally:
+            g.shard, g.shard_user = previous
+
+    def shards(self):
+        """
+        Shards holding user data, or [None] for the main database when
+        sharding is off; jobs scanning all users bind each with ``bind_shard``
+        """
+        return list(range(len(self.engines))) or [None]
+
+    @contextmanager
+    def bind_shard(self, shard):
+        """
+        Send the statements of the block to a shard, None being the main
+        database, on behalf of no user in particular
+        """
+        previous = g.get("shard"), g.get("shard_user")
+        g.shard, g.shard_user = shard, None
+        try:
+            yield shard
+        finally:
+            g.shard, g.shard_user = previous
+
+    def databases(self):
+        """
+        Engines of the main database and every shard, for schema changes
+        """
+        from .. import db
+
+        return [db.engine, *self.engines]
+
+    def shard_of(self, user_id):
+        """
+        Get the shard of a user, placing new users with the hash ring
+
+        The directory is read every time rather than cached, so a move
+        done by another process is seen at once.
+
+        Returns:
+            int: Shard index
+
+        Raises:
+            UserMovingError: If the user still has data on the main database
+        """
+        entry = self._directory_entry(user_id)
+        if entry is None:
+            if self.has_main_data(user_id):
+                raise UserMovingError(f"User {user_id} is not migrated to a shard")
+            return self.place(user_id, self.ring.shard_for(user_id))
+        return entry.shard
+
+    def has_main_data(self, user_id):
+        """
+        Tell whether the main database holds rows of a user in sharded tables
+        """
+        from .. import db
+
+        with db.engine.connect() as connection:
+            return any(
+                connection.execute(
+                    select(1).where(table.c.user_id == user_id).limit(1)
+                ).first()
+                for table in self.sharded_tables()
+            )
+
+    def place(self, user_id, shard):
+        """
+        Record a user's shard and copy the user's row to it
+
+        Returns:
+            int: Shard the user was placed on, another one if a concurrent
+                request placed the user first
+        """
+        from .. import db
+        from ..models.user import User
+        from ..models.user_shard import UserShard
+
+        users = User.__table__
+        with db.engine.connect() as connection:
+            user = connection.execute(
+                select(users).where(users.c.id == user_id)
+            ).first()
+        if user is None:
+            raise ValueError(f"User {user_id} does not exist")
+
+        with self.engines[shard].begin() as connection:
+            copied = connection.execute(
+                select(users.c.id).where(users.c.id == user_id)
+            ).first()
+            if copied is None:
+                connection.execute(insert(users).values(**user._mapping))
+
+        directory = UserShard.__table__
+        with db.engine.begin() as connection:
+            if self._directory_entry(user_id, connection) is None:
+                connection.execute(
+                    insert(directory).values(user_id=user_id, shard=shard)
+                )
+        return self._directory_entry(user_id).shard
+
+    def create_schema(self, shard):
+        """
+        Create the tables of a shard and reserve its id range
+        """
+        from .. import db
+
+        engine = self.engines[shard]
+        tables = [db.metadata.tables["users"], *self.sharded_tables()]
+        is_sqlite = engine.dialect.name == "sqlite"
+        if is_sqlite:
+            # Only AUTOINCREMENT tables let SQLite start ids at an offset
+            for table in tables:
+                table.dialect_kwargs["sqlite_autoincrement"] = True
+        try:
+            db.metadata.create_all(engine, tables=tables)
+        finally:
+            if is_sqlite:
+                for table in tables:
+                    table.dialect_options["sqlite"]["autoincrement"] = False
+
+        first_id = (shard + 1) * self.id_span
+        with engine.begin() as connection:
+            for table in self.sharded_tables():
+                column = table.autoincrement_column
+                if column is None:
+                    continue
+                if is_sqlite:
+                    connection.execute(
+                        text(
+                            "INSERT INTO sqlite_sequence (name, seq) "
+                            "SELECT :name, :seq WHERE NOT EXISTS "
+                            "(SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+                        ),
+                        {"name": table.name, "seq": first_id},
+                    )
+                elif engine.dialect.name == "postgresql":
+                    connection.execute(
+                        text(
+                            "SELECT setval(pg_get_serial_sequence(:table, :column), "
+                            f"GREATEST(:seq, (SELECT COALESCE(MAX({column.name}), 0) "
+                            f"FROM {table.name})))"
+                        ),
+                        {"table": table.name, "column": column.name, "seq": first_id},
+                    )
+
+    def move_user(self, user_id, target, batch_size=1000):
+        """
+        Copy a user's rows to another shard, then delete them from the old one
+
+        Users not placed yet are moved from the main database. The user is
+        marked as moving for the duration and their requests are refused;
+        writes of requests routed before are refused at commit. The copy is
+        only committed when the source still holds as many rows as were
+        copied, and only copied rows are deleted from the source.
+
+        Returns:
+            dict: Rows moved per table
+        """
+        from .. import db
+        from ..models.user_shard import UserShard
+
+        entry = self._directory_entry(user_id)
+        source = entry.shard if entry is not None else None
+        if source == target:
+            return {}
+        if source is None and not self.has_main_data(user_id):
+            self.place(user_id, target)
+            return {}
+
+        directory = UserShard.__table__
+        with db.engine.begin() as connection:
+            if entry is None:
+                connection.execute(
+                    insert(directory).values(user_id=user_id, shard=target, moving=True)
+                )
+            else:
+                connection.execute(
+                    directory.update()
+                    .where(directory.c.user_id == user_id)
+                    .values(moving=True)
+                )
+        if self.settle_seconds:
+            time.sleep(self.settle_seconds)
+
+        users = db.metadata.tables["users"]
+        tables = [users, *self.sharded_tables()]
+        source_engine = db.engine if source is None else self.engines[source]
+        copied = {}
+        try:
+            with (
+                source_engine.connect() as reader,
+                self.engines[target].begin() as writer,
+            ):
+                for table in tables:
+                    copied[table.name] = self._copy_rows(
+                        reader, writer, table, user_id, batch_size
+                    )
+                # Counted afresh, outside the snapshot the copy read from
+                counts = self._count_rows(source_engine, user_id)
+                for table in self.sharded_tables():
+                    if counts[table.name] != len(copied[table.name]):
+                        raise UserMovingError(
+                            f"User {user_id} changed {table.name} while being "
+                            "moved, retry the move"
+                        )
+        except Exception:
+            with db.engine.begin() as connection:
+                if entry is None:
+                    connection.execute(
+                        directory.delete().where(directory.c.user_id == user_id)
+                    )
+                else:
+                    connection.execute(
+                        directory.update()
+                        .where(directory.c.user_id == user_id)
+                        .values(moving=False)
+                    )
+            raise
+
+        with db.engine.begin() as connection:
+            connection.execute(
+                directory.update()
+                .where(directory.c.user_id == user_id)
+                .values(shard=target, moving=False)
+            )
+
+        # The users table is global; the main database keeps its rows
+        deleted_tables = tables if source is not None else tables[1:]
+        with source_engine.begin() as connection:
+            for table in reversed(deleted_tables):
+                self._delete_rows(connection, table, copied[table.name], batch_size)
+        for name, left in self._count_rows(source_engine, user_id).items():
+            if left:
+                logger.error(
+                    "Kept %s rows of user %s in %s written during the move",
+                    left,
+                    user_id,
+                    name,
+                )
+
+        logger.info("Moved user %s from shard %s to %s", user_id, source, target)
+        return {name: len(keys) for name, keys in copied.items()}
+
+    def migrate(self, dry_run=False):
+        """
+        Move the users with data on the main database to their shards
+
+        Run once after turning sharding on; those users are refused until
+        their data is moved.
+
+        Returns:
+            list: Moves as (user id, None, target shard)
+        """
+        from .. import db
+
+        users = db.metadata.tables["users"]
+        with db.engine.connect() as connection:
+            user_ids = (
+                connection.execute(select(users.c.id).order_by(users.c.id))
+                .scalars()
+                .all()
+            )
+        pending = [
+            user_id
+            for user_id in user_ids
+            if self._directory_entry(user_id) is None and self.has_main_data(user_id)
+        ]
+
+        moves = [(user_id, None, self.ring.shard_for(user_id)) for user_id in pending]
+        if not dry_run:
+            for user_id, _, target in moves:
+                self.move_user(user_id, target)
+        return moves
+
+    def _count_rows(self, engine, user_id):
+        with engine.connect() as connection:
+            return {
+                table.name: connection.execute(
+                    select(func.count()).where(table.c.user_id == user_id)
+                ).scalar()
+                for table in self.sharded_tables()
+            }
+
+    @staticmethod
+    def _copy_rows(reader, writer, table, user_id, batch_size):
+        users = table.name == "users"
+        owner = table.c.id if users else table.c.user_id
+        if users and writer.execute(select(owner).where(owner == user_id)).first():
+            return []
+
+        keys = []
+        primary_key = list(table.primary_key.columns)
+        rows = reader.execution_options(yield_per=batch_size).execute(
+            select(table).where(owner == user_id)
+        )
+        for batch in rows.partitions():
+            writer.execute(insert(table), [dict(row._mapping) for row in batch])
+            keys.extend(
+                tuple(row._mapping[column.name] for column in primary_key)
+                for row in batch
+            )
+        return keys
+
+    @staticmethod
+    def _delete_rows(connection, table, keys, batch_size):
+        primary_key = list(table.primary_key.columns)
+        for offset in range(0, len(keys), batch_size):
+            batch = keys[offset : offset + batch_size]
+            if len(primary_key) == 1:
+                condition = primary_key[0].in_([key[0] for key in batch])
+            else:
+                condition = tuple_(*primary_key).in_(batch)
+            connection.execute(table.delete().where(condition))
+
+    def rebalance(self, dry_run=False):
+        """
+        Move every user whose shard differs from the hash ring's choice
+
+        Run after adding shards; consistent hashing keeps the share of
+        users that move close to the share of the new shards.
+
+        Returns:
+            list: Moves as (user id, source shard, target shard)
+        """
+        from .. import db
+        from ..models.user_shard import UserShard
+
+        directory = UserShard.__table__
+        with db.engine.connect() as connection:
+            entries = connection.execute(
+                select(directory.c.user_id, directory.c.shard).order_by(
+                    directory.c.user_id
+                )
+            ).all()
+
+        moves = [
+            (user_id, shard, self.ring.shard_for(user_id))
+            for user_id, shard in entries
+            if self.ring.shard_for(user_id) != shard
+        ]
+        if not dry_run:
+            for user_id, _, target in moves:
+                self.move_user(user_id, target)
+        return moves
+
+    def _directory_entry(self, user_id, connection=None):
+        from .. import db
+        from ..models.user_shard import UserShard
+
+        directory = UserShard.__table__
+        statement = select(directory).where(directory.c.user_id == user_id)
+        if connection is not None:
+            return connection.execute(statement).first()
+        with db.engine.connect() as connection:
+            return connection.execute(statement).first()
+
+    def _route(self, user_id):
+        entry = self._directory_entry(user_id)
+        if entry is not None and entry.moving:
+            raise UserMovingError("Account is being moved, retry shortly")
+        return self.shard_of(user_id) if entry is None else entry.shard
+
+    def _bind_request(self):
+        g.shard, g.shard_user = None, None
+        if not self.enabled:
+            return None
+        try:
+            verify_jwt_in_request(optional=True)
+        except Exception:
+            # Views requiring a token reject the request themselves
+            return None
+        user_id = get_jwt_identity()
+        if user_id is None:
+            return None
+
+        try:
+            g.shard, g.shard_user = self._route(user_id), user_id
+        except UserMovingError:
+            response = jsonify({"error": "Account is being moved, retry shortly"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            return response
+        return None
+
+
+shard_router = ShardRouter()
@@ -0,0 +1,197 @@
+import copy
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, has_app_context
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """
+    A computation in flight, awaited by every identical concurrent call
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Shares one computation between identical concurrent calls
+
+    Calls are identical when they target the same function with equal
+    arguments, the user id included, so users never share results. The
+    first call computes; calls arriving before it finishes wait for its
+    result instead of running the same aggregation again, but no longer
+    than the latency budget of their request. Each caller gets its own copy
+    of the result.
+
+    The last result of every key is kept, up to ``max_entries``. With
+    ``stale_while_revalidate`` enabled, a call finding a result older than
+    ``fresh_seconds`` gets it immediately while a background thread
+    recomputes it; results older than ``max_stale_seconds`` are never
+    served. Coalescing is per process: workers of other processes still
+    compute on their own.
+    """
+
+    DEFAULT_FRESH_SECONDS = 5
+    DEFAULT_MAX_STALE_SECONDS = 300
+    DEFAULT_MAX_ENTRIES = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = OrderedDict()
+        self.stale_while_revalidate = False
+        self.fresh_seconds = self.DEFAULT_FRESH_SECONDS
+        self.max_stale_seconds = self.DEFAULT_MAX_STALE_SECONDS
+        self.max_entries = self.DEFAULT_MAX_ENTRIES
+
+    def configure(self, app):
+        """
+        Apply the SINGLE_FLIGHT_* settings of an application
+        """
+        self.stale_while_revalidate = bool(
+            app.config.get("SINGLE_FLIGHT_STALE_WHILE_REVALIDATE", False)
+        )
+        self.fresh_seconds = float(
+            app.config.get("SINGLE_FLIGHT_FRESH_SECONDS", self.DEFAULT_FRESH_SECONDS)
+        )
+        self.max_stale_seconds = float(
+            app.config.get(
+                "SINGLE_FLIGHT_MAX_STALE_SECONDS", self.DEFAULT_MAX_STALE_SECONDS
+            )
+        )
+
+    def coalesce(self, function):
+        """
+        Decorate a service method so identical concurrent calls share a result
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = (function.__qualname__, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                # Unhashable arguments cannot be compared cheaply
+                return function(*args, **kwargs)
+
+            if self.stale_while_revalidate:
+                cached = self.last_result(key, self.max_stale_seconds)
+                if cached is not None:
+                    age, result = cached
+                    if age > self.fresh_seconds:
+                        self._revalidate(key, function, args, kwargs)
+                    return result
+
+            return self.do(key, lambda: function(*args, **kwargs))
+
+        return wrapper
+
+    def do(self, key, compute):
+        """
+        Run ``compute`` unless an identical call is in flight, then wait for it
+
+        Args:
+            key: Hashable identity of the call
+            compute: Function computing the result
+
+        Returns:
+            A copy of the result
+
+        Raises:
+            sqlalchemy.exc.TimeoutError: If the request's latency deadline
+                passed while waiting, so the database guard serves its
+                fallback as for an exhausted pool
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if leader:
+            try:
+                call.result = compute()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    if call.error is None:
+                        self._store(key, call.result)
+                call.done.set()
+        else:
+            deadline = g.get("latency_deadline") if has_app_context() else None
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            if not call.done.wait(timeout):
+                raise PoolTimeoutError(
+                    "Latency budget exhausted waiting for an identical call"
+                )
+
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    def last_result(self, key, max_age=None):
+        """
+        Get the last result computed for a key
+
+        Args:
+            key: Identity of the call
+            max_age (float, optional): Oldest acceptable result in seconds
+
+        Returns:
+            tuple: Age in seconds and a copy of the result, or None
+        """
+        with self._lock:
+            entry = self._results.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        if max_age is not None and age > max_age:
+            return None
+        return age, copy.deepcopy(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def _store(self, key, result):
+        self._results.pop(key, None)
+        self._results[key] = (time.monotonic(), result)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def _revalidate(self, key, function, args, kwargs):
+        with self._lock:
+            if key in self._calls:
+                return
+        if not has_app_context():
+            return
+        app = current_app._get_current_object()
+        shard = g.get("shard")
+
+        def refresh():
+            try:
+                with app.app_context():
+                    # Query the same shard as the request
+                    g.shard = shard
+                    self.do(key, lambda: function(*args, **kwargs))
+            except Exception:
+                logger.exception("Refreshing %s failed", function.__qualname__)
+
+        threading.Thread(
+            target=refresh, name="single-flight-refresh", daemon=True
+        ).start()
+
+
+single_flight = SingleFlight()
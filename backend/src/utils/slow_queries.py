@@ -0,0 +1,171 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Root of the application package; frames outside it are library code
+MODULE_FILE = os.path.abspath(__file__)
+PACKAGE_DIR = os.path.dirname(os.path.dirname(MODULE_FILE))
+
+MAX_STATEMENT_LENGTH = 2000
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def parameter_shape(parameters):
+    """
+    Describe bound parameters by type only, so no user data is recorded
+
+    Args:
+        parameters: Driver parameters, a mapping or sequence, or a list of
+            them for executemany
+
+    Returns:
+        Types mirroring the structure of the parameters
+    """
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return {"rows": len(parameters), "row": parameter_shape(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _code_name(code):
+    # co_qualname includes the class, e.g. ExpenseService.get_expense_summary
+    return getattr(code, "co_qualname", code.co_name)
+
+
+def find_call_site():
+    """
+    Locate the application code that issued the current statement
+
+    Returns:
+        tuple: Innermost application frame as "path:line in function" and
+            the outermost service method, either of which may be None
+    """
+    caller = None
+    service = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PACKAGE_DIR) and filename != MODULE_FILE:
+            path = os.path.relpath(filename, PACKAGE_DIR)
+            if caller is None:
+                caller = f"{path}:{frame.f_lineno} in {_code_name(frame.f_code)}"
+            if path.startswith("services" + os.sep):
+                service = _code_name(frame.f_code)
+        frame = frame.f_back
+    return caller, service
+
+
+class SlowQueryRecorder:
+    """
+    Keeps the most recent SQL statements slower than a threshold
+
+    Each entry holds the statement, the types of its parameters, the
+    endpoint and service method that issued it, the calling line and the
+    elapsed time. Entries also go to the log as structured records.
+    """
+
+    DEFAULT_THRESHOLD_MS = 200
+    DEFAULT_BUFFER_SIZE = 200
+
+    def __init__(
+        self, threshold_ms=DEFAULT_THRESHOLD_MS, buffer_size=DEFAULT_BUFFER_SIZE
+    ):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=buffer_size)
+
+    def configure(self, app):
+        """
+        Apply the SLOW_QUERY_* settings of an application
+        """
+        self.threshold_ms = float(
+            app.config.get("SLOW_QUERY_THRESHOLD_MS", self.DEFAULT_THRESHOLD_MS)
+        )
+        buffer_size = int(
+            app.config.get("SLOW_QUERY_BUFFER_SIZE", self.DEFAULT_BUFFER_SIZE)
+        )
+        with self._lock:
+            self._entries = deque(self._entries, maxlen=buffer_size)
+
+    def install(self, target=Engine):
+        """
+        Time every statement executed by an engine, by default all engines
+        """
+        event.listen(target, "before_cursor_execute", self._before_execute)
+        event.listen(target, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        if context is not None:
+            context._slow_query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        started = getattr(context, "_slow_query_start", None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= self.threshold_ms:
+            self.record(statement, parameters, duration_ms)
+
+    def record(self, statement, parameters, duration_ms):
+        """
+        Store a slow statement and log it
+
+        Returns:
+            dict: Recorded entry
+        """
+        caller, service = find_call_site()
+        entry = {
+            "recorded_at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "statement": WHITESPACE_PATTERN.sub(" ", statement).strip()[
+                :MAX_STATEMENT_LENGTH
+            ],
+            "parameters": parameter_shape(parameters),
+            "endpoint": None,
+            "path": None,
+            "service": service,
+            "caller": caller,
+        }
+        if has_request_context():
+            entry["endpoint"] = request.endpoint
+            entry["path"] = f"{request.method} {request.path}"
+
+        with self._lock:
+            self._entries.append(entry)
+
+        logger.warning(
+            "Slow query took %.1f ms in %s",
+            duration_ms,
+            service or caller or "unknown code",
+            extra={"slow_query": entry},
+        )
+        return entry
+
+    def entries(self, limit=None):
+        """
+        Return recorded statements, most recent first
+        """
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_recorder = SlowQueryRecorder()
@@ -0,0 +1,43 @@
+from sqlalchemy import func
+
+
+def truncate_date(unit, column, dialect_name):
+    """
+    Build a SQL expression truncating a datetime column to a day or month
+
+    PostgreSQL uses date_trunc; SQLite, used for local testing, has no
+    equivalent and falls back to formatting the date as text.
+
+    Args:
+        unit (str): Either "day" or "month"
+        column: SQLAlchemy column or expression
+        dialect_name (str): Name of the database dialect
+
+    Returns:
+        SQLAlchemy expression for the truncated value
+    """
+    if unit not in ("day", "month"):
+        raise ValueError("Unit must be 'day' or 'month'")
+
+    if dialect_name == "sqlite":
+        return func.strftime("%Y-%m-%d" if unit == "day" else "%Y-%m-01", column)
+
+    return func.date_trunc(unit, column)
+
+
+def format_date_bucket(value, unit):
+    """
+    Format a truncated date returned by any dialect as an ISO string
+
+    Args:
+        value (datetime or str): Value produced by truncate_date
+        unit (str): Either "day" or "month"
+
+    Returns:
+        str: "YYYY-MM-DD" for days, "YYYY-MM" for months
+    """
+    if value is None:
+        return None
+
+    text = value if isinstance(value, str) else value.strftime("%Y-%m-%d")
+    return text[:10] if unit == "day" else text[:7]
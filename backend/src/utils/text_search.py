@@ -0,0 +1,190 @@
+import re
+from sqlalchemy import Index, event, func, literal, literal_column, or_, text
+from sqlalchemy.sql import column, table
+
+# Text configuration of the PostgreSQL indexes; "simple" skips stemming, so
+# merchant names and places are matched as typed
+TEXT_SEARCH_CONFIG = "simple"
+
+MAX_TERMS = 8
+MAX_TERM_LENGTH = 50
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(q):
+    """
+    Split a user query into normalized search terms
+
+    Only word characters are kept, so the terms are safe to embed in
+    tsquery and FTS5 query syntax.
+
+    Args:
+        q (str): Raw search query
+
+    Returns:
+        list: Lower-cased terms
+    """
+    terms = [term.lower()[:MAX_TERM_LENGTH] for term in TERM_PATTERN.findall(q or "")][
+        :MAX_TERMS
+    ]
+    if not terms:
+        raise ValueError("Search query must contain at least one word")
+    return terms
+
+
+def search_text(model):
+    """
+    Build the text expression indexed for a searchable model
+
+    The expression must be identical in the index and in queries for
+    PostgreSQL to use the index, so both are built here.
+    """
+    parts = [
+        func.coalesce(getattr(model, name), literal_column("''"))
+        for name in model.__search_columns__
+    ]
+    expression = parts[0]
+    for part in parts[1:]:
+        expression = expression.concat(literal_column("' '")).concat(part)
+    return expression
+
+
+def search_document(model):
+    """
+    Build the tsvector expression indexed for a searchable model
+    """
+    return func.to_tsvector(literal(TEXT_SEARCH_CONFIG), search_text(model))
+
+
+def fts_table_name(model):
+    return f"{model.__tablename__}_fts"
+
+
+def register_search_index(model):
+    """
+    Declare the text indexes of a model listing ``__search_columns__``
+
+    PostgreSQL gets a GIN index over the tsvector for word and prefix
+    matches and a trigram index for fuzzy matches. SQLite gets an external
+    content FTS5 table kept in sync by triggers.
+
+    Args:
+        model: Declarative model class
+    """
+    name = model.__tablename__
+    columns = model.__search_columns__
+
+    Index(
+        f"ix_{name}_search_document",
+        search_document(model),
+        postgresql_using="gin",
+    ).ddl_if(dialect="postgresql")
+    Index(
+        f"ix_{name}_search_trigram",
+        search_text(model).label("search_text"),
+        postgresql_using="gin",
+        postgresql_ops={"search_text": "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql")
+
+    @event.listens_for(model.__table__, "before_create")
+    def _create_extension(target, connection, **kw):
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+    @event.listens_for(model.__table__, "after_create")
+    def _create_fts_table(target, connection, **kw):
+        if connection.dialect.name == "sqlite":
+            create_fts_table(connection, name, columns)
+
+    @event.listens_for(model.__table__, "after_drop")
+    def _drop_fts_table(target, connection, **kw):
+        if connection.dialect.name == "sqlite":
+            connection.execute(text(f"DROP TABLE IF EXISTS {name}_fts"))
+
+
+def create_fts_table(connection, name, columns, rebuild=False):
+    """
+    Create a SQLite FTS5 index over columns of a table and its sync triggers
+
+    Args:
+        connection: SQLAlchemy connection
+        name (str): Indexed table
+        columns (iterable): Indexed text columns
+        rebuild (bool): Re-index existing rows, e.g. for an existing database
+    """
+    fts = f"{name}_fts"
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column_list}, content='{name}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values}); "
+        "END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update "
+        f"AFTER UPDATE OF {column_list} ON {name} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values}); "
+        "END",
+    ]
+    if rebuild:
+        statements.append(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def apply_search(query, model, q, dialect_name):
+    """
+    Restrict a query to rows matching a search and order them by relevance
+
+    Every term is matched as a prefix, so "den" finds "Dentist". On
+    PostgreSQL, rows whose text is similar to the query also match, which
+    tolerates typos such as "dentsit".
+
+    Args:
+        query: SQLAlchemy query over the model
+        model: Searchable model class
+        q (str): Raw search query
+        dialect_name (str): Name of the database dialect
+
+    Returns:
+        tuple: Filtered query and the ORDER BY clauses, best match first
+    """
+    terms = search_terms(q)
+
+    if dialect_name == "postgresql":
+        document = search_document(model)
+        tsquery = func.to_tsquery(
+            literal(TEXT_SEARCH_CONFIG),
+            " & ".join(f"{term}:*" for term in terms),
+        )
+        phrase = " ".join(terms)
+        query = query.filter(
+            or_(document.op("@@")(tsquery), search_text(model).op("%")(phrase))
+        )
+        rank = func.ts_rank(document, tsquery) + func.similarity(
+            search_text(model), phrase
+        )
+        return query, [rank.desc(), model.id.desc()]
+
+    if dialect_name == "sqlite":
+        fts = table(fts_table_name(model), column("rowid"), column("rank"))
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = query.join(fts, fts.c.rowid == model.id).filter(
+            literal_column(fts_table_name(model)).op("MATCH")(match)
+        )
+        # FTS5 ranks by bm25, where lower values are better matches
+        return query, [fts.c.rank, model.id.desc()]
+
+    # Unindexed fallback for other databases
+    query = query.filter(*[search_text(model).ilike(f"%{term}%") for term in terms])
+    return query, [model.id.desc()]
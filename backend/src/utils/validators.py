@@ -1,4 +1,5 @@
 import re
+from datetime import datetime
 from email_validator import validate_email as email_validate, EmailNotValidError
 
 
@@ -129,3 +130,29 @@ def validate_event_data(title, start_time, end_time):
     # Validate time
     if start_time >= end_time:
         raise ValueError("Start time must be before end time")
+
+
+def parse_datetime_param(value, name):
+    """
+    Parse an optional ISO 8601 query parameter
+
+    Comparing columns against typed datetimes rather than raw strings lets
+    PostgreSQL prune date partitions and use range indexes.
+
+    Args:
+        value (str): Raw parameter value, possibly empty
+        name (str): Parameter name used in error messages
+
+    Returns:
+        datetime: Parsed value, or None if the parameter is missing
+
+    Raises:
+        ValueError: If the value is not a valid ISO 8601 date or datetime
+    """
+    if not value:
+        return None
+
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime")
@@ -1,5 +1,7 @@
+import os
 import pytest
 from datetime import datetime, timedelta
+from sqlalchemy import create_engine
 from ..src import create_app, db
 from ..src.models.user import User
 from ..src.models.expense import Expense
@@ -18,8 +20,19 @@ def app():
     app.config["JWT_SECRET_KEY"] = "test-secret-key"
 
     with app.app_context():
-        db.create_all()
         yield app
+
+
+@pytest.fixture(scope="function", autouse=True)
+def database(app):
+    """
+    Recreate the tables for each test function, so tests do not depend on
+    the data or cached categories left by the ones run before
+    """
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
         db.drop_all()
 
 
@@ -36,12 +49,11 @@ def test_user(app):
     """
     Create a test user for each test function
     """
-    with app.app_context():
-        user = User(username="testuser", email="test@example.com")
-        user.set_password("testpassword")
-        db.session.add(user)
-        db.session.commit()
-        return user
+    user = User(username="testuser", email="test@example.com")
+    user.set_password("testpassword")
+    db.session.add(user)
+    db.session.commit()
+    return user
 
 
 @pytest.fixture(scope="function")
@@ -57,14 +69,14 @@ def test_expense(test_user):
     """
     Create a test expense for each test function
     """
-    with db.session.begin():
-        expense = Expense(
-            user_id=test_user.id,
-            amount=100.00,
-            category="Test Category",
-            description="Test Expense",
-        )
-        db.session.add(expense)
+    expense = Expense(
+        user_id=test_user.id,
+        amount=100.00,
+        category="Test Category",
+        description="Test Expense",
+    )
+    db.session.add(expense)
+    db.session.commit()
 
     return expense
 
@@ -74,14 +86,34 @@ def test_event(test_user):
     """
     Create a test event for each test function
     """
-    with db.session.begin():
-        event = Event(
-            user_id=test_user.id,
-            title="Test Event",
-            start_time=datetime.utcnow() + timedelta(days=1),
-            end_time=datetime.utcnow() + timedelta(days=1, hours=2),
-            category="Test Category",
-        )
-        db.session.add(event)
+    event = Event(
+        user_id=test_user.id,
+        title="Test Event",
+        start_time=datetime.utcnow() + timedelta(days=1),
+        end_time=datetime.utcnow() + timedelta(days=1, hours=2),
+        category="Test Category",
+    )
+    db.session.add(event)
+    db.session.commit()
 
     return event
+
+
+@pytest.fixture(scope="function")
+def postgres_connection():
+    """
+    Open a transaction on the PostgreSQL database of TEST_POSTGRES_URL,
+    rolled back after the test; skips the test when the URL is not set
+    """
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+
+    engine = create_engine(url)
+    try:
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            yield connection
+            transaction.rollback()
+    finally:
+        engine.dispose()
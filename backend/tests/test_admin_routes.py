@@ -0,0 +1,198 @@
+import marshal
+from ..src.services.expense_service import ExpenseService
+from ..src.utils.memory_diagnostics import memory_diagnostics
+from ..src.utils.profiling import request_profiler
+from ..src.utils.slow_queries import slow_query_recorder
+
+
+def test_slow_queries_require_admin(client, access_token):
+    """
+    Test that regular users cannot inspect recorded queries
+    """
+    response = client.get(
+        "/admin/slow-queries", headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 403
+
+
+def test_slow_queries_record_call_site(
+    app, client, access_token, test_user, monkeypatch
+):
+    """
+    Test that slow statements are recorded with their endpoint and service
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    monkeypatch.setitem(app.config, "ADMIN_USER_IDS", [test_user.id])
+    threshold_ms = slow_query_recorder.threshold_ms
+    slow_query_recorder.clear()
+    slow_query_recorder.threshold_ms = 0
+    try:
+        client.get("/expenses/summary", headers=headers)
+    finally:
+        slow_query_recorder.threshold_ms = threshold_ms
+
+    response = client.get("/admin/slow-queries", headers=headers)
+
+    assert response.status_code == 200
+    entries = response.json["slow_queries"]
+    assert entries
+    assert entries[-1]["endpoint"] == "expenses.get_expense_summary"
+    assert any(
+        entry["service"] == "ExpenseService.get_expense_summary" for entry in entries
+    )
+    assert all(isinstance(entry["parameters"], (list, dict)) for entry in entries)
+
+
+def test_profile_endpoint(
+    app, client, access_token, test_user, test_expense, monkeypatch
+):
+    """
+    Test profiling an endpoint and downloading the aggregated profile
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    monkeypatch.setitem(app.config, "ADMIN_USER_IDS", [test_user.id])
+    request_profiler.clear()
+
+    response = client.post(
+        "/admin/profiling",
+        json={"mode": "cprofile", "targets": ["expenses.get_expense_summary"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    try:
+        client.get("/expenses/summary", headers=headers)
+        client.get("/expenses", headers=headers)
+    finally:
+        client.delete("/admin/profiling", headers=headers)
+
+    profiles = client.get("/admin/profiling", headers=headers).json["profiles"]
+    assert profiles == {"expenses.get_expense_summary": {"calls": 1, "samples": 0}}
+
+    response = client.get(
+        "/admin/profiles/expenses.get_expense_summary", headers=headers
+    )
+    assert response.status_code == 200
+    assert b"get_expense_summary" in response.data
+
+
+def test_profile_service_method(
+    app, client, access_token, test_user, test_expense, monkeypatch
+):
+    """
+    Test that profiled service methods are wrapped, then restored on stop
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    monkeypatch.setitem(app.config, "ADMIN_USER_IDS", [test_user.id])
+    request_profiler.clear()
+    original = ExpenseService.__dict__["get_expense_summary"]
+
+    response = client.post(
+        "/admin/profiling",
+        json={"mode": "cprofile", "targets": ["ExpenseService.get_expense_summary"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    try:
+        assert ExpenseService.__dict__["get_expense_summary"] is not original
+        client.get("/expenses/summary", headers=headers)
+    finally:
+        client.delete("/admin/profiling", headers=headers)
+
+    assert ExpenseService.__dict__["get_expense_summary"] is original
+    profiles = client.get("/admin/profiling", headers=headers).json["profiles"]
+    assert profiles == {
+        "ExpenseService.get_expense_summary": {"calls": 1, "samples": 0}
+    }
+
+    response = client.get(
+        "/admin/profiles/ExpenseService.get_expense_summary?format=pstats",
+        headers=headers,
+    )
+    assert response.mimetype == "application/octet-stream"
+    stats = marshal.loads(response.data)
+    assert any(name == "get_expense_summary" for _, _, name in stats)
+
+    unknown = client.post(
+        "/admin/profiling",
+        json={"mode": "cprofile", "targets": ["ExpenseService.nope"]},
+        headers=headers,
+    )
+    assert unknown.status_code == 400
+
+
+def test_profile_sampling_mode(
+    app, client, access_token, test_user, test_expense, monkeypatch
+):
+    """
+    Test that the sampling mode counts collapsed stacks of profiled requests
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    monkeypatch.setitem(app.config, "ADMIN_USER_IDS", [test_user.id])
+    request_profiler.clear()
+    get_expense_summary = ExpenseService.get_expense_summary
+
+    def sampled_summary(user_id):
+        # Take a sample now rather than waiting for the sampler thread
+        request_profiler.sample_threads()
+        return get_expense_summary(user_id)
+
+    monkeypatch.setattr(
+        ExpenseService, "get_expense_summary", staticmethod(sampled_summary)
+    )
+
+    response = client.post(
+        "/admin/profiling",
+        json={"mode": "sampling", "targets": ["expenses.get_expense_summary"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    try:
+        client.get("/expenses/summary", headers=headers)
+    finally:
+        client.delete("/admin/profiling", headers=headers)
+
+    profile = client.get("/admin/profiling", headers=headers).json["profiles"][
+        "expenses.get_expense_summary"
+    ]
+    assert profile["calls"] == 1
+    assert profile["samples"] >= 1
+
+    collapsed = client.get(
+        "/admin/profiles/expenses.get_expense_summary?format=collapsed",
+        headers=headers,
+    )
+    assert collapsed.mimetype == "text/plain"
+    stacks = dict(line.rsplit(" ", 1) for line in collapsed.data.decode().splitlines())
+    assert sum(int(count) for count in stacks.values()) == profile["samples"]
+    assert any("sampled_summary;" in stack for stack in stacks)
+
+    text = client.get(
+        "/admin/profiles/expenses.get_expense_summary?format=text", headers=headers
+    )
+    assert text.status_code == 400
+
+
+def test_memory_diagnostics(
+    app, client, access_token, test_user, test_expense, monkeypatch
+):
+    """
+    Test that allocations during requests are attributed to source lines
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    monkeypatch.setitem(app.config, "ADMIN_USER_IDS", [test_user.id])
+
+    response = client.post(
+        "/admin/memory", json={"endpoints": ["expenses.get_expenses"]}, headers=headers
+    )
+    assert response.status_code == 200
+    try:
+        client.get("/expenses", headers=headers)
+        client.get("/expenses/summary", headers=headers)
+    finally:
+        client.delete("/admin/memory", headers=headers)
+
+    endpoints = client.get("/admin/memory", headers=headers).json["endpoints"]
+    assert list(endpoints) == ["expenses.get_expenses"]
+    assert endpoints["expenses.get_expenses"]["requests"] == 1
+    assert endpoints["expenses.get_expenses"]["top_allocators"]
@@ -0,0 +1,218 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from ..src import db
+from ..src.models import sync_change
+from ..src.models.category import category_cache
+from ..src.models.expense import Expense
+from ..src.services import budget_service
+from ..src.services.batch_service import BatchService
+
+
+def test_batch_applies_operations_independently(
+    client, access_token, test_expense, monkeypatch
+):
+    """
+    Test that failed operations of a batch only undo themselves
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    published = []
+    monkeypatch.setattr(sync_change, "_commit_listeners", [published.extend])
+    start = datetime.utcnow() + timedelta(days=2)
+
+    response = client.post(
+        "/batch",
+        json={
+            "operations": [
+                {
+                    "entity": "expense",
+                    "op": "create",
+                    "data": {"amount": 12, "category": "Food"},
+                },
+                {
+                    "entity": "expense",
+                    "op": "update",
+                    "id": test_expense.id,
+                    "data": {"amount": -5},
+                },
+                {
+                    "entity": "event",
+                    "op": "update",
+                    "id": 999999,
+                    "data": {"title": "x"},
+                },
+                {
+                    "entity": "event",
+                    "op": "create",
+                    "data": {
+                        "title": "Offline",
+                        "start_time": start.isoformat(),
+                        "end_time": (start + timedelta(hours=1)).isoformat(),
+                    },
+                },
+                {
+                    "entity": "expense",
+                    "op": "update",
+                    "id": test_expense.id,
+                    "data": {"description": "Synced"},
+                },
+            ]
+        },
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json["committed"] is True
+    results = response.json["results"]
+    assert [result["status"] for result in results] == [201, 400, 404, 201, 200]
+    created = results[0]["expense"]["id"]
+    assert db.session.get(Expense, created).category == "Food"
+    db.session.refresh(test_expense)
+    assert test_expense.amount == 100
+    assert test_expense.description == "Synced"
+
+    assert [(c["entity_type"], c["operation"]) for c in published] == [
+        ("expense", "created"),
+        ("event", "created"),
+        ("expense", "updated"),
+    ]
+
+
+def test_atomic_batch_is_rolled_back(client, access_token, test_expense, monkeypatch):
+    """
+    Test that an atomic batch commits nothing when an operation fails
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    published = []
+    monkeypatch.setattr(sync_change, "_commit_listeners", [published.extend])
+    count = Expense.query.count()
+
+    response = client.post(
+        "/batch",
+        json={
+            "atomic": True,
+            "operations": [
+                {
+                    "entity": "expense",
+                    "op": "create",
+                    "data": {"amount": 7, "category": "Food"},
+                },
+                {"entity": "expense", "op": "delete", "id": test_expense.id},
+                {
+                    "entity": "expense",
+                    "op": "create",
+                    "data": {"amount": 0, "category": "Food"},
+                },
+                {
+                    "entity": "expense",
+                    "op": "create",
+                    "data": {"amount": 8, "category": "Food"},
+                },
+            ],
+        },
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json["committed"] is False
+    assert [r["status"] for r in response.json["results"]] == [201, 200, 400, 424]
+    assert Expense.query.count() == count
+    assert db.session.get(Expense, test_expense.id) is not None
+    assert published == []
+
+
+def test_savepoint_rollback_drops_only_its_changes(test_user, monkeypatch):
+    """
+    Test that changes flushed inside a rolled back savepoint are not published
+    """
+    published = []
+    monkeypatch.setattr(sync_change, "_commit_listeners", [published.extend])
+
+    kept = Expense(user_id=test_user.id, amount=1, category="Kept")
+    db.session.add(kept)
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add(Expense(user_id=test_user.id, amount=2, category="Undone"))
+            db.session.flush()
+            raise ValueError("undo")
+    except ValueError:
+        pass
+    with db.session.begin_nested():
+        db.session.delete(kept)
+    db.session.commit()
+
+    assert [c["operation"] for c in published] == ["created", "deleted"]
+    assert all(c["entity_id"] == kept.id for c in published)
+
+
+def test_batch_alerts_and_categories_follow_savepoints(
+    client, access_token, test_user, monkeypatch
+):
+    """
+    Test that budget alerts and new categories of failed operations are
+    dropped and the others wait for the batch to commit
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for category in ("Batched", "Undone"):
+        client.post(
+            "/budgets",
+            json={"category": category, "monthly_limit": 10},
+            headers=headers,
+        )
+    alerts = []
+    broker = SimpleNamespace(publish=lambda channel, message: alerts.append(message))
+    monkeypatch.setattr(budget_service, "get_broker", lambda: broker)
+    published_early = []
+    apply = BatchService._apply
+
+    def apply_then_fail(user_id, operation):
+        record = apply(user_id, operation)
+        if record.category in ("Undone", "Discarded"):
+            published_early.extend(alerts)
+            raise ValueError("Rejected after flush")
+        return record
+
+    monkeypatch.setattr(BatchService, "_apply", staticmethod(apply_then_fail))
+    response = client.post(
+        "/batch",
+        json={
+            "operations": [
+                {
+                    "entity": "expense",
+                    "op": "create",
+                    "data": {"amount": 20, "category": category},
+                }
+                for category in ("Batched", "Undone", "Discarded")
+            ]
+        },
+        headers=headers,
+    )
+
+    assert [result["status"] for result in response.json["results"]] == [
+        201,
+        400,
+        400,
+    ]
+    assert published_early == []
+    assert [alert["category"] for alert in alerts] == ["Batched"]
+    # Budgets create their category; the one only the failed operation used
+    # is gone
+    assert category_cache.id_of(test_user.id, "Undone") is not None
+    assert category_cache.id_of(test_user.id, "Discarded") is None
+
+
+def test_batch_rejects_unknown_operations(client, access_token):
+    """
+    Test that malformed batches are rejected before anything runs
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    empty = client.post("/batch", json={"operations": []}, headers=headers)
+    unknown = client.post(
+        "/batch",
+        json={"operations": [{"entity": "budget", "op": "create"}]},
+        headers=headers,
+    )
+
+    assert empty.status_code == 400
+    assert unknown.status_code == 400
@@ -0,0 +1,95 @@
+import json
+from ..src import db
+from ..src.models.budget import Budget
+
+
+def test_create_budget(client, access_token):
+    """
+    Test creating a new budget
+    """
+    budget_data = {
+        "category": "Groceries",
+        "monthly_limit": 400,
+        "alert_threshold": 0.8,
+    }
+
+    response = client.post(
+        "/budgets",
+        data=json.dumps(budget_data),
+        content_type="application/json",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+
+    assert response.status_code == 201
+    assert response.json["message"] == "Budget created successfully"
+    assert response.json["budget"]["monthly_limit"] == 400
+
+
+def test_budget_status_tracks_expense_writes(client, access_token):
+    """
+    Test that budget status follows expense creates, updates and deletes
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    client.post(
+        "/budgets", json={"category": "Dining", "monthly_limit": 100}, headers=headers
+    )
+
+    first = client.post(
+        "/expenses", json={"amount": 60, "category": "Dining"}, headers=headers
+    ).json["expense"]
+    second = client.post(
+        "/expenses", json={"amount": 50, "category": "Dining"}, headers=headers
+    ).json["expense"]
+
+    status = client.get("/budgets/status", headers=headers).json["budgets"][0]
+    assert status["spent"] == 110
+    assert status["exceeded"] is True
+
+    client.put(f"/expenses/{second['id']}", json={"amount": 20}, headers=headers)
+    client.delete(f"/expenses/{first['id']}", headers=headers)
+
+    status = client.get("/budgets/status", headers=headers).json["budgets"][0]
+    assert status["spent"] == 20
+    assert status["exceeded"] is False
+
+
+def test_budget_status_rejects_invalid_month(client, access_token):
+    """
+    Test that an invalid month is rejected
+    """
+    response = client.get(
+        "/budgets/status?month=2024-13",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+
+    assert response.status_code == 400
+
+
+def test_budget_limits_are_exact(client, access_token):
+    """
+    Test that limits are stored as cents and compared without float drift
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    client.post(
+        "/budgets",
+        json={"category": "Snacks", "monthly_limit": 0.3, "alert_threshold": 1.0},
+        headers=headers,
+    )
+    for amount in (0.1, 0.2):
+        client.post(
+            "/expenses", json={"amount": amount, "category": "Snacks"}, headers=headers
+        )
+
+    status = client.get("/budgets/status", headers=headers).json["budgets"][0]
+
+    assert db.session.query(Budget.monthly_limit_cents).scalar() == 30
+    assert status["remaining"] == 0
+    assert status["alert"] is True
+    assert status["exceeded"] is False
+
+    response = client.post(
+        "/budgets",
+        json={"category": "Crumbs", "monthly_limit": 0.001},
+        headers=headers,
+    )
+    assert response.status_code == 400
@@ -0,0 +1,94 @@
+import threading
+import time
+from flask import g
+from sqlalchemy.exc import OperationalError
+from ..src.services.dashboard_service import DashboardService
+from ..src.utils.database_guard import database_guard
+
+
+def test_dashboard_returns_all_widgets(client, access_token, test_expense):
+    """
+    Test that the dashboard combines every widget in one response
+    """
+    response = client.get(
+        "/dashboard", headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+    widgets = response.json["widgets"]
+    assert set(widgets) == {
+        "expense_summary",
+        "top_categories",
+        "monthly_spending",
+        "upcoming_events",
+        "event_summary",
+    }
+    assert response.json["errors"] == {}
+    assert widgets["top_categories"][0]["category"] == test_expense.category
+
+
+def test_dashboard_widget_selection(client, access_token):
+    """
+    Test selecting widgets and rejecting unknown ones
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    selected = client.get(
+        "/dashboard?widgets=upcoming_events,monthly_spending", headers=headers
+    )
+    unknown = client.get("/dashboard?widgets=weather", headers=headers)
+
+    assert set(selected.json["widgets"]) == {"upcoming_events", "monthly_spending"}
+    assert unknown.status_code == 400
+
+
+def test_dashboard_database_failure_serves_last_dashboard(
+    client, access_token, monkeypatch
+):
+    """
+    Test that a widget's database error goes to the guard instead of the cache
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    database_guard.clear()
+    database_guard.breaker.record_success()
+    fresh = client.get("/dashboard", headers=headers)
+
+    def unavailable(user_id):
+        raise OperationalError("SELECT", {}, Exception("statement timeout"))
+
+    monkeypatch.setitem(DashboardService.WIDGETS, "event_summary", unavailable)
+    try:
+        stale = client.get("/dashboard", headers=headers)
+    finally:
+        database_guard.breaker.record_success()
+
+    assert stale.status_code == 200
+    assert stale.json["stale"] is True
+    assert stale.json["errors"] == {}
+    assert stale.json["widgets"] == fresh.json["widgets"]
+
+
+def test_dashboard_reports_widgets_over_the_latency_budget(app, test_user, monkeypatch):
+    """
+    Test that a widget still running at the deadline is reported, not awaited
+    """
+    release = threading.Event()
+
+    def slow(user_id):
+        release.wait(5)
+        return {}
+
+    monkeypatch.setitem(DashboardService.WIDGETS, "event_summary", slow)
+    started = time.monotonic()
+    try:
+        with app.test_request_context():
+            g.latency_deadline = started + 0.2
+            dashboard = DashboardService.get_dashboard(
+                test_user.id, ["upcoming_events", "event_summary"]
+            )
+    finally:
+        release.set()
+
+    assert time.monotonic() - started < 2
+    assert dashboard["widgets"] == {"upcoming_events": []}
+    assert list(dashboard["errors"]) == ["event_summary"]
@@ -0,0 +1,67 @@
+from sqlalchemy.exc import OperationalError
+from ..src.services.expense_service import ExpenseService
+from ..src.utils.database_guard import CircuitBreaker, database_guard
+
+
+def test_summary_falls_back_to_stale_result(client, access_token, monkeypatch):
+    """
+    Test that a failing database serves the last summary, marked as stale
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    database_guard.clear()
+    database_guard.breaker.record_success()
+    client.post("/expenses", json={"amount": 25, "category": "Food"}, headers=headers)
+
+    fresh = client.get("/expenses/summary", headers=headers)
+    assert fresh.status_code == 200
+    assert "stale" not in fresh.json
+
+    def unavailable(user_id):
+        raise OperationalError("SELECT", {}, Exception("statement timeout"))
+
+    monkeypatch.setattr(ExpenseService, "get_expense_summary", unavailable)
+    try:
+        stale = client.get("/expenses/summary", headers=headers)
+        uncached = client.get("/events/upcoming", headers=headers)
+    finally:
+        database_guard.breaker.record_success()
+
+    assert stale.status_code == 200
+    assert stale.json["stale"] is True
+    assert stale.json["category_summary"] == fresh.json["category_summary"]
+    assert "Warning" in stale.headers
+    # The breaker stays closed after a single failure
+    assert uncached.status_code == 200
+
+
+def test_open_circuit_skips_the_database(client, access_token):
+    """
+    Test that an open breaker answers without running the view
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    database_guard.clear()
+    database_guard.breaker.trip()
+    try:
+        response = client.get("/events/upcoming", headers=headers)
+    finally:
+        database_guard.breaker.record_success()
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_circuit_breaker_half_open_trial():
+    """
+    Test that the breaker opens after repeated failures and lets one trial through
+    """
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -1,9 +1,15 @@
 import json
+from datetime import datetime, timedelta
 from flask import Flask
 from flask_jwt_extended import create_access_token
 from ..src import create_app, db
 from ..src.models.user import User
 from ..src.models.expense import Expense
+from ..src.utils.memory_diagnostics import trace_peak
+
+# Peak memory allowed while exporting 10,000 rows; loading them all at
+# once takes several times more
+EXPORT_PEAK_BYTES = 8 * 1024 * 1024
 
 
 def test_create_expense(client, access_token):
@@ -73,3 +79,113 @@ def test_delete_expense(client, access_token, test_expense):
 
     assert response.status_code == 200
     assert response.json["message"] == "Expense deleted successfully"
+
+
+def test_search_expenses(client, access_token):
+    """
+    Test ranked full-text search over expense descriptions
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for description in ["Uber ride home", "Dentist checkup", "Groceries"]:
+        client.post(
+            "/expenses",
+            data=json.dumps(
+                {"amount": 12.5, "category": "Misc", "description": description}
+            ),
+            content_type="application/json",
+            headers=headers,
+        )
+
+    response = client.get("/expenses?q=dent", headers=headers)
+
+    assert response.status_code == 200
+    assert [expense["description"] for expense in response.json["expenses"]] == [
+        "Dentist checkup"
+    ]
+
+    response = client.get("/expenses?q=%22%22", headers=headers)
+    assert response.status_code == 400
+
+
+def test_filter_and_sort_expenses(client, access_token):
+    """
+    Test declarative expense filters and index-backed sort orders
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for amount, category in [(5, "Food"), (40, "Food"), (12.5, "Travel"), (7, "Misc")]:
+        client.post(
+            "/expenses",
+            data=json.dumps({"amount": amount, "category": category}),
+            content_type="application/json",
+            headers=headers,
+        )
+
+    response = client.get(
+        "/expenses?category=Food,Misc&min_amount=6&sort=-amount", headers=headers
+    )
+
+    assert response.status_code == 200
+    assert [expense["amount"] for expense in response.json["expenses"]] == [40, 7]
+
+    # Two range filters off the sort column would need an unindexed scan
+    response = client.get(
+        "/expenses?min_amount=6&description_prefix=U", headers=headers
+    )
+    assert response.status_code == 400
+
+    response = client.get("/expenses?sort=description", headers=headers)
+    assert response.status_code == 400
+
+
+def test_description_prefix_filter(client, access_token):
+    """
+    Test that description prefixes match case-sensitively and literally
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for description in ["Uber ride", "uber eats", "50% off", "500 pens"]:
+        client.post(
+            "/expenses",
+            json={"amount": 10, "category": "Misc", "description": description},
+            headers=headers,
+        )
+
+    for prefix, expected in [("U", ["Uber ride"]), ("50%25", ["50% off"])]:
+        response = client.get(f"/expenses?description_prefix={prefix}", headers=headers)
+        assert response.status_code == 200
+        assert [
+            expense["description"] for expense in response.json["expenses"]
+        ] == expected
+
+
+def test_export_peak_memory(client, access_token, test_expense):
+    """
+    Test that exporting 10,000 expenses streams them in bounded memory
+    """
+    now = datetime.utcnow()
+    db.session.execute(
+        Expense.__table__.insert(),
+        [
+            {
+                "user_id": test_expense.user_id,
+                "amount_cents": 100 + i,
+                "currency": "USD",
+                "category_id": test_expense.category_id,
+                "description": f"Expense {i}",
+                "date": now - timedelta(minutes=i),
+            }
+            for i in range(10000)
+        ],
+    )
+    db.session.commit()
+
+    with trace_peak() as memory:
+        response = client.get(
+            "/expenses/export",
+            headers={"Authorization": f"Bearer {access_token}"},
+            buffered=False,
+        )
+        lines = sum(chunk.count(b"\n") for chunk in response.iter_encoded())
+        response.close()
+
+    assert lines > 10000
+    assert memory["peak"] < EXPORT_PEAK_BYTES
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from ..src import db
+from ..src.models.expense import Expense
+from ..src.models.idempotency_key import IdempotencyKey
+from ..src.models.user import User
+from ..src.routes import expense_routes
+from ..src.utils.idempotency import purge_expired_keys
+
+
+def test_retried_create_is_replayed(client, access_token):
+    """
+    Test that retrying a create with the same key returns the first response
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Idempotency-Key": "retry-expense-1",
+    }
+    body = {"amount": 42, "category": "Idempotent"}
+    count = Expense.query.count()
+
+    first = client.post("/expenses", json=body, headers=headers)
+    retry = client.post("/expenses", json=body, headers=headers)
+
+    assert first.status_code == 201
+    assert retry.status_code == 201
+    assert retry.json == first.json
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert Expense.query.count() == count + 1
+
+    reused = client.post(
+        "/expenses", json={"amount": 43, "category": "Idempotent"}, headers=headers
+    )
+    assert reused.status_code == 422
+
+
+def test_keys_are_scoped_per_user(client, access_token):
+    """
+    Test that another user's key does not replay someone else's response
+    """
+    other = User(username="idempotent_other", email="idempotent_other@example.com")
+    other.set_password("password")
+    db.session.add(other)
+    db.session.commit()
+    start = datetime.utcnow() + timedelta(days=1)
+    body = {
+        "title": "Standup",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(minutes=15)).isoformat(),
+    }
+
+    mine = client.post(
+        "/events",
+        json=body,
+        headers={
+            "Authorization": f"Bearer {access_token}",
+            "Idempotency-Key": "shared",
+        },
+    )
+    theirs = client.post(
+        "/events",
+        json=body,
+        headers={
+            "Authorization": f"Bearer {create_access_token(other.id)}",
+            "Idempotency-Key": "shared",
+        },
+    )
+
+    assert mine.status_code == 201
+    assert theirs.status_code == 201
+    assert "Idempotent-Replayed" not in theirs.headers
+    assert theirs.json["event"]["id"] != mine.json["event"]["id"]
+
+
+def test_expired_keys_are_purged(app, client, access_token):
+    """
+    Test that expired keys are purged and can be used again
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Idempotency-Key": "expiring",
+    }
+    body = {"amount": 5, "category": "Idempotent"}
+    app.config["IDEMPOTENCY_KEY_TTL_HOURS"] = -1
+    try:
+        first = client.post("/expenses", json=body, headers=headers)
+    finally:
+        app.config["IDEMPOTENCY_KEY_TTL_HOURS"] = 24
+
+    retry = client.post("/expenses", json=body, headers=headers)
+
+    assert retry.status_code == 201
+    assert retry.json["expense"]["id"] != first.json["expense"]["id"]
+    IdempotencyKey.query.filter_by(key="expiring").update(
+        {"expires_at": datetime.utcnow() - timedelta(hours=1)}
+    )
+    db.session.commit()
+    assert purge_expired_keys() >= 1
+    assert IdempotencyKey.query.filter_by(key="expiring").count() == 0
+
+
+def test_key_commits_with_the_created_row(client, access_token, monkeypatch):
+    """
+    Test that a create failing after its commit is replayed, not run again
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Idempotency-Key": "after-commit",
+    }
+    body = {"amount": 8, "category": "Idempotent"}
+    count = Expense.query.count()
+
+    def fail(expense):
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(expense_routes, "expense_created", fail)
+    first = client.post("/expenses", json=body, headers=headers)
+    monkeypatch.undo()
+    retry = client.post("/expenses", json=body, headers=headers)
+
+    assert first.status_code == 201
+    assert retry.json == first.json
+    assert Expense.query.count() == count + 1
+    record = IdempotencyKey.query.filter_by(key="after-commit").one()
+    assert record.status_code == 201
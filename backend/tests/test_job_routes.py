@@ -0,0 +1,169 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import OperationalError
+from ..src import db
+from ..src.models.job import Job
+from ..src.services.job_service import JobService
+from ..src.utils.job_worker import JobWorker
+
+
+def test_expense_report_job(client, access_token, test_expense):
+    """
+    Test queueing a report, running it and fetching its result
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    response = client.post("/jobs", json={"kind": "expense_report"}, headers=headers)
+
+    assert response.status_code == 202
+    job = response.json["job"]
+    assert job["status"] == "queued"
+    assert response.headers["Location"].endswith(f"/jobs/{job['id']}")
+
+    pending = client.get(f"/jobs/{job['id']}/result", headers=headers)
+    assert pending.status_code == 202
+
+    assert JobService.run_pending() == 1
+
+    status = client.get(f"/jobs/{job['id']}", headers=headers)
+    assert status.json["status"] == "succeeded"
+    result = client.get(f"/jobs/{job['id']}/result", headers=headers)
+    assert result.status_code == 200
+    assert result.json["result"]["total_spending"] == test_expense.amount
+
+
+def test_import_and_export_jobs(app, client, access_token, tmp_path, monkeypatch):
+    """
+    Test importing expenses and exporting them to a CSV file as jobs
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    monkeypatch.setitem(app.config, "JOB_RESULT_DIR", str(tmp_path))
+    rows = [{"amount": 10 + i, "category": "Imported"} for i in range(3)]
+    rows.append({"amount": -1, "category": "Imported"})
+
+    imported = client.post(
+        "/jobs", json={"kind": "expense_import", "expenses": rows}, headers=headers
+    ).json["job"]
+    exported = client.post(
+        "/jobs", json={"kind": "expense_export"}, headers=headers
+    ).json["job"]
+    JobService.run_pending()
+
+    result = client.get(f"/jobs/{imported['id']}/result", headers=headers).json
+    assert result["result"]["imported"] == 3
+    assert result["result"]["errors"][0]["row"] == 3
+
+    response = client.get(f"/jobs/{exported['id']}/result", headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    lines = response.data.decode().splitlines()
+    assert lines[0] == "id,date,amount,currency,category,description"
+    assert sum("Imported" in line for line in lines) == 3
+
+
+def test_job_retries_then_fails(app, client, access_token, monkeypatch):
+    """
+    Test that failing jobs are retried until they run out of attempts
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    def fail(job, payload):
+        raise RuntimeError("Database unavailable")
+
+    parse_payload, _ = JobService.KINDS["event_summary"]
+    monkeypatch.setitem(JobService.KINDS, "event_summary", (parse_payload, fail))
+
+    job_id = client.post("/jobs", json={"kind": "event_summary"}, headers=headers).json[
+        "job"
+    ]["id"]
+
+    for attempt in range(1, db.session.get(Job, job_id).max_attempts + 1):
+        # Skip the retry backoff
+        Job.query.filter_by(id=job_id).update({"run_after": datetime.utcnow()})
+        db.session.commit()
+        assert JobService.run_pending() == 1
+        assert db.session.get(Job, job_id).attempts == attempt
+
+    response = client.get(f"/jobs/{job_id}/result", headers=headers)
+    assert response.status_code == 409
+    assert response.json["job"]["status"] == "failed"
+    assert JobService.run_pending() == 0
+
+
+def test_stale_jobs_are_requeued_until_out_of_attempts(client, access_token):
+    """
+    Test that jobs whose worker stopped beating are requeued, then failed
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    job_ids = [
+        client.post("/jobs", json={"kind": "event_summary"}, headers=headers).json[
+            "job"
+        ]["id"]
+        for _ in range(3)
+    ]
+    lost = datetime.utcnow() - JobService.STALE_AFTER - timedelta(minutes=1)
+    Job.query.filter(Job.id.in_(job_ids)).update(
+        {"status": Job.STATUS_RUNNING, "started_at": lost, "heartbeat_at": lost},
+        synchronize_session=False,
+    )
+    # Still beating, although started long ago
+    Job.query.filter_by(id=job_ids[1]).update({"heartbeat_at": datetime.utcnow()})
+    # Its last attempt was lost too
+    Job.query.filter_by(id=job_ids[2]).update({"attempts": Job.max_attempts})
+    db.session.commit()
+
+    assert JobService.requeue_stale() == 1
+
+    db.session.expire_all()
+    statuses = [db.session.get(Job, job_id).status for job_id in job_ids]
+    assert statuses == [Job.STATUS_QUEUED, Job.STATUS_RUNNING, Job.STATUS_FAILED]
+    assert db.session.get(Job, job_ids[2]).finished_at is not None
+
+
+def test_create_job_rejects_invalid_requests(client, access_token):
+    """
+    Test that unknown kinds and invalid parameters are rejected
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    unknown = client.post("/jobs", json={"kind": "nope"}, headers=headers)
+    invalid_date = client.post(
+        "/jobs",
+        json={"kind": "expense_report", "start_date": "yesterday"},
+        headers=headers,
+    )
+
+    assert unknown.status_code == 400
+    assert invalid_date.status_code == 400
+
+
+def test_worker_keeps_dispatching_after_claim_errors(
+    app, client, access_token, monkeypatch
+):
+    """
+    Test that a failed claim is logged and retried instead of stopping the worker
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    job_id = client.post("/jobs", json={"kind": "event_summary"}, headers=headers).json[
+        "job"
+    ]["id"]
+
+    claim_next = JobService.claim_next
+    claims = []
+
+    def flaky_claim_next():
+        claims.append(job_id)
+        if len(claims) == 1:
+            raise OperationalError("SELECT", {}, Exception("database is locked"))
+        return claim_next()
+
+    monkeypatch.setattr(JobService, "claim_next", staticmethod(flaky_claim_next))
+    worker = JobWorker(app, size=1, poll_interval=0.01)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while len(claims) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop(5)
+
+    db.session.expire_all()
+    assert db.session.get(Job, job_id).status == Job.STATUS_SUCCEEDED
@@ -0,0 +1,64 @@
+import io
+import json
+import logging
+from ..src.utils.log_pipeline import configure_logging, stop_logging
+from ..src.utils.error_handlers import CustomErrorHandler
+
+
+def test_repeated_errors_are_sampled(app):
+    """
+    Test that an error storm is logged as a burst plus samples in JSON
+    """
+    output = io.StringIO()
+    configure_logging(stream=output)
+    try:
+        with app.test_request_context(headers={"X-Request-ID": "request-1"}):
+            app.preprocess_request()
+            for _ in range(500):
+                CustomErrorHandler.log_error(ValueError("Invalid amount"))
+    finally:
+        stop_logging()
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    errors = [
+        record for record in records if record["message"] == "Error: Invalid amount"
+    ]
+
+    assert 10 <= len(errors) < 20
+    assert all(record["request_id"] == "request-1" for record in errors)
+    assert errors[-1]["suppressed"] > 0
+
+
+def test_full_queue_drops_records(app):
+    """
+    Test that logging never waits when the listener falls behind
+    """
+    handler = configure_logging(queue_size=1, stream=io.StringIO())
+    # Without a listener nothing drains the queue
+    stop_logging()
+
+    for i in range(5):
+        logging.getLogger("test").error("Record %d", i)
+
+    assert handler.dropped == 4
+    configure_logging()
+
+
+def test_queued_records_are_prepared(app):
+    """
+    Test that records are queued with their message merged and exception kept
+    """
+    output = io.StringIO()
+    configure_logging(stream=output)
+    try:
+        try:
+            raise ValueError("Invalid amount")
+        except ValueError:
+            logging.getLogger("test").exception("Import of row %d failed", 3)
+    finally:
+        stop_logging()
+
+    record = json.loads(output.getvalue().splitlines()[-1])
+
+    assert record["message"] == "Import of row 3 failed"
+    assert record["exception"].endswith("ValueError: Invalid amount")
@@ -0,0 +1,68 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import inspect, text
+from ..src import db
+from ..src.utils.partitioning import (
+    convert_to_partitioned,
+    ensure_partitions,
+    is_partitioned,
+)
+
+
+@pytest.mark.integration
+def test_new_partitions_take_their_rows_from_the_default_partition(
+    postgres_connection,
+):
+    """
+    Test that creating a partition moves its month out of the default partition
+    """
+    connection = postgres_connection
+    connection.execute(
+        text(
+            "CREATE TABLE scratch_items (id INTEGER, date TIMESTAMP NOT NULL) "
+            "PARTITION BY RANGE (date)"
+        )
+    )
+    connection.execute(
+        text("CREATE TABLE scratch_items_default PARTITION OF scratch_items DEFAULT")
+    )
+    connection.execute(
+        text(
+            "INSERT INTO scratch_items VALUES "
+            "(1, '2031-05-10'), (2, '2031-05-31 23:59'), (3, '2031-07-01')"
+        )
+    )
+
+    names = ensure_partitions(
+        connection, "scratch_items", datetime(2031, 5, 1), datetime(2031, 6, 1)
+    )
+
+    def count(relation):
+        return connection.execute(text(f"SELECT count(*) FROM {relation}")).scalar()
+
+    assert names == ["scratch_items_y2031m05", "scratch_items_y2031m06"]
+    assert count("scratch_items_y2031m05") == 2
+    assert count("scratch_items_default") == 1
+    assert count("scratch_items") == 3
+    assert ensure_partitions(
+        connection, "scratch_items", datetime(2031, 5, 1), datetime(2031, 5, 1)
+    ) == ["scratch_items_y2031m05"]
+
+
+@pytest.mark.integration
+def test_converted_tables_keep_their_foreign_keys(postgres_connection):
+    """
+    Test that every foreign key of a table survives its conversion
+    """
+    connection = postgres_connection
+    db.metadata.create_all(connection)
+    if is_partitioned(connection, "expenses"):
+        pytest.skip("expenses is already partitioned")
+
+    convert_to_partitioned(connection, "expenses")
+
+    foreign_keys = {
+        (tuple(foreign_key["constrained_columns"]), foreign_key["referred_table"])
+        for foreign_key in inspect(connection).get_foreign_keys("expenses")
+    }
+    assert foreign_keys == {(("user_id",), "users"), (("category_id",), "categories")}
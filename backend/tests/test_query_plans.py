@@ -0,0 +1,248 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, insert, select, text
+from ..src import db
+from ..src.models.user import User
+from ..src.models.category import Category
+from ..src.models.expense import Expense
+from ..src.models.event import Event
+from ..src.models.sync_change import SyncChange
+from ..src.services.expense_service import ExpenseService
+from ..src.services.event_service import EventService
+from ..src.utils.query_plans import capture_queries, find_plan_regressions
+from ..src.utils.text_search import apply_search
+
+# Highest estimated cost accepted for a single query, where the database
+# reports one; a forced sequential scan costs 1e10 on PostgreSQL
+MAX_QUERY_COST = 10000
+
+LIST_URLS = [
+    "/expenses",
+    "/expenses?category=Groceries,Dining&sort=amount",
+    "/expenses?min_amount=10&max_amount=50&sort=-date",
+    "/expenses?description_prefix=Item%201",
+    "/expenses?q=item",
+    "/expenses/summary",
+    "/expenses/export",
+    "/expenses/stats",
+    "/expenses/anomalies",
+    "/events",
+    "/events?category=Work&title_prefix=Meeting",
+    "/events?q=meeting",
+    "/events/upcoming",
+]
+
+
+def seed_dataset(user, other_users=4, rows=100):
+    """
+    Add a few months of expenses and events for the user and a few others
+
+    Other users' rows make user_id selective, as it is in production;
+    otherwise the planner may rightly prefer scanning a one-user table.
+    """
+    user_ids = [user.id]
+    for n in range(other_users):
+        name = f"planner_{user.id}_{n}"
+        other = User(username=name, email=f"{name}@example.com")
+        other.set_password("testpassword")
+        db.session.add(other)
+        db.session.flush()
+        user_ids.append(other.id)
+
+    for user_id in user_ids:
+        add_rows(user_id, rows)
+    db.session.commit()
+    # Give the planner statistics, as a production database would have
+    db.session.execute(text("ANALYZE"))
+
+
+def add_rows(user_id, rows):
+    now = datetime.utcnow()
+    generator = random.Random(user_id)
+    for i in range(rows):
+        db.session.add(
+            Expense(
+                user_id=user_id,
+                amount=generator.randint(100, 10000) / 100,
+                category=generator.choice(["Groceries", "Dining", "Transport"]),
+                description=f"Item {i}",
+                date=now - timedelta(days=i % 120, hours=i),
+            )
+        )
+        db.session.add(
+            Event(
+                user_id=user_id,
+                title=f"Meeting {i}",
+                category=generator.choice(["Work", "Personal"]),
+                start_time=now + timedelta(days=i % 90 - 45, hours=i % 24),
+                end_time=now + timedelta(days=i % 90 - 45, hours=i % 24 + 1),
+            )
+        )
+
+
+def assert_indexed(queries, connection=None):
+    """
+    Fail with the offending plans if any captured query lost its index
+    """
+    assert queries
+    if connection is None:
+        with db.engine.connect() as connection:
+            return assert_indexed(queries, connection)
+
+    regressions = find_plan_regressions(connection, queries, max_cost=MAX_QUERY_COST)
+
+    assert not regressions, "\n\n".join(
+        f"{', '.join(plan['reasons'])}\n{plan['statement']}\n" + "\n".join(plan["plan"])
+        for plan in regressions
+    )
+
+
+def test_service_queries_use_indexes(test_user):
+    """
+    Test that expense and event service queries keep an index path
+    """
+    seed_dataset(test_user)
+    now = datetime.utcnow()
+
+    with capture_queries(db.engine) as queries:
+        ExpenseService.calculate_monthly_spending(test_user.id)
+        ExpenseService.get_top_expenses_by_category(test_user.id)
+        ExpenseService.predict_next_month_expenses(test_user.id)
+        ExpenseService.generate_expense_report(test_user.id)
+        ExpenseService.get_expense_summary(test_user.id)
+        list(ExpenseService.export_expenses(test_user.id))
+        ExpenseService.get_category_statistics(test_user.id)
+        EventService.get_upcoming_events(test_user.id)
+        EventService.get_events_by_category(test_user.id, "Work")
+        EventService.generate_event_summary(test_user.id)
+        EventService.find_time_conflicts(test_user.id, now, now + timedelta(hours=2))
+
+    assert_indexed(queries)
+
+
+def test_route_queries_use_indexes(client, access_token, test_user):
+    """
+    Test that list and report endpoints keep an index path
+    """
+    seed_dataset(test_user)
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    with capture_queries(db.engine) as queries:
+        for url in LIST_URLS:
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200, url
+
+    assert_indexed(queries)
+
+
+def seed_postgres(connection, users=5, rows=200):
+    """
+    Create the expense and event tables and rows of a few users
+
+    Returns:
+        int: Id of the first user
+    """
+    tables = [
+        User.__table__,
+        Category.__table__,
+        Expense.__table__,
+        Event.__table__,
+        SyncChange.__table__,
+    ]
+    db.metadata.create_all(connection, tables=tables)
+
+    now = datetime.utcnow()
+    user_ids = []
+    for n in range(users):
+        name = f"pg_planner_{n}"
+        user_ids.append(
+            connection.execute(
+                insert(User.__table__)
+                .values(
+                    username=name,
+                    email=f"{name}@example.com",
+                    password_hash="x",
+                    currency="USD",
+                )
+                .returning(User.__table__.c.id)
+            ).scalar()
+        )
+
+    for user_id in user_ids:
+        generator = random.Random(user_id)
+        category_ids = (
+            connection.execute(
+                insert(Category.__table__).returning(Category.__table__.c.id),
+                [{"user_id": user_id, "name": name} for name in ("Groceries", "Work")],
+            )
+            .scalars()
+            .all()
+        )
+        connection.execute(
+            insert(Expense.__table__),
+            [
+                {
+                    "user_id": user_id,
+                    "amount_cents": generator.randint(100, 10000),
+                    "currency": "USD",
+                    "category_id": generator.choice(category_ids),
+                    "description": f"Item {i}",
+                    "date": now - timedelta(days=i % 120, hours=i),
+                }
+                for i in range(rows)
+            ],
+        )
+        connection.execute(
+            insert(Event.__table__),
+            [
+                {
+                    "user_id": user_id,
+                    "title": f"Meeting {i}",
+                    "category_id": generator.choice(category_ids),
+                    "start_time": now + timedelta(days=i % 90 - 45),
+                    "end_time": now + timedelta(days=i % 90 - 45, hours=1),
+                }
+                for i in range(rows)
+            ],
+        )
+
+    connection.execute(text("ANALYZE"))
+    return user_ids[0]
+
+
+@pytest.mark.integration
+def test_postgres_queries_use_indexes(postgres_connection):
+    """
+    Test that the hot expense and event queries keep an index path on
+    PostgreSQL, whose planner differs from SQLite's
+    """
+    connection = postgres_connection
+    user_id = seed_postgres(connection)
+    now = datetime.utcnow()
+
+    expenses = select(Expense).where(Expense.user_id == user_id)
+    searched, order_by = apply_search(expenses, Expense, "item", "postgresql")
+    statements = [
+        expenses.order_by(Expense.date.desc()).limit(20),
+        expenses.where(Expense.amount_cents.between(1000, 5000)),
+        select(Expense.category_id, func.sum(Expense.amount_cents))
+        .where(Expense.user_id == user_id, Expense.date >= now - timedelta(days=90))
+        .group_by(Expense.category_id),
+        searched.order_by(*order_by).limit(20),
+        select(Event)
+        .where(Event.user_id == user_id, Event.start_time >= now)
+        .order_by(Event.start_time)
+        .limit(10),
+        select(SyncChange)
+        .where(SyncChange.user_id == user_id, SyncChange.id > 0)
+        .order_by(SyncChange.id)
+        .limit(100),
+    ]
+
+    queries = []
+    for statement in statements:
+        compiled = statement.compile(dialect=connection.dialect)
+        queries.append((str(compiled), compiled.params))
+
+    assert_indexed(queries, connection)
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+import pytest
+from ..src import db
+from ..src.models.event import Event
+from ..src.services.reminder_service import ReminderService
+from ..src.utils import pubsub
+from ..src.utils.reminder_scheduler import ReminderScheduler
+
+
+def create_event(client, headers, title, start_time):
+    response = client.post(
+        "/events",
+        json={
+            "title": title,
+            "start_time": start_time.isoformat(),
+            "end_time": (start_time + timedelta(hours=1)).isoformat(),
+        },
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.json["event"]["id"]
+
+
+def test_reminders_are_sent_once(app, client, access_token):
+    """
+    Test that a reminder fires at its time and only once across schedulers
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=300)
+    event_id = create_event(client, headers, "Dentist", start)
+
+    sent = []
+    scheduler = ReminderScheduler(app, sink=sent.append)
+    scheduler.tick(start - timedelta(minutes=20))
+    assert scheduler.pending >= 1
+    assert not [r for r in sent if r["event_id"] == event_id]
+
+    scheduler.tick(start - timedelta(minutes=14))
+    reminders = [r for r in sent if r["event_id"] == event_id]
+    assert len(reminders) == 1
+    assert reminders[0]["title"] == "Dentist"
+
+    scheduler.tick(start - timedelta(minutes=13))
+    other = ReminderScheduler(app, sink=sent.append)
+    other.tick(start - timedelta(minutes=13))
+    assert len([r for r in sent if r["event_id"] == event_id]) == 1
+
+
+def test_failed_reminders_are_retried(app, client, access_token):
+    """
+    Test that a reminder whose sink fails is sent again after a delay
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=310)
+    event_id = create_event(client, headers, "Flaky", start)
+
+    sent = []
+
+    def sink(reminder):
+        if not sent:
+            sent.append(None)
+            raise ConnectionError("broker down")
+        sent.append(reminder)
+
+    scheduler = ReminderScheduler(app, sink=sink)
+    due = start - timedelta(minutes=15)
+    scheduler.tick(due)
+    scheduler.tick(due + timedelta(seconds=1))
+    assert sent == [None]
+
+    scheduler.tick(due + ReminderScheduler.RETRY_DELAY)
+    assert [r["event_id"] for r in sent[1:]] == [event_id]
+
+
+def test_abandoned_claims_are_taken_over(app, client, access_token):
+    """
+    Test that a reminder claimed by a scheduler that stopped is sent later
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=315)
+    event_id = create_event(client, headers, "Abandoned", start)
+    due = start - timedelta(minutes=15)
+    user_id = db.session.get(Event, event_id).user_id
+    with db.engine.begin() as connection:
+        assert ReminderService.claim(connection, user_id, event_id, due, due)
+
+    sent = []
+    scheduler = ReminderScheduler(app, sink=sent.append)
+    scheduler.tick(due)
+    assert sent == []
+
+    scheduler.tick(due + ReminderService.CLAIM_TIMEOUT)
+    assert [r["event_id"] for r in sent] == [event_id]
+
+
+def test_default_sink_needs_a_shared_broker(app, monkeypatch):
+    """
+    Test that reminders are not published to the in-process broker
+    """
+
+    class SharedBroker(pubsub.LocalBroker):
+        pass
+
+    with pytest.raises(RuntimeError):
+        ReminderScheduler(app)
+
+    monkeypatch.setattr(pubsub, "_broker", SharedBroker())
+    ReminderScheduler(app)
+
+
+def test_scheduler_follows_event_changes(app, client, access_token):
+    """
+    Test that created, moved and deleted events update the schedule
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=320)
+    sent = []
+    scheduler = ReminderScheduler(app, sink=sent.append)
+    scheduler.tick(start - timedelta(minutes=30))
+
+    created = create_event(client, headers, "Created", start)
+    moved = create_event(client, headers, "Moved", start)
+    deleted = create_event(client, headers, "Deleted", start)
+    response = client.put(
+        f"/events/{moved}",
+        json={
+            "start_time": (start + timedelta(minutes=30)).isoformat(),
+            "end_time": (start + timedelta(hours=1)).isoformat(),
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert client.delete(f"/events/{deleted}", headers=headers).status_code == 200
+    assert db.session.get(Event, deleted) is None
+
+    scheduler.tick(start - timedelta(minutes=15))
+    assert [r["event_id"] for r in sent] == [created]
+
+    scheduler.tick(start + timedelta(minutes=15))
+    assert [r["event_id"] for r in sent] == [created, moved]
@@ -1,7 +1,18 @@
+import pytest
 from datetime import datetime, timedelta
+from sqlalchemy import func
+from ..src import db
 from ..src.services.expense_service import ExpenseService
 from ..src.services.event_service import EventService
+from ..src.services.anomaly_service import AnomalyService
+from ..src.services.archive_service import ArchiveService
+from ..src.services.admin_analytics_service import AdminAnalyticsService
 from ..src.models.user import User
+from ..src.models.expense import Expense
+from ..src.models.category import Category, category_cache
+from ..src.models.category_sketch import CategorySketch
+from ..src.utils.money import from_cents, to_cents
+from ..src.utils.pubsub import get_broker, user_channel
 
 
 def test_expense_monthly_spending(test_user):
@@ -84,3 +95,269 @@ def test_event_summary(test_user):
     assert "total_events" in summary
     assert "category_breakdown" in summary
     assert "busiest_days" in summary
+
+
+def test_expense_changes_are_published(test_user):
+    """
+    Test that committed expense changes are pushed to the user's channel
+    """
+    subscription = get_broker().subscribe(user_channel(test_user.id))
+
+    try:
+        expense = ExpenseService.add_expense(
+            user_id=test_user.id, amount=25, category="Groceries"
+        )
+
+        message = subscription.get(timeout=1)
+    finally:
+        subscription.close()
+
+    assert message["entity_type"] == "expense"
+    assert message["entity_id"] == expense.id
+    assert message["operation"] == "created"
+
+
+def test_expense_category_statistics(test_user):
+    """
+    Test spending quantiles merged from the monthly sketches
+    """
+    for amount in range(1, 101):
+        ExpenseService.add_expense(
+            user_id=test_user.id, amount=amount, category="Groceries"
+        )
+
+    statistics = ExpenseService.get_category_statistics(
+        test_user.id, quantiles=[0.5, 0.9]
+    )
+
+    groceries = next(
+        item for item in statistics["categories"] if item["category"] == "Groceries"
+    )
+    assert groceries["transaction_count"] >= 100
+    assert 45 <= groceries["quantiles"]["p50"] <= 56
+    assert 85 <= groceries["quantiles"]["p90"] <= 96
+
+
+def test_expense_anomalies(test_user):
+    """
+    Test that an amount far outside the category norm is flagged
+    """
+    for i in range(20):
+        ExpenseService.add_expense(
+            user_id=test_user.id,
+            amount=30 + i % 5,
+            category="Transport",
+            date=datetime.utcnow() - timedelta(days=i * 2),
+        )
+    outlier = ExpenseService.add_expense(
+        user_id=test_user.id, amount=900, category="Transport"
+    )
+
+    anomalies = AnomalyService.get_anomalies(test_user.id)
+
+    assert anomalies[0]["expense"]["id"] == outlier.id
+    assert "amount" in anomalies[0]["reasons"]
+
+
+def test_empty_baselines_are_not_recomputed_on_every_read(test_user, monkeypatch):
+    """
+    Test that a user without recent expenses keeps fresh, empty baselines
+    """
+    refreshes = []
+    refresh_baselines = AnomalyService.refresh_baselines
+
+    def counted_refresh(user_ids, *args, **kwargs):
+        refreshes.append(user_ids)
+        refresh_baselines(user_ids, *args, **kwargs)
+
+    monkeypatch.setattr(AnomalyService, "refresh_baselines", counted_refresh)
+
+    assert AnomalyService.get_anomalies(test_user.id) == []
+    assert AnomalyService.get_anomalies(test_user.id) == []
+    assert refreshes == [[test_user.id]]
+
+
+def test_platform_statistics_match_a_single_scan(test_user):
+    """
+    Test that chunked, parallel statistics equal those of one whole scan
+    """
+    users = [test_user]
+    for name in ("second", "third"):
+        user = User(username=name, email=f"{name}@example.com")
+        user.set_password("password")
+        db.session.add(user)
+        users.append(user)
+    db.session.commit()
+
+    for index, user in enumerate(users):
+        for days in range(0, 90, 15):
+            ExpenseService.add_expense(
+                user_id=user.id,
+                amount=10.25 + index + days,
+                category=("Food", "Rent", "Fuel")[(index + days) % 3],
+                date=datetime.utcnow() - timedelta(days=days),
+            )
+        start_time = datetime.utcnow() + timedelta(days=index)
+        EventService.create_event(
+            user_id=user.id,
+            event_data={
+                "title": f"Event {index}",
+                "start_time": start_time,
+                "end_time": start_time + timedelta(hours=1),
+            },
+        )
+
+    parallel = AdminAnalyticsService.collect_platform_statistics(
+        chunk_size=1, max_workers=4
+    )
+    single = AdminAnalyticsService.collect_platform_statistics(
+        chunk_size=10**9, max_workers=1
+    )
+
+    assert (parallel["chunks"], single["chunks"]) == (3, 1)
+    assert {**parallel, "chunks": 1} == single
+    totals = (
+        db.session.query(Category.name, func.sum(Expense.amount_cents))
+        .join(Expense, Expense.category_id == Category.id)
+        .group_by(Category.name)
+        .all()
+    )
+    assert {
+        item["category"]: item["total_amount"] for item in single["spend_by_category"]
+    } == {name: from_cents(cents) for name, cents in totals}
+
+
+def test_archived_expenses_stay_in_reports(app, test_user, tmp_path, monkeypatch):
+    """
+    Test that archived expenses are still counted by reports, exports and
+    rebuilt sketches
+    """
+    monkeypatch.setitem(app.config, "EXPENSE_ARCHIVE_DIR", str(tmp_path))
+    old_date = datetime.utcnow() - timedelta(days=800)
+    ExpenseService.add_expense(
+        user_id=test_user.id, amount=40, category="Rent", date=old_date
+    )
+    ExpenseService.add_expense(user_id=test_user.id, amount=10, category="Rent")
+
+    window = (old_date - timedelta(days=1), datetime.utcnow())
+    before = ExpenseService.generate_expense_report(test_user.id, *window)
+
+    archived = ArchiveService.archive_expenses(
+        datetime.utcnow() - timedelta(days=730), user_ids=[test_user.id]
+    )
+    after = ExpenseService.generate_expense_report(test_user.id, *window)
+    exported = list(ExpenseService.export_expenses(test_user.id))
+
+    assert archived == {test_user.id: 1}
+    assert after["total_spending"] == before["total_spending"]
+    assert exported[0]["archived"] and exported[0]["amount"] == 40
+
+    # Deleting a live expense of the archived month marks its sketch stale
+    late = ExpenseService.add_expense(
+        user_id=test_user.id, amount=5, category="Rent", date=old_date
+    )
+    db.session.delete(late)
+    db.session.commit()
+    month = old_date.strftime("%Y-%m")
+    statistics = ExpenseService.get_category_statistics(test_user.id, month, month)
+    assert statistics["categories"][0]["transaction_count"] == 1
+    assert statistics["categories"][0]["max_amount"] == 40
+
+    # Reads leave the stale sketch for the refresh to store
+    assert CategorySketch.query.filter_by(stale=True).count() == 1
+    assert ExpenseService.refresh_stale_sketches(test_user.id) == 1
+    assert CategorySketch.query.filter_by(stale=True).count() == 0
+    assert (
+        ExpenseService.get_category_statistics(test_user.id, month, month) == statistics
+    )
+
+
+def test_expense_categories_are_interned(test_user):
+    """
+    Test that category names are stored once and resolved at the edges
+    """
+    first = ExpenseService.add_expense(
+        user_id=test_user.id, amount=10, category="Utilities"
+    )
+    second = ExpenseService.add_expense(
+        user_id=test_user.id, amount=15, category="Utilities"
+    )
+
+    assert first.category_id == second.category_id
+    assert category_cache.name_of(first.category_id) == "Utilities"
+    assert Category.query.filter_by(user_id=test_user.id, name="Utilities").count() == 1
+
+    report = ExpenseService.generate_expense_report(test_user.id)
+    utilities = next(
+        item for item in report["category_breakdown"] if item["category"] == "Utilities"
+    )
+    assert utilities["total_amount"] == 25
+    assert utilities["transaction_count"] == 2
+
+
+def test_category_cache_forgets_recreated_databases(test_user):
+    """
+    Test that category ids reused by a recreated database are not served stale
+    """
+    user_id = test_user.id
+    first = ExpenseService.add_expense(user_id=user_id, amount=10, category="Rent")
+    category_id = first.category_id
+    assert category_cache.name_of(category_id) == "Rent"
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    user = User(id=user_id, username="testuser", email="test@example.com")
+    user.set_password("testpassword")
+    db.session.add(user)
+    db.session.commit()
+    second = ExpenseService.add_expense(user_id=user_id, amount=10, category="Fuel")
+
+    assert second.category_id == category_id
+    assert category_cache.name_of(category_id) == "Fuel"
+
+
+def test_expense_totals_are_exact(test_user):
+    """
+    Test that amounts are stored as cents and summed without float drift
+    """
+    for _ in range(10):
+        expense = ExpenseService.add_expense(
+            user_id=test_user.id, amount=0.1, category="Snacks"
+        )
+
+    report = ExpenseService.generate_expense_report(test_user.id)
+    snacks = next(
+        item for item in report["category_breakdown"] if item["category"] == "Snacks"
+    )
+
+    assert expense.amount_cents == 10
+    assert expense.currency == "USD"
+    assert snacks["total_amount"] == 1.0
+
+
+def test_expenses_use_the_account_currency(test_user):
+    """
+    Test that amounts are scaled by the currency and other currencies rejected
+    """
+    user = User(username="yen_user", email="yen_user@example.com", currency="JPY")
+    user.set_password("password")
+    db.session.add(user)
+    db.session.commit()
+
+    expense = ExpenseService.add_expense(user_id=user.id, amount=1500, category="Sushi")
+    report = ExpenseService.generate_expense_report(user.id)
+
+    assert expense.currency == "JPY"
+    assert expense.amount_cents == 1500
+    assert report["total_spending"] == 1500
+    with pytest.raises(ValueError):
+        ExpenseService.add_expense(
+            user_id=user.id, amount=10, category="Sushi", currency="USD"
+        )
+    with pytest.raises(ValueError):
+        ExpenseService.add_expense(
+            user_id=test_user.id, amount=10, category="Sushi", currency="JPY"
+        )
+    assert to_cents("1.2345", "KWD") == 1235
+    assert from_cents(1235, "KWD") == 1.235
@@ -0,0 +1,234 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import g
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, insert, select
+from ..src import db
+from ..src.models.expense import Expense
+from ..src.models.user import User
+from ..src.models.user_shard import UserShard
+from ..src.services.admin_analytics_service import AdminAnalyticsService
+from ..src.services.anomaly_service import AnomalyService
+from ..src.services.archive_service import ArchiveService
+from ..src.utils.sharding import (
+    HashRing,
+    ShardRouter,
+    UserMovingError,
+    shard_router,
+)
+
+
+def shard_expense_counts(user_id):
+    table = Expense.__table__
+    counts = []
+    for engine in shard_router.engines:
+        with engine.connect() as connection:
+            counts.append(
+                connection.execute(
+                    select(func.count()).where(table.c.user_id == user_id)
+                ).scalar()
+            )
+    return counts
+
+
+def create_user(name):
+    user = User(username=name, email=f"{name}@x.com")
+    user.set_password("password")
+    db.session.add(user)
+    db.session.commit()
+    return user.id, {"Authorization": f"Bearer {create_access_token(user.id)}"}
+
+
+@pytest.fixture
+def shards(app, tmp_path, monkeypatch):
+    """
+    Turn sharding on with SQLite shards; call the result with a shard count
+    """
+    uris = [f"sqlite:///{tmp_path}/shard_{index}.db" for index in range(3)]
+    monkeypatch.setitem(app.config, "SHARD_MOVE_SETTLE_SECONDS", 0)
+
+    def configure(count):
+        monkeypatch.setitem(app.config, "SHARD_DATABASE_URIS", uris[:count])
+        shard_router.configure(app)
+        for shard in range(count):
+            shard_router.create_schema(shard)
+
+    yield configure
+    shard_router.reset()
+    g.shard = None
+
+
+def test_users_are_routed_and_rebalanced(client, shards):
+    """
+    Test that user data lands on the user's shard and survives a rebalance
+    """
+    shards(2)
+    users = []
+    for index in range(6):
+        user_id, headers = create_user(f"sharded_{index}")
+        response = client.post(
+            "/expenses",
+            json={"amount": 10 + index, "category": "Rent"},
+            headers=headers,
+        )
+        assert response.status_code == 201
+        assert response.json["expense"]["id"] > shard_router.id_span
+        users.append((user_id, headers))
+
+    for user_id, _ in users:
+        counts = shard_expense_counts(user_id)
+        assert counts[shard_router.shard_of(user_id)] == 1
+        assert sum(counts) == 1
+
+    shards(3)
+    moves = shard_router.rebalance()
+
+    assert moves
+    assert all(target == 2 for _, _, target in moves)
+    for user_id, headers in users:
+        counts = shard_expense_counts(user_id)
+        assert counts[shard_router.shard_of(user_id)] == 1
+        assert sum(counts) == 1
+        expenses = client.get("/expenses", headers=headers).json["expenses"]
+        assert len(expenses) == 1
+        assert expenses[0]["category"] == "Rent"
+
+
+def test_existing_users_are_migrated_from_main_database(client, shards):
+    """
+    Test that users with data on the main database are refused until migrated
+    """
+    user_id, headers = create_user("sharded_legacy")
+    response = client.post(
+        "/expenses", json={"amount": 15, "category": "Legacy"}, headers=headers
+    )
+    assert response.status_code == 201
+
+    shards(2)
+    refused = client.get("/expenses", headers=headers)
+    assert refused.status_code == 503
+
+    moves = shard_router.migrate()
+
+    assert (user_id, None, shard_router.ring.shard_for(user_id)) in moves
+    expenses = client.get("/expenses", headers=headers).json["expenses"]
+    assert [expense["category"] for expense in expenses] == ["Legacy"]
+    with db.engine.connect() as connection:
+        left = connection.execute(
+            select(func.count()).where(Expense.__table__.c.user_id == user_id)
+        ).scalar()
+    assert left == 0
+
+
+def test_move_keeps_rows_written_during_copy(client, shards, monkeypatch):
+    """
+    Test that a move aborts when the source changed after being copied
+    """
+    shards(2)
+    user_id, headers = create_user("sharded_busy")
+    client.post("/expenses", json={"amount": 20, "category": "Busy"}, headers=headers)
+    source = shard_router.shard_of(user_id)
+    copy_rows = ShardRouter._copy_rows
+
+    def copy_then_write(reader, writer, table, owner_id, batch_size):
+        keys = copy_rows(reader, writer, table, owner_id, batch_size)
+        if table.name == "expenses":
+            # A request that was routed before the move commits meanwhile
+            row = dict(reader.execute(select(table)).first()._mapping)
+            row.update(id=row["id"] + 1)
+            with shard_router.engines[source].begin() as connection:
+                connection.execute(insert(table).values(**row))
+        return keys
+
+    monkeypatch.setattr(ShardRouter, "_copy_rows", staticmethod(copy_then_write))
+
+    with pytest.raises(UserMovingError):
+        shard_router.move_user(user_id, 1 - source)
+
+    assert shard_router.shard_of(user_id) == source
+    assert shard_expense_counts(user_id)[source] == 2
+    assert client.get("/expenses", headers=headers).json["total"] == 2
+
+
+def test_writes_are_refused_once_a_move_starts(app, shards):
+    """
+    Test that a write routed before a move is rejected at commit
+    """
+    shards(2)
+    user_id, _ = create_user("sharded_late")
+    with shard_router.bind(user_id):
+        db.session.add(Expense(user_id=user_id, amount=5, category="Late"))
+        db.session.flush()
+        with db.engine.begin() as connection:
+            connection.execute(
+                UserShard.__table__.update()
+                .where(UserShard.__table__.c.user_id == user_id)
+                .values(moving=True)
+            )
+        with pytest.raises(UserMovingError):
+            db.session.commit()
+        db.session.rollback()
+        assert shard_expense_counts(user_id) == [0, 0]
+
+
+def test_maintenance_jobs_scan_every_shard(app, shards, tmp_path, monkeypatch):
+    """
+    Test that statistics, anomaly scoring and archiving cover both shards
+    """
+    shards(2)
+    monkeypatch.setitem(app.config, "EXPENSE_ARCHIVE_DIR", str(tmp_path / "archive"))
+    now = datetime.utcnow()
+    user_ids = []
+    for index in range(4):
+        user_id, _ = create_user(f"sharded_job_{index}")
+        shard_router.place(user_id, index % 2)
+        with shard_router.bind(user_id):
+            db.session.add_all(
+                Expense(
+                    user_id=user_id,
+                    amount=10,
+                    category="Food",
+                    date=now - timedelta(days=day),
+                )
+                for day in range(1, 8)
+            )
+            db.session.add(
+                Expense(user_id=user_id, amount=500, category="Food", date=now)
+            )
+            db.session.add(
+                Expense(
+                    user_id=user_id,
+                    amount=30,
+                    category="Old",
+                    date=now - timedelta(days=800),
+                )
+            )
+            db.session.commit()
+        user_ids.append(user_id)
+
+    statistics = AdminAnalyticsService.collect_platform_statistics(chunk_size=1)
+    totals = {
+        row["category"]: row["total_amount"] for row in statistics["spend_by_category"]
+    }
+    assert totals == {"Food": 4 * 570, "Old": 4 * 30}
+
+    flagged = dict(AnomalyService.score_all_users())
+    assert sorted(flagged) == user_ids
+
+    archived = ArchiveService.archive_expenses(now - timedelta(days=730))
+    assert archived == {user_id: 1 for user_id in user_ids}
+
+
+def test_hash_ring_moves_few_keys():
+    """
+    Test that adding a shard only moves keys to the new shard
+    """
+    before = HashRing(4)
+    after = HashRing(5)
+
+    moved = [
+        key for key in range(10000) if before.shard_for(key) != after.shard_for(key)
+    ]
+
+    assert all(after.shard_for(key) == 4 for key in moved)
+    assert 1000 < len(moved) < 3000
@@ -0,0 +1,116 @@
+import itertools
+import threading
+import time
+import pytest
+from flask import g
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from ..src.utils.single_flight import SingleFlight
+
+
+class SignallingEvent(threading.Event):
+    """
+    Event releasing a semaphore whenever a thread starts waiting on it
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.waiting = threading.Semaphore(0)
+
+    def wait(self, timeout=None):
+        self.waiting.release()
+        return super().wait(timeout)
+
+
+def test_concurrent_identical_calls_share_one_computation():
+    """
+    Test that calls arriving while an identical one runs wait for its result
+    """
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    @single_flight.coalesce
+    def summarize(user_id):
+        calls.append(user_id)
+        started.set()
+        release.wait(5)
+        return {"user_id": user_id, "total": 42}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(summarize(1)))
+    leader.start()
+    started.wait(5)
+    (call,) = single_flight._calls.values()
+    call.done = SignallingEvent()
+    followers = [
+        threading.Thread(target=lambda: results.append(summarize(1))) for _ in range(4)
+    ]
+    for follower in followers:
+        follower.start()
+    for _ in followers:
+        assert call.done.waiting.acquire(timeout=5)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == [{"user_id": 1, "total": 42}] * 5
+    # Every caller gets its own copy
+    assert len({id(result) for result in results}) == 5
+
+    summarize(2)
+    assert calls == [1, 2]
+
+
+def test_waiting_is_bounded_by_the_latency_deadline(app):
+    """
+    Test that a caller gives up on an identical call once its budget is spent
+    """
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return 42
+
+    leader = threading.Thread(target=lambda: single_flight.do("key", compute))
+    leader.start()
+    started.wait(5)
+    try:
+        with app.app_context():
+            g.latency_deadline = time.monotonic() + 0.01
+            with pytest.raises(PoolTimeoutError):
+                single_flight.do("key", compute)
+    finally:
+        release.set()
+        leader.join(5)
+
+    assert single_flight.last_result("key")[1] == 42
+
+
+def test_stale_while_revalidate_serves_last_result(app):
+    """
+    Test that a stale result is served while a refresh runs in the background
+    """
+    single_flight = SingleFlight()
+    single_flight.stale_while_revalidate = True
+    single_flight.fresh_seconds = 0
+    refreshed = threading.Event()
+    values = itertools.count(1)
+
+    @single_flight.coalesce
+    def summarize(user_id):
+        value = next(values)
+        if value == 2:
+            refreshed.set()
+        return value
+
+    with app.app_context():
+        assert summarize(1) == 1
+        assert summarize(1) == 1
+        assert refreshed.wait(5)
+        time.sleep(0.05)
+        assert summarize(1) == 2
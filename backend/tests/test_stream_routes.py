@@ -0,0 +1,30 @@
+def test_stream_accepts_stream_tokens_in_the_url(client, access_token):
+    """
+    Test that EventSource URLs carry a stream token, not the access token
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    response = client.post("/stream/token", headers=headers)
+    assert response.status_code == 201
+    token = response.json["token"]
+
+    stream = client.get(f"/stream?jwt={token}", buffered=False)
+    assert stream.status_code == 200
+    assert stream.mimetype == "text/event-stream"
+    stream.close()
+
+    rejected = client.get(f"/stream?jwt={access_token}", buffered=False)
+    assert rejected.status_code == 401
+
+
+def test_stream_tokens_only_open_the_stream(client, access_token):
+    """
+    Test that a leaked stream token cannot call other endpoints
+    """
+    token = client.post(
+        "/stream/token", headers={"Authorization": f"Bearer {access_token}"}
+    ).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/expenses", headers=headers).status_code == 403
+    assert client.post("/stream/token", headers=headers).status_code == 403
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+from ..src import db
+from ..src.models.sync_change import SyncChange
+from ..src.services import sync_service
+
+
+def test_get_changes_full_sync(client, access_token, test_expense):
+    """
+    Test retrieving changes from the beginning of the feed
+    """
+    response = client.get(
+        "/sync/changes", headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+    assert "changes" in response.json
+    assert "next_cursor" in response.json
+    assert "has_more" in response.json
+    assert any(
+        change["entity_type"] == "expense" and change["entity_id"] == test_expense.id
+        for change in response.json["changes"]
+    )
+
+
+def test_get_changes_returns_tombstones(client, access_token, test_expense):
+    """
+    Test that deleted expenses appear as tombstones after the cursor
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    cursor = client.get("/sync/changes", headers=headers).json["next_cursor"]
+
+    client.delete(f"/expenses/{test_expense.id}", headers=headers)
+
+    response = client.get(f"/sync/changes?since={cursor}", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json["changes"] == [
+        {
+            "cursor": response.json["next_cursor"],
+            "entity_type": "expense",
+            "entity_id": test_expense.id,
+            "operation": "deleted",
+            "changed_at": response.json["changes"][0]["changed_at"],
+        }
+    ]
+
+
+def test_get_changes_rejects_negative_cursor(client, access_token):
+    """
+    Test that an invalid cursor is rejected
+    """
+    response = client.get(
+        "/sync/changes?since=-1", headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 400
+
+
+def test_get_changes_stops_at_commit_watermark(client, access_token, monkeypatch):
+    """
+    Test that changes logged after the commit watermark are held back
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    cursor = client.get("/sync/changes", headers=headers).json["next_cursor"]
+    client.post("/expenses", json={"amount": 9, "category": "Late"}, headers=headers)
+
+    # Logged after the watermark, as if an older transaction were still open
+    latest = SyncChange.query.order_by(SyncChange.id.desc()).first()
+    latest.changed_at = datetime.utcnow() + timedelta(minutes=1)
+    db.session.commit()
+    monkeypatch.setattr(
+        sync_service, "commit_watermark", lambda connection: datetime.utcnow()
+    )
+
+    held = client.get(f"/sync/changes?since={cursor}", headers=headers)
+
+    assert held.json["changes"] == []
+    assert held.json["next_cursor"] == cursor
+
+    monkeypatch.setattr(sync_service, "commit_watermark", lambda connection: None)
+    released = client.get(f"/sync/changes?since={cursor}", headers=headers)
+
+    assert [change["entity_id"] for change in released.json["changes"]] == [
+        latest.entity_id
+    ]